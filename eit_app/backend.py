@@ -2,6 +2,7 @@ from __future__ import absolute_import, division, print_function
 
 import logging
 import os
+from typing import Union
 
 import eit_model.imaging
 import eit_model.model
@@ -22,7 +23,7 @@ import numpy as np
 from glob_utils.file.utils import (FileExt, OpenDialogFileCancelledException,
                                    dialog_get_file_with_ext,
                                    search_for_file_with_ext)
-from PyQt5 import QtCore, QtWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
 
 import eit_app.com_channels
 import eit_app.default.set_default_dir
@@ -38,11 +39,14 @@ import eit_app.video.microcam
 from eit_app.default.set_default_dir import AppStdDir, get_dir
 from eit_app.export import ExportAgent, ExportFunc, ParamsToLoopOn
 from eit_app.gui_utils import set_comboBox_items
+from eit_app.solver_cache import (SolverCache, default_eit_model_src,
+                                  default_solver_cache_dir)
+from eit_app.rec_process import ReconstructionProcess
 from eit_app.update_gui import (EvtDataEITDataPlotOptionsChanged, EvtDataImagingInputsChanged,
                                 EvtDataSciospecDevSetup, EvtEitModelLoaded,
                                 EvtGlobalDirectoriesSet, EvtInitFormatUI,
                                 EvtRecSolverChanged)
-from eit_app.widget_3d import Window3DAgent
+from eit_app.widget_3d import PyVista3DPlot, Window3DAgent
 from eit_app.experimental.fit_circles import show_threshold_overview, evaluate_multi_image, evaluate_single_image
 
 # Ensure using PyQt5 backend
@@ -102,6 +106,15 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
 
         return super().eventFilter(source, event)
 
+    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
+        """Release the device (interface, rx frames processing) and the
+        reconstruction process (worker process, shared memory) before closing
+        the app"""
+        self.device.close()
+        if self.computing.rec_process is not None:
+            self.computing.rec_process.close()
+        super().closeEvent(event)
+
     def set_title(self) -> None:
         t = f"EIT aquisition for Sciospec device {__version__}"
         self.setWindowTitle(QtCore.QCoreApplication.translate("MainWindow", t))
@@ -146,7 +159,12 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         self.eit_mdl = eit_model.model.EITModel()
         self.reconstruction = eit_model.reconstruction.EITReconstruction()
 
-        self.computing = eit_app.computation.ComputingAgent(self.reconstruction)
+        # the reconstruction runs in a worker process (see rec_process)
+        self.computing = eit_app.computation.ComputingAgent(
+            self.reconstruction,
+            solver_cache=self._build_solver_cache(),
+            rec_process=ReconstructionProcess(),
+        )
 
         self.dataset = eit_app.sciospec.measurement.MeasurementDataset()
         self.device = eit_app.sciospec.device.SciospecEITDevice(32)
@@ -158,6 +176,16 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         self.export_agent = ExportAgent(self.replay_agent, self.dataset,self.computing, self.ui)
         self.window_3d_agent = Window3DAgent()
 
+    def _build_solver_cache(self) -> Union[SolverCache, None]:
+        """Return the cache of initialized solvers (None if not available)"""
+        if (dir_path := default_solver_cache_dir()) is None:
+            return None
+        try:
+            return SolverCache(dir_path)
+        except OSError as e:
+            logger.warning(f"Solver cache not available ({e})")
+            return None
+
     def _connect_menu(self):
         self.ui.action_exit.triggered.connect(self.close)
 
@@ -166,6 +194,10 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         self.computing.to_gui.connect(self.to_reciever)
         self.computing.to_plot.connect(self.plot_agent.to_reciever)
         self.computing.to_plot.connect(self.window_3d_agent.to_reciever)
+        # outputs only computed if shown (or exported)
+        for canvas in self.plot_agent.canvaslayouts:
+            self.computing.subscribe(canvas.plotter_type, canvas.is_consuming)
+        self.computing.subscribe(PyVista3DPlot, self.window_3d_agent.is_consuming)
 
         self.dataset.to_gui.connect(self.to_reciever)
         self.dataset.to_computation.connect(self.computing.to_reciever)
@@ -180,8 +212,10 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         self.replay_agent.to_gui.connect(self.to_reciever)
         self.replay_agent.to_dataset.connect(self.dataset.to_reciever)
         self.replay_agent.to_capture.connect(self.capture_agent.to_reciever)
+        self.replay_agent.to_computation.connect(self.computing.to_reciever)
 
         self.capture_agent.to_gui.connect(self.to_reciever)
+        self.plot_agent.to_gui.connect(self.to_reciever)
 
     def _init_values(self) -> None:
 
@@ -228,6 +262,10 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
             self.ui.cB_eit_imaging_trans, eit_model.imaging.eit_data_transformations()
         )
         set_comboBox_items(self.ui.cB_eit_imaging_ref_frame, [0])
+        set_comboBox_items(
+            self.ui.cB_compute_policy,
+            [p.value for p in eit_app.com_channels.ComputePolicy],
+        )
         set_comboBox_items(
             self.ui.cB_monitoring_trans, eit_model.imaging.eit_data_transformations()
         )
@@ -261,7 +299,9 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         self.ui.pB_connect.clicked.connect(self.device.connect_device)
         self.ui.pB_disconnect.clicked.connect(self.device.disconnect_device)
         self.ui.pB_get_setup.clicked.connect(self.device.get_setup)
-        self.ui.pB_set_setup.clicked.connect(self.device.set_setup)
+        self.ui.pB_set_setup.clicked.connect(
+            lambda: self.device.set_setup(force=self.ui.chB_set_setup_full.isChecked())
+        )
         self.ui.pB_reset.clicked.connect(self.device.software_reset)
         self.ui.pB_save_setup.clicked.connect(self.device.save_setup)
         self.ui.pB_load_setup.clicked.connect(self.device.load_setup)
@@ -446,6 +486,7 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
                 func=self.canvas_eit_image.add_export_path,
                 is_exported=self.canvas_eit_image.all_exported,
                 before_compute=True,
+                wait_exported=self.canvas_eit_image.wait_exported,
             )
         )
 
@@ -455,6 +496,7 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
                 func=self.canvas_eit_data.add_export_path,
                 is_exported=self.canvas_eit_data.all_exported,
                 before_compute=True,
+                wait_exported=self.canvas_eit_data.wait_exported,
             )
         )
 
@@ -464,6 +506,7 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
                 func=self.canvas_Uch.add_export_path,
                 is_exported=self.canvas_Uch.all_exported,
                 before_compute=True,
+                wait_exported=self.canvas_Uch.wait_exported,
             )
         )
 
@@ -561,6 +604,11 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         self.ui.chB_eit_image_plot.toggled.connect(self._set_plots_options)
         self.ui.chB_eit_data_monitoring.toggled.connect(self._set_plots_options)
         self.ui.pB_pyvista.clicked.connect(self.open_pyvista)
+        # refresh the outputs which were not computed while hidden
+        self.ui.tabW_rec.currentChanged.connect(self._refresh_plots)
+        self.ui.tabW_monitoring.currentChanged.connect(self._refresh_plots)
+        self.ui.chB_eit_image_plot.toggled.connect(self._refresh_plots)
+        self.ui.chB_eit_data_monitoring.toggled.connect(self._refresh_plots)
         self.ui.pB_set_dpi.clicked.connect(self._set_dpi)
         self.ui.scalePlot_vmin.valueChanged.connect(self._set_plots_options)
         self.ui.scalePlot_vmax.valueChanged.connect(self._set_plots_options)
@@ -573,7 +621,7 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
     def _set_plots_options(self) -> None:
 
         self.ui.tabW_rec.setVisible(self.ui.chB_eit_image_plot.isChecked())
-        self.reconstruction.enable_rec(self.ui.chB_eit_image_plot.isChecked())
+        self.computing.call_rec("enable_rec", self.ui.chB_eit_image_plot.isChecked())
         self.ui.tabW_monitoring.setVisible(self.ui.chB_eit_data_monitoring.isChecked())
         self.update_gui(EvtDataEITDataPlotOptionsChanged())
 
@@ -597,6 +645,11 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
 
     def open_pyvista(self, checked) -> None:
         self.window_3d_agent.init_window_3d(self.eit_mdl)
+        self._refresh_plots()
+
+    def _refresh_plots(self, *args) -> None:
+        """Compute the last data again to refresh the shown plots"""
+        self.computing.recompute_last()
 
     ############################################################################
     #### Reconstruction, computation
@@ -606,17 +659,57 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         self.ui.pB_set_reconstruction.clicked.connect(self._init_rec)
         self.ui.pB_compute.clicked.connect(self.replay_agent.compute_actual_frame)
         self.ui.cB_pyeit_solver.activated[str].connect(self._update_rec_params)
-        self.ui.pB_activate_calibration.clicked[bool].connect(self.reconstruction.enable_calibration)
+        self.ui.pB_activate_calibration.clicked[bool].connect(self._enable_calibration)
+        self.ui.cB_compute_policy.activated.connect(self._set_compute_policy)
+        self.ui.sB_compute_policy_n.editingFinished.connect(self._set_compute_policy_n)
 
         # self.ui.chB_eit_mdl_normalize.toggled.connect(self._get_solvers_params)
         # self.ui.sBd_eit_model_fem_refinement.valueChanged.connect(self._get_solvers_params)
 
+    def _enable_calibration(self, checked: bool) -> None:
+        self.computing.call_rec("enable_calibration", checked)
+
+    def _set_compute_policy_n(self) -> None:
+        """Set the compute policy if its N has been changed in the gui (each
+        new policy resets the computation stats)"""
+        if self.ui.sB_compute_policy_n.value() != self.computing.policy.n:
+            self._set_compute_policy()
+
+    def _set_compute_policy(self, *args) -> None:
+        """Set the compute policy selected in the gui"""
+        policy = eit_app.com_channels.ComputePolicy(
+            self.ui.cB_compute_policy.currentText()
+        )
+        self.computing.set_compute_policy(
+            eit_app.com_channels.SetComputePolicy(
+                policy, self.ui.sB_compute_policy_n.value()
+            )
+        )
+
     def _init_rec(self) -> None:
         """Init the reconstruction solver"""
         rec_type = self.ui.tabW_reconstruction.currentIndex()
         solver = self._rec_solver(rec_type)
         params = self._rec_params(rec_type)
-        self.computing.init_solver(solver, params)
+        cache_key = SolverCache.build_key(
+            self._eit_mdl_src,
+            self._chip_src,
+            self.ui.sBd_eit_model_fem_refinement.value(),
+            solver,
+            params,
+        )
+        self.computing.init_solver(solver, params, cache_key)
+        self._sync_eit_mdl()
+
+    def _sync_eit_mdl(self) -> None:
+        """Rebind the eit_mdl to the one of the reconstruction, which is
+        replaced by the initialized one on a solver cache hit, so that the
+        gui and the solver share the same eit_mdl"""
+        if self.reconstruction.eit_model is self.eit_mdl:
+            return
+        self.eit_mdl = self.reconstruction.eit_model
+        self.window_3d_agent.set_eit_model(self.eit_mdl)
+        logger.debug("eit_mdl replaced by the cached one")
 
     def _rec_solver(self, rec_type: int = 0) -> None:
         """Return the reconstruction solver"""
@@ -686,7 +779,7 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         imaging=eit_model.imaging.build_EITImaging(imaging_type, transform, show_abs)
         self.update_gui(EvtDataImagingInputsChanged(imaging))
 
-        self.reconstruction.imaging= imaging
+        self.computing.set_rec_attr("imaging", imaging)
         # self.reconstruction.set_eit_model(self.eit_mdl)
         self._set_actual_indexesforcomputation(imaging_type)
 
@@ -711,7 +804,7 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
     def _monitoring_params(self) -> None:
         transform = self.ui.cB_monitoring_trans.currentText()
         show_abs = self.ui.chB_monitoring_trans_abs.isChecked()
-        self.reconstruction.set_monitoring(transform, show_abs)
+        self.computing.call_rec("set_monitoring", transform, show_abs)
 
     ############################################################################
     #### Eit model
@@ -721,6 +814,8 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         """Load the default eit_mdl define in the `eit_model`-package"""
         # set pattern
         self.eit_mdl.load_defaultmatfile()
+        self._eit_mdl_src = default_eit_model_src(self.eit_mdl.name)
+        self._chip_src = None
         self.update_setup_from_eit_mdl()
 
     def _update_eit_mdl_ctlg(self):
@@ -734,6 +829,7 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
             get_dir(AppStdDir.eit_model), self.ui.cB_eit_mdl_ctlg.currentText()
         )
         self.eit_mdl.load_matfile(path)
+        self._eit_mdl_src = path
         self.update_setup_from_eit_mdl()
 
     def _update_chip_ctlg(self):
@@ -747,6 +843,7 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
             get_dir(AppStdDir.chips), self.ui.cB_chip_ctlg.currentText()
         )
         self.eit_mdl.load_chip_trans(path)
+        self._chip_src = path
         self.update_setup_from_eit_mdl()
 
     def update_setup_from_eit_mdl(self):
@@ -756,7 +853,7 @@ class UiBackEnd(QtWidgets.QMainWindow, eit_app.com_channels.AddUpdateUiAgent):
         self.device.setup.set_exc_pattern(exc_mat)
         self.update_gui(EvtDataSciospecDevSetup(self.device.setup))
         self.update_gui(EvtEitModelLoaded(self.eit_mdl.name))
-        self.reconstruction.eit_model=self.eit_mdl
+        self.computing.set_rec_attr("eit_model", self.eit_mdl)
         self.window_3d_agent.set_eit_model(self.eit_mdl)
 
     # def kill_workers(self) -> None:
@@ -0,0 +1,316 @@
+""" Headless batch reconstruction of measurement datasets
+
+All frames of a measurement dataset are reconstructed using a process pool
+and the reconstructed data are written in a single npy-file of shape
+(n_frames, n_out). No gui (Qt) is needed.
+
+example of Use is
+
+    python -m eit_app.batch_cli path/to/dataset_dir --model path/to/model.mat
+        --solver JAC --imaging "Time difference imaging" --transform Real
+        --output rec.npy --workers 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Union
+
+import numpy as np
+import eit_model.imaging
+import eit_model.model
+import eit_model.reconstruction
+import eit_model.solver_pyeit
+from eit_app.reconstruction_batch import reconstruct_batch
+from eit_app.sciospec.dataset_file import MeasurementDatasetFile, is_dataset_file_in
+from eit_app.sciospec.extract_indexes import ExtractIndexes
+from eit_app.sciospec.voltage import EITChannelVoltage, EITVoltageLabels
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64  # nb of frames reconstructed per task
+
+
+@dataclass
+class BatchRecConfig:
+    """Configuration of a batch reconstruction (has to be picklable)"""
+
+    voltages_path: str  # dataset dir or npy-file of voltages
+    model_path: str = None  # EIT model mat-file, default model if `None`
+    chip_path: str = None  # chip transformation txt-file
+    refinement: float = None  # FEM refinement
+    solver_params: dict = field(default_factory=dict)  # see PyEitRecParams
+    imaging_type: str = ""
+    transform: str = ""
+    show_abs: bool = False
+    ref_frame: int = 0  # TD ref frame
+    ref_freq: int = 0
+    meas_freq: int = 0
+
+
+## =============================================================================
+##  Dataset loading
+## =============================================================================
+
+
+def load_voltages(voltages_path: str) -> np.ndarray:
+    """Return the voltages of a dataset dir or of a npy-file
+
+    Returns:
+        np.ndarray: voltages of shape (n_frames, n_freq, n_exc, n_ch)
+        (memory-mapped if possible)
+    """
+    if os.path.isdir(voltages_path):
+        return MeasurementDatasetFile.open(voltages_path).memmap_voltages()
+    return np.load(voltages_path, mmap_mode="r")
+
+
+def convert_legacy_dataset(dir_path: str, npy_path: str) -> None:
+    """Convert the frames JSON-files of a legacy dataset dir in a npy-file
+    of shape (n_frames, n_freq, n_exc, n_ch)"""
+    volt = []
+    for file in _legacy_frame_files(dir_path):
+        frame = _read_json(os.path.join(dir_path, file))
+        volt.append(
+            [
+                np.array(m["voltage"]["array_real"])
+                + 1j * np.array(m["voltage"]["array_imag"])
+                for m in frame["meas"]
+            ]
+        )
+    np.save(npy_path, np.array(volt, dtype=complex))
+
+
+def _legacy_frame_files(dir_path: str) -> list[str]:
+    files = sorted(
+        f for f in os.listdir(dir_path) if f.startswith("Frame") and f.endswith(".json")
+    )
+    if not files:
+        raise FileNotFoundError(f"No Frames-files in directory: {dir_path}!")
+    return files
+
+
+def _read_json(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+## =============================================================================
+##  Reconstruction
+## =============================================================================
+
+
+class BatchReconstructor(object):
+    """Reconstruct frames of a dataset (one instance per process)"""
+
+    def __init__(self, cfg: BatchRecConfig) -> None:
+        self.cfg = cfg
+        self.voltages = load_voltages(cfg.voltages_path)
+        self.eit_rec = self._init_reconstruction(cfg)
+
+    def _init_reconstruction(
+        self, cfg: BatchRecConfig
+    ) -> eit_model.reconstruction.EITReconstruction:
+        eit_mdl = eit_model.model.EITModel()
+        if cfg.model_path:
+            eit_mdl.load_matfile(cfg.model_path)
+        else:
+            eit_mdl.load_defaultmatfile()
+        if cfg.chip_path:
+            eit_mdl.load_chip_trans(cfg.chip_path)
+        if cfg.refinement is not None:
+            eit_mdl.set_refinement(cfg.refinement)
+
+        eit_rec = eit_model.reconstruction.EITReconstruction()
+        eit_rec.eit_model = eit_mdl
+        eit_rec.imaging = eit_model.imaging.build_EITImaging(
+            cfg.imaging_type, cfg.transform, cfg.show_abs
+        )
+        eit_rec.init_solver(
+            eit_model.solver_pyeit.SolverPyEIT,
+            eit_model.solver_pyeit.PyEitRecParams(**cfg.solver_params),
+        )
+        return eit_rec
+
+    def reconstruct(self, frames: list[int]) -> np.ndarray:
+        """Reconstruct the frames
+
+        Returns:
+            np.ndarray: reconstructed data of shape (len(frames), n_out)
+        """
+        idx = ExtractIndexes(
+            ref_idx=self.cfg.ref_frame,
+            ref_freq=self.cfg.ref_freq,
+            meas_idx=self.cfg.ref_frame,
+            meas_freq=self.cfg.meas_freq,
+            imaging=self.cfg.imaging_type,
+        )
+        v_ref, v_meas = [], []
+        for i in frames:
+            idx.set_ref_idx(i)
+            idx.set_meas_idx(i)
+            ref_idx = self.cfg.ref_frame if idx.ref_idx is None else idx.ref_idx
+            v_ref.append(self._channel_voltage(ref_idx, idx.ref_freq))
+            v_meas.append(self._channel_voltage(idx.meas_idx, idx.meas_freq))
+        images = reconstruct_batch(self.eit_rec, v_ref, v_meas)
+        return np.stack([np.asarray(img.data) for img in images])
+
+    def _channel_voltage(self, idx_frame: int, idx_freq: int) -> EITChannelVoltage:
+        return EITChannelVoltage(
+            volt=np.asarray(self.voltages[idx_frame, idx_freq], dtype=complex),
+            labels=EITVoltageLabels(
+                idx_frame, idx_freq, f"Frame #{idx_frame}", f"Frequency #{idx_freq}"
+            ),
+        )
+
+
+_reconstructor: BatchReconstructor = None  # reconstructor of a worker process
+
+
+def _init_worker(cfg: BatchRecConfig) -> None:
+    global _reconstructor
+    _reconstructor = BatchReconstructor(cfg)
+
+
+def _reconstruct_chunk(frames: list[int]) -> tuple[list[int], np.ndarray]:
+    return frames, _reconstructor.reconstruct(frames)
+
+
+def run_batch(
+    cfg: BatchRecConfig,
+    output_path: str,
+    workers: int = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Union[np.ndarray, None]:
+    """Reconstruct all frames with a process pool and write the results in
+    a npy-file
+
+    Args:
+        cfg (BatchRecConfig): configuration of the reconstruction
+        output_path (str): npy-file path
+        workers (int, optional): nb of processes. Defaults to None (nb of
+        cpus).
+        chunk_size (int, optional): nb of frames per task. Defaults to
+        CHUNK_SIZE.
+
+    Returns:
+        Union[np.ndarray, None]: reconstructed data of shape
+        (n_frames, n_out) (memory-mapped on the output file), `None` if the
+        dataset contains no frames
+    """
+    n_frames = len(load_voltages(cfg.voltages_path))
+    if n_frames == 0:
+        logger.warning(f"No frames in dataset {cfg.voltages_path}")
+        return None
+    chunks = [
+        list(range(i, min(i + chunk_size, n_frames)))
+        for i in range(0, n_frames, chunk_size)
+    ]
+
+    out = None
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(cfg,)
+    ) as pool:
+        futures = [pool.submit(_reconstruct_chunk, c) for c in chunks]
+        for n_done, future in enumerate(as_completed(futures), start=1):
+            frames, data = future.result()
+            if out is None:
+                out = np.lib.format.open_memmap(
+                    output_path,
+                    mode="w+",
+                    dtype=data.dtype,
+                    shape=(n_frames, *data.shape[1:]),
+                )
+            out[frames[0] : frames[-1] + 1] = data
+            logger.info(f"Chunks reconstructed: {n_done}/{len(chunks)}")
+    out.flush()
+    logger.info(f"Reconstructed data of {n_frames} frames saved in: {output_path}")
+    return out
+
+
+## =============================================================================
+##  Command line
+## =============================================================================
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m eit_app.batch_cli",
+        description="Reconstruct all frames of a measurement dataset",
+    )
+    parser.add_argument("dataset_dir", help="measurement dataset directory")
+    parser.add_argument("-o", "--output", help="output npy-file (default: in dataset dir)")
+    parser.add_argument("--model", help="EIT model mat-file (default model if not set)")
+    parser.add_argument("--chip", help="chip transformation txt-file")
+    parser.add_argument("--refinement", type=float, help="FEM refinement")
+    # solver params (see PyEitRecParams)
+    parser.add_argument("--solver", default="JAC", help="pyEIT solver type")
+    parser.add_argument("--p", type=float, default=0.5)
+    parser.add_argument("--lamb", type=float, default=0.01)
+    parser.add_argument("--n", type=int, default=64)
+    parser.add_argument("--normalize", action="store_true")
+    parser.add_argument("--background", type=float, default=1.0)
+    parser.add_argument("--method", default="kotre")
+    parser.add_argument("--weight", default="none")
+    parser.add_argument("--mesh-2D", action="store_true", dest="mesh_2D")
+    # imaging (see build_EITImaging and ExtractIndexes)
+    parser.add_argument("--imaging", required=True, help="imaging type")
+    parser.add_argument("--transform", required=True, help="data transformation")
+    parser.add_argument("--abs", action="store_true", help="show absolute values")
+    parser.add_argument("--ref-frame", type=int, default=0, help="TD ref frame")
+    parser.add_argument("--ref-freq", type=int, default=0)
+    parser.add_argument("--meas-freq", type=int, default=0)
+    # processing
+    parser.add_argument("-w", "--workers", type=int, help="nb of processes")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    """Run the batch reconstruction from command line"""
+    args = build_parser().parse_args(argv)
+    dataset_dir = os.path.abspath(args.dataset_dir)
+    output = args.output or os.path.join(dataset_dir, "reconstruction.npy")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        voltages_path = dataset_dir
+        if not is_dataset_file_in(dataset_dir):
+            # legacy dataset: frames converted once and shared by the workers
+            voltages_path = os.path.join(tmp_dir, "voltages.npy")
+            convert_legacy_dataset(dataset_dir, voltages_path)
+
+        cfg = BatchRecConfig(
+            voltages_path=voltages_path,
+            model_path=args.model,
+            chip_path=args.chip,
+            refinement=args.refinement,
+            solver_params=dict(
+                solver_type=args.solver,
+                p=args.p,
+                lamb=args.lamb,
+                n=args.n,
+                normalize=args.normalize,
+                background=args.background,
+                method=args.method,
+                weight=args.weight,
+                mesh_generation_mode_2D=args.mesh_2D,
+            ),
+            imaging_type=args.imaging,
+            transform=args.transform,
+            show_abs=args.abs,
+            ref_frame=args.ref_frame,
+            ref_freq=args.ref_freq,
+            meas_freq=args.meas_freq,
+        )
+        out = run_batch(cfg, output, args.workers, args.chunk_size)
+    return 0 if out is not None else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
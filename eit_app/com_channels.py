@@ -44,6 +44,7 @@ class Obj2Class(SignalReciever)
 
 from abc import ABC
 from dataclasses import dataclass, field
+from enum import Enum
 from queue import Queue
 from typing import Any, Callable
 
@@ -113,6 +114,36 @@ class Data2Compute:
     v_meas: EITChannelVoltage  
 
 
+class ComputePolicy(Enum):
+    """Backpressure policies of the computation input queue"""
+
+    LATEST_ONLY = "Latest only"  # the waiting data are dropped (live view)
+    EVERY_NTH = "Every Nth"  # only every Nth recieved data is computed
+    BOUNDED_FIFO = "Bounded FIFO"  # the producer blocks if N data are waiting
+    PROCESS_ALL = "Process all"  # all data are computed (unbounded queue)
+
+
+@dataclass
+class SetComputePolicy:
+    """
+    policy: ComputePolicy
+    n: int N of EVERY_NTH / size of the BOUNDED_FIFO
+    """
+
+    policy: ComputePolicy
+    n: int = 8
+
+
+@dataclass
+class SetComputeReplay:
+    """
+    playing: bool if an auto replay is running (all frames are then computed,
+    see ComputingAgent.set_compute_replay)
+    """
+
+    playing: bool
+
+
 class AddToComputationSignal(object):
     to_computation: Signal
 
@@ -128,7 +159,13 @@ class AddToComputationSignal(object):
 
 @dataclass
 class DataInit4Start:
+    """
     dev_setup: SciospecSetup
+    raw_journal: bool if the raw rx frames are journaled (see DataStartRawJournal)
+    """
+
+    dev_setup: SciospecSetup
+    raw_journal: bool = False
 
 
 @dataclass
@@ -167,6 +204,7 @@ class AddToDatasetSignal(object):
 @dataclass
 class DataSaveLoadImage:
     frame_path: str
+    frame_idx: int = None
 
 
 @dataclass
@@ -210,6 +248,17 @@ class DataCheckBurst:
     nb_frame_measured: str
 
 
+@dataclass
+class DataStartRawJournal:
+    """
+    dir: str output directory of the dataset
+    time_stamps: str time stamps of the dataset
+    """
+
+    dir: str
+    time_stamps: str
+
+
 class AddToDeviceSignal(object):
     to_device: Signal
 
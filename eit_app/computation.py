@@ -1,10 +1,13 @@
+from concurrent.futures import Future
 import logging
-from queue import Queue
-from typing import Any
+from threading import Condition, Lock
+from typing import Any, Callable, Union
 
 
 from eit_app.com_channels import (AddToGuiSignal, AddToPlotSignal,
-                                  Data2Compute, Data2Plot, SignalReciever)
+                                  ComputePolicy, Data2Compute, Data2Plot,
+                                  SetComputePolicy, SetComputeReplay,
+                                  SignalReciever)
 from eit_app.plots import (PlotterChannelVoltageMonitoring,
                                PlotterEITChannelVoltage, PlotterEITData,
                                PlotterEITImage2D, PlotterEITImage2Greit,
@@ -12,18 +15,27 @@ from eit_app.plots import (PlotterChannelVoltageMonitoring,
 from eit_model.greit import greit_filter
 from eit_model.reconstruction import EITReconstruction
 from eit_model.solver_abc import Solver
-from eit_model.data import EITReconstructionData, EITFrameMeasuredChannelVoltage
+from eit_model.data import EITImage
 from glob_utils.decorator.decorator import catch_error
-from glob_utils.thread_process.threads_worker import Poller
+from eit_app.worker import QueueWorker
+from eit_app.reconstruction_batch import build_rec_data, reconstruct_batch
+from eit_app.rec_process import ReconstructionProcess, RecResults
+from eit_app.solver_cache import SolverCache
 import glob_utils.file.mat_utils
 
 from eit_app.widget_3d import PyVista3DPlot
+from eit_app.update_gui import EvtDataComputeStats
 
 logger = logging.getLogger(__name__)
 
 
 class ComputingAgent(SignalReciever, AddToPlotSignal, AddToGuiSignal):
-    def __init__(self, reconstruction: EITReconstruction):
+    def __init__(
+        self,
+        reconstruction: EITReconstruction,
+        solver_cache: SolverCache = None,
+        rec_process: ReconstructionProcess = None,
+    ):
         """The Computing agent is responsible to compute EIT image in a
         separate Thread compute.
 
@@ -34,19 +46,65 @@ class ComputingAgent(SignalReciever, AddToPlotSignal, AddToGuiSignal):
         The images ar then directly send to the plottingagent responsible of
         plotting the image , voltages graphs, ...
 
+        if a solver_cache is given the initialized solvers are cached (see
+        init_solver)
+
+        the plot destinations can subscribe to the outputs (see subscribe),
+        so that the outputs which are not consumed (hidden canvas, no 3D
+        window,...) are neither computed nor sent
+
+        the backpressure policy of the input buffer can be set (see
+        set_compute_policy), per default only the latest data is computed.
+        The nb of data recieved, computed and dropped are sent to the gui
+
+        if a rec_process is given the reconstruction runs in a worker process
+        (started by init_solver), the reconstruction object is then only
+        used as configuration and should be modified using set_rec_attr and
+        call_rec
+
         """
         super().__init__()
 
-        self.init_reciever(data_callbacks={Data2Compute: self.add_data2compute})
+        self.init_reciever(
+            data_callbacks={
+                Data2Compute: self.add_data2compute,
+                SetComputePolicy: self.set_compute_policy,
+                SetComputeReplay: self.set_compute_replay,
+            }
+        )
 
-        self.input_buf = Queue()
-        self.compute_worker = Poller(
-            name="compute", pollfunc=self._poll_input_buf, sleeptime=0.01
+        # per default (live view) data 2 compute can be ignored if multiple
+        # data has been added during a computation. it doesn't make sense to
+        # compute all of them if computation take so much time, only the
+        # last one is computed (see set_compute_policy)
+        self.compute_worker = QueueWorker(
+            name="compute",
+            process_func=self._process_and_notify,
+            latest_only=True,
+            drop_func=self._drop,
         )
+        self.policy = SetComputePolicy(ComputePolicy.LATEST_ONLY)
+        # policy to restore after an auto replay (see set_compute_replay)
+        self._policy_before_replay: Union[SetComputePolicy, None] = None
+        self._input_space = Condition()  # notified when a data leaves the buffer
+        self._n_queued = 0
+        self._n_received = 0
+        self._n_dropped = 0
+        self._n_computed = 0
+        self._stats_gen = 0  # incremented at each reset of the counters
+        self.input_buf = self.compute_worker.queue
         self.compute_worker.start()
-        self.compute_worker.start_polling()
+        self.compute_worker.start_processing()
+        self._processed = Condition()  # notified after each processing
+        self._n_processed = 0
         self._data_exported=False
         self.eit_rec= reconstruction
+        self._rec_lock = Lock()  # eit_rec used by the worker and batch calls
+        self.solver_cache = solver_cache
+        self._consumers: dict[type, list[Callable[[], bool]]] = {}
+        self._last_data: Data2Compute = None
+        self._last_results: RecResults = None
+        self.rec_process = rec_process
 
     def add_data2compute(self, data: Data2Compute = None, **kwargs):
         """Put the data in the input buffer
@@ -57,78 +115,348 @@ class ComputingAgent(SignalReciever, AddToPlotSignal, AddToGuiSignal):
         if not isinstance(data, Data2Compute):
             logger.error(f"wrong type of data, type Data2Compute expected: {data=}")
             return
-        self.input_buf.put(data)
+        with self._input_space:
+            self._n_received += 1
+            policy = self.policy
+            if (
+                policy.policy == ComputePolicy.EVERY_NTH
+                and (self._n_received - 1) % policy.n
+            ):
+                self._n_dropped += 1
+                return
+            # the producer waits for a free place in the bounded FIFO
+            self._input_space.wait_for(
+                lambda: self.policy.policy != ComputePolicy.BOUNDED_FIFO
+                or self._n_queued < self.policy.n
+            )
+            self._n_queued += 1
+        self.compute_worker.put(data)
+
+    def set_compute_policy(self, data: SetComputePolicy, **kwargs) -> None:
+        """Set the backpressure policy of the input buffer, the counters are
+        reset (see _apply_policy)
 
-    def _poll_input_buf(self):
-        """Retrieve the last data to compute out of input_buffer
+        - LATEST_ONLY: only the latest waiting data is computed (live view)
+        - EVERY_NTH: only every Nth recieved data is computed
+        - BOUNDED_FIFO: all data are computed, adding data blocks if N data
+        are already waiting (e.g. replay)
+        - PROCESS_ALL: all data are computed, the buffer is unbounded
 
-        here data 2 compute can be ignorde if betwet two threads polling
-        multiple data has been added. it doesn't make sense to compute all of
-        then if computation take so much time
+        a policy set during an auto replay is kept after it
         """
-        if self.input_buf.empty():
+        if data.n < 1:
+            logger.error(f"wrong N for compute policy: {data}")
             return
-        # process only the last data added, ignore the rest
-        while not self.input_buf.empty():
-            data = self.input_buf.get()
-        self.process(data)
+        self._policy_before_replay = None
+        self._apply_policy(data)
+
+    def set_compute_replay(self, data: SetComputeReplay, **kwargs) -> None:
+        """Compute all frames during an auto replay
+
+        At the start of the replay the actual policy is saved and the
+        BOUNDED_FIFO policy is set with the actual N (the replay then waits
+        for the computation), the counters are reset. At the end the stats
+        of the replay are reported and the saved policy is restored without
+        resetting the counters.
+        """
+        if data.playing:
+            if self._policy_before_replay is None:
+                self._policy_before_replay = self.policy
+            self._apply_policy(SetComputePolicy(ComputePolicy.BOUNDED_FIFO, self.policy.n))
+            return
+        if (policy := self._policy_before_replay) is None:
+            return  # a policy has been set during the replay
+        self._policy_before_replay = None
+        received, computed, dropped = self.compute_stats()
+        logger.info(
+            f"Replay computation - frames recieved: {received}, computed: {computed}, dropped: {dropped}"
+        )
+        self._apply_policy(policy, reset_stats=False)
+
+    def _apply_policy(self, data: SetComputePolicy, reset_stats: bool = True) -> None:
+        """Set the policy and reset the counters if asked (the data still
+        waiting in the buffer are counted as recieved with the new policy,
+        the one being computed is not counted)"""
+        with self._input_space:
+            self.policy = data
+            self.compute_worker.set_latest_only(data.policy == ComputePolicy.LATEST_ONLY)
+            if reset_stats:
+                self._n_received = self._n_queued
+                self._n_dropped = 0
+                self._n_computed = 0
+                self._stats_gen += 1
+            self._input_space.notify_all()
+        logger.info(f"Compute policy set to: {data.policy.value} (N={data.n})")
+        self._emit_stats()
+
+    def compute_stats(self) -> tuple[int, int, int]:
+        """Return the nb of data (recieved, computed, dropped) since the last
+        policy change"""
+        with self._input_space:
+            return (
+                self._n_received,
+                self._n_computed,
+                self._n_dropped,
+            )
+
+    def _emit_stats(self) -> None:
+        received, computed, dropped = self.compute_stats()
+        self.to_gui.emit(
+            EvtDataComputeStats(self.policy.policy.value, received, computed, dropped)
+        )
+
+    def _drop(self, data: Data2Compute) -> None:
+        """Count a data drained from the buffer without being computed"""
+        with self._input_space:
+            self._n_queued -= 1
+            self._n_dropped += 1
+            self._input_space.notify_all()
+
+    def _take(self) -> int:
+        """Count a data taken from the buffer for computation
+
+        Returns:
+            int: generation of the counters the data belongs to
+        """
+        with self._input_space:
+            self._n_queued -= 1
+            self._input_space.notify_all()
+            return self._stats_gen
+
+    def subscribe(self, destination: type, is_consuming: Callable[[], bool]) -> None:
+        """Register a consumer of the outputs for a plot destination
+
+        Args:
+            destination (type): plot destination (e.g. PlotterEITImage2D)
+            is_consuming (Callable[[], bool]): return if the outputs are
+            actually consumed (e.g. canvas visible)
+        """
+        self._consumers.setdefault(destination, []).append(is_consuming)
+
+    def is_consumed(self, *destinations: type) -> bool:
+        """Assess if the outputs of one of the plot destinations are consumed,
+        destinations without any subscribed consumer are always consumed"""
+        for d in destinations:
+            consumers = self._consumers.get(d)
+            if consumers is None or any(c() for c in consumers):
+                return True
+        return False
+
+    def recompute_last(self) -> None:
+        """Compute the last data again (e.g. to refresh outputs which were
+        not consumed during the last computation)"""
+        if self._last_data is not None:
+            self.add_data2compute(self._last_data)
 
     @catch_error
-    def init_solver(self, solver: Solver, params: Any) -> None:
+    def init_solver(self, solver: Solver, params: Any, cache_key: str = None) -> None:
         """Initialize internal solver, optionaly new solver or reconstruction
         parameters can be set before
+
+        If a cache_key is given (see SolverCache.build_key) and a solver
+        cache is set, the initialized solver (and eit model) are loaded from
+        the cache if present, otherwise they are cached after initialization.
+        On a cache hit the eit model of the reconstruction is replaced by the
+        cached one (referenced by the solver), the owner of the eit model
+        should then use it (see UiBackEnd._sync_eit_mdl)
         """
-        img_rec, data_sim =self.eit_rec.init_solver(solver,params)
+        if self.rec_process is not None:
+            # the process is restarted with the new solver
+            eit_model, img_rec, data_sim = self.rec_process.start(
+                self.eit_rec, solver, params, cache_key, self.solver_cache
+            )
+            self._emit_init_results(eit_model, img_rec, data_sim)
+            return
+        with self._rec_lock:
+            if (entry := self._get_cached_solver(cache_key)) is not None:
+                self.eit_rec.solver, self.eit_rec.eit_model, img_rec, data_sim = entry
+            else:
+                img_rec, data_sim =self.eit_rec.init_solver(solver,params)
+                self._cache_solver(cache_key, img_rec, data_sim)
+        self._emit_init_results(self.eit_rec.eit_model, img_rec, data_sim)
 
-        self.to_plot.emit(Data2Plot(self.eit_rec.eit_model, {}, PyVista3DPlot))
+    def _emit_init_results(self, eit_model: Any, img_rec: Any, data_sim: Any) -> None:
+        self.to_plot.emit(Data2Plot(eit_model, {}, PyVista3DPlot))
         self.to_plot.emit(Data2Plot(img_rec, {}, PlotterEITImage2D))
         self.to_plot.emit(Data2Plot(data_sim, {}, PlotterEITData))
 
+    def set_rec_attr(self, attr: str, value: Any) -> None:
+        """Set an attribute of the reconstruction (e.g. imaging), also in the
+        reconstruction process if running"""
+        with self._rec_lock:
+            setattr(self.eit_rec, attr, value)
+        if self.rec_process is not None:
+            self.rec_process.set_attr(attr, value)
+
+    def call_rec(self, method: str, *args: Any) -> None:
+        """Call a method of the reconstruction (e.g. set_monitoring), also in
+        the reconstruction process if running"""
+        with self._rec_lock:
+            getattr(self.eit_rec, method)(*args)
+        if self.rec_process is not None:
+            self.rec_process.call(method, *args)
+
+    def _is_rec_in_process(self) -> bool:
+        return self.rec_process is not None and self.rec_process.is_running()
+
+    def _get_cached_solver(self, cache_key: str = None) -> Any:
+        """Return the cached entry (solver, eit_model, img_rec, data_sim)"""
+        if self.solver_cache is None or cache_key is None:
+            return None
+        return self.solver_cache.get(cache_key)
+
+    def _cache_solver(self, cache_key: str, img_rec: Any, data_sim: Any) -> None:
+        """Cache the actual solver and eit_model with the init results"""
+        if self.solver_cache is None or cache_key is None:
+            return
+        entry = (self.eit_rec.solver, self.eit_rec.eit_model, img_rec, data_sim)
+        self.solver_cache.put(cache_key, entry)
+
     @catch_error
-    def process(self, data: Data2Compute) -> None:
+    def process(self, data: Data2Compute) -> Union[Future, None]:
         """Compute the eit image
         - get eit_data for reconstruction
         - reconstruct eit image
 
         Args:
             data (Data2Compute): data for reconstruction
+
+        Returns:
+            Union[Future, None]: if the reconstruction runs in the
+            reconstruction process, future resolved after sending the outputs
         """
-        self._is_processing= True
+        self._last_data= data
+        monitoring= self.is_consumed(
+            PlotterEITChannelVoltage, PlotterChannelVoltageMonitoring
+        )
+        if self._is_rec_in_process():
+            future= self.rec_process.submit(data.v_ref, data.v_meas, monitoring)
+            future.add_done_callback(self._emit_results_future)
+            return future
 
         # convert Data2Compute to EITReconatrsuction data
-        data_rec= EITReconstructionData(
-            ref_frame= EITFrameMeasuredChannelVoltage(
-                volt= data.v_ref.volt,
-                name=data.v_ref.get_frame_name(),
-                freq=data.v_ref.get_frame_freq(),
-            ),
-            meas_frame= EITFrameMeasuredChannelVoltage(
-                volt= data.v_meas.volt,
-                name=data.v_meas.get_frame_name(),
-                freq=data.v_meas.get_frame_freq(),
-            ),
-        )
-        self.eit_rec.rec_process(data_rec)
-        
-        # monitoring
-        monitoring_data, ch_data, ch_labels= self.eit_rec.monitoring_results()
-        self.to_plot.emit(Data2Plot(ch_data, ch_labels, PlotterEITChannelVoltage))
-        self.to_plot.emit(
-             Data2Plot(monitoring_data, ch_labels, PlotterChannelVoltageMonitoring)
-        )
-        eit_image, eit_data, plot_labels= self.eit_rec.imaging_results()
-        self.to_plot.emit(Data2Plot(eit_data, plot_labels, PlotterEITData))
+        data_rec= build_rec_data(data.v_ref, data.v_meas)
+        with self._rec_lock:
+            self.eit_rec.rec_process(data_rec)
+            mon= self.eit_rec.monitoring_results() if monitoring else ()
+            results= RecResults(*self.eit_rec.imaging_results(), *mon)
+        self._emit_results(results)
+        return None
+
+    def _emit_results_future(self, future: Future) -> None:
+        """Send the results of the reconstruction process to plot"""
+        if (e := future.exception()) is not None:
+            logger.error(f"Reconstruction error: {e}")
+            return
+        self._emit_results(future.result())
+
+    def _emit_results(self, results: RecResults) -> None:
+        """Send the results to plot (if consumed)"""
+        self._last_results= results
+        eit_image= results.eit_image
+        # monitoring (only computed if consumed)
+        if results.ch_data is not None:
+            self._emit(results.ch_data, results.ch_labels, PlotterEITChannelVoltage)
+            self._emit(
+                results.monitoring_data,
+                results.ch_labels,
+                PlotterChannelVoltageMonitoring,
+            )
+        self._emit(results.eit_data, results.plot_labels, PlotterEITData)
         if eit_image is not None:
             # EIT data EIT image plot
-            self.to_plot.emit(Data2Plot(eit_image, plot_labels, PlotterEITImage2D))
-            self.to_plot.emit(Data2Plot(eit_image, plot_labels, PlotterEITImageElemData))
-            self.to_plot.emit(Data2Plot(eit_image, plot_labels, PyVista3DPlot))
-            self.to_plot.emit(Data2Plot(greit_filter(eit_image), plot_labels, PlotterEITImage2Greit))
-        self._is_processing= False
+            self._emit(eit_image, results.plot_labels, PlotterEITImage2D)
+            self._emit(eit_image, results.plot_labels, PlotterEITImageElemData)
+            self._emit(eit_image, results.plot_labels, PyVista3DPlot)
+            if self.is_consumed(PlotterEITImage2Greit):
+                self.to_plot.emit(
+                    Data2Plot(
+                        greit_filter(eit_image),
+                        results.plot_labels,
+                        PlotterEITImage2Greit,
+                    )
+                )
+
+    def _emit(self, data: Any, labels: dict, destination: type) -> None:
+        """Send data to plot if consumed by the destination"""
+        if self.is_consumed(destination):
+            self.to_plot.emit(Data2Plot(data, labels, destination))
+
+    def _process_and_notify(self, data: Data2Compute) -> None:
+        """Process the data and notify the waiting threads (after the
+        reconstruction in the reconstruction process if running)"""
+        gen = self._take()
+        future = None
+        try:
+            future = self.process(data)
+        finally:
+            if future is None:
+                self._notify_processed(gen)
+            else:
+                future.add_done_callback(lambda _: self._notify_processed(gen))
+
+    def _notify_processed(self, gen: int) -> None:
+        """Count a processed data (as computed if the counters were not reset
+        since it was taken) and notify the waiting threads"""
+        with self._input_space:
+            if gen == self._stats_gen:
+                self._n_computed += 1
+        with self._processed:
+            self._n_processed += 1
+            self._processed.notify_all()
+        self._emit_stats()
+
+    def processed_count(self) -> int:
+        """Return the nb of data processed since start"""
+        with self._processed:
+            return self._n_processed
+
+    def wait_processed(self, count: int, timeout: float = None) -> bool:
+        """Block until at least `count` data have been processed (see
+        processed_count)
+
+        Args:
+            count (int): nb of processed data to wait for
+            timeout (float, optional): max waiting time in s. Defaults to None.
+
+        Returns:
+            bool: `False` if the timeout elapsed
+        """
+        with self._processed:
+            return self._processed.wait_for(
+                lambda: self._n_processed >= count, timeout
+            )
+
+    def reconstruct_batch(self, data: list[Data2Compute]) -> list[EITImage]:
+        """Reconstruct a stack of frames (e.g. a frame range of a loaded
+        dataset, see MeasurementDataset.get_data2compute_batch)
+
+        For linear solvers all frames are reconstructed with one
+        matrix-matrix product (see reconstruction_batch). Nothing is plotted.
+
+        Args:
+            data (list[Data2Compute]): data for reconstruction of each frame
+
+        Returns:
+            list[EITImage]: reconstructed images (one per frame)
+        """
+        if not data:
+            return []
+        if self._is_rec_in_process():
+            return self.rec_process.reconstruct_batch(
+                [d.v_ref for d in data], [d.v_meas for d in data]
+            )
+        with self._rec_lock:
+            return reconstruct_batch(
+                self.eit_rec, [d.v_ref for d in data], [d.v_meas for d in data]
+            )
 
     def export_eit_data(self, path):
         self._data_exported=False
-        _, eit_data, _= self.eit_rec.imaging_results()
+        if self._last_results is None:
+            logger.warning("No EIT data to export")
+            return
+        eit_data= self._last_results.eit_data
         data = {'X_h': eit_data.ref_frame,'X_ih': eit_data.frame }
         path= f"{path}"
         glob_utils.file.mat_utils.save_as_mat(path, data)
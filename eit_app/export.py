@@ -1,10 +1,11 @@
 
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 import itertools
 import logging
 import os
-from typing import Callable
+from typing import Callable, Union
 from PyQt5 import QtWidgets
 from eit_app.computation import ComputingAgent
 from eit_app.gui_utils import get_comboBox_allItemsIndex, set_comboBox_index
@@ -12,18 +13,12 @@ from eit_app.sciospec.measurement import MeasurementDataset
 from eit_app.sciospec.replay import ReplayMeasurementsAgent
 import glob_utils.directory.utils
 import eit_app.gui
-from threading import Timer
 import glob_utils.dialog.Qt_dialogs
 
 logger = logging.getLogger(__name__)
 
+EXPORT_TIMEOUT = 30.0  # in s, max waiting time for a computation or an export
 
-class RepeatTimer(Timer):
-    """Thread Timer which start all over again"""
-
-    def run(self):
-        while not self.finished.wait(self.interval):
-            self.function(*self.args, **self.kwargs)
 
 @dataclass
 class ExportFunc:
@@ -31,10 +26,26 @@ class ExportFunc:
     func:Callable # should acccept only a path to export data
     is_exported:Callable # should return a bool about the status of the export
     before_compute:bool= True # determine if the func is called after the computation
+    wait_exported:Callable[[float], bool]= None # block until exported (arg: timeout), for asynchronous exports
 
     def run(self, *args, **kwargs):
         if self.enable_func():
             self.func(*args, **kwargs)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until the export is done (if enabled)
+
+        Args:
+            timeout (float, optional): max waiting time in s. Defaults to None.
+
+        Returns:
+            bool: `False` if the export is not done
+        """
+        if not self.enable_func():
+            return True
+        if self.wait_exported is not None:
+            return self.wait_exported(timeout)
+        return self.is_exported()
     
 @dataclass
 class ParamsToLoopOn:
@@ -73,6 +84,7 @@ class ExportAgent:#
     computing:ComputingAgent
     params_to_loop_on:list[ParamsToLoopOn]
     export_func:list[ExportFunc]
+    futures:list[Future]
 
     def __init__(self, replay_agent:ReplayMeasurementsAgent, dataset:MeasurementDataset, computing:ComputingAgent, ui:eit_app.gui.Ui_MainWindow) -> None:
         self.ui=ui
@@ -81,6 +93,9 @@ class ExportAgent:#
         self.computing= computing
         self.params_to_loop_on=[]
         self.export_func=[]
+        self.futures=[]
+        # the combinations are exported one after the other in this thread
+        self._executor= ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
 
     def add_params(self, param:ParamsToLoopOn)->None:
         self.params_to_loop_on.append(param)
@@ -88,23 +103,50 @@ class ExportAgent:#
     def add_export(self, export:ExportFunc)->None:
         self.export_func.append(export)
     
-    def run_export(self):
-        """"""
+    def run_export(self) -> Union[list[Future], None]:
+        """Export all combinations of the params to loop on
+
+        Each combination is exported as soon as the previous one is done
+        (computation and all enabled exports)
+
+        Returns:
+            Union[list[Future], None]: one future per combination resolving
+            to `True` if all exports have been done, `None` if the export can
+            not be started
+        """
         if not self.replay_agent.is_idle:
             glob_utils.dialog.Qt_dialogs.infoMsgBox("Export Aborded", "Load a dataset or stop auto replay")
-            return
+            return None
+        if self.is_running():
+            glob_utils.dialog.Qt_dialogs.infoMsgBox("Export Aborded", "Export already running")
+            return None
 
         self._datetime= glob_utils.directory.utils.get_datetime_s()
         a= [p.get_list() for p in self.params_to_loop_on]
         self.combinations=list(itertools.product(*a))
-        self._comb_idx=0
-        self.timer= RepeatTimer(2.0, self._export_plots)
-        self.timer.start()
-        
-
-    def _export_plots(self):
-        """"""
-        c= self.combinations[self._comb_idx]
+        self.futures= [
+            self._executor.submit(self._export_combination, c)
+            for c in self.combinations
+        ]
+        if self.futures:
+            self.futures[-1].add_done_callback(lambda _: logger.info('Export - DONE'))
+        return self.futures
+
+    def is_running(self) -> bool:
+        """Assess if an export is running"""
+        return any(not f.done() for f in self.futures)
+
+    def cancel_export(self) -> None:
+        """Cancel the combinations not yet exported"""
+        for f in self.futures:
+            f.cancel()
+
+    def _export_combination(self, c:tuple) -> bool:
+        """Set the params of the combination, compute the frame and export
+
+        Returns:
+            bool: `True` if all enabled exports have been done
+        """
         t=""
         for val, p in zip(c,self.params_to_loop_on):
             p.set_val(val)
@@ -119,25 +161,14 @@ class ExportAgent:#
         path= os.path.join(dir_path, f"{self._datetime}{par_text}")
         [export.run(path) for export in self.export_func if export.before_compute]
 
+        n_processed= self.computing.processed_count()
         self.replay_agent.compute_meas_frame(frame_idx)
-        while not self.computing._is_processing:
-            pass
-        while self.computing._is_processing:
-            pass
-        
-        [export.run(path) for export in self.export_func if not export.before_compute]
-        # logger.debug(f"{frame_idx}: {self.replay_agent.actual_frame_idx}")
+        if not self.computing.wait_processed(n_processed + 1, EXPORT_TIMEOUT):
+            logger.warning(f"Export {par_text}: computation timeout")
 
-        while not any(export.is_exported() for export in self.export_func):
-            pass
-    
-        # [export.run(path) for export in self.export_func if not export.before_compute]
-
-        # while not all(export.is_exported() for export in self.export_func):
-        #     pass
+        [export.run(path) for export in self.export_func if not export.before_compute]
 
-        self._comb_idx +=1
-        if self._comb_idx>= len(self.combinations):
-            self.timer.cancel()
-            logger.info('Export - DONE')
-            # glob_utils.dialog.Qt_dialogs.infoMsgBox("Export Done", "Export Done")
\ No newline at end of file
+        done= all([export.wait(EXPORT_TIMEOUT) for export in self.export_func])
+        if not done:
+            logger.warning(f"Export {par_text}: not all exports done")
+        return done
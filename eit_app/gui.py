@@ -57,6 +57,22 @@ class Ui_MainWindow(object):
         self.pB_activate_calibration.setDefault(False)
         self.pB_activate_calibration.setObjectName("pB_activate_calibration")
         self.verticalLayout_10.addWidget(self.pB_activate_calibration)
+        self.horizontalLayout_19 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_19.setObjectName("horizontalLayout_19")
+        self.lab_compute_policy = QtWidgets.QLabel(self.tab_eit)
+        self.lab_compute_policy.setObjectName("lab_compute_policy")
+        self.horizontalLayout_19.addWidget(self.lab_compute_policy)
+        self.cB_compute_policy = QtWidgets.QComboBox(self.tab_eit)
+        self.cB_compute_policy.setObjectName("cB_compute_policy")
+        self.horizontalLayout_19.addWidget(self.cB_compute_policy)
+        self.sB_compute_policy_n = QtWidgets.QSpinBox(self.tab_eit)
+        self.sB_compute_policy_n.setMinimum(1)
+        self.sB_compute_policy_n.setMaximum(1000)
+        self.sB_compute_policy_n.setProperty("value", 8)
+        self.sB_compute_policy_n.setObjectName("sB_compute_policy_n")
+        self.horizontalLayout_19.addWidget(self.sB_compute_policy_n)
+        self.horizontalLayout_19.setStretch(1, 1)
+        self.verticalLayout_10.addLayout(self.horizontalLayout_19)
         self.groupBox_9 = QtWidgets.QGroupBox(self.tab_eit)
         self.groupBox_9.setObjectName("groupBox_9")
         self.verticalLayout_8 = QtWidgets.QVBoxLayout(self.groupBox_9)
@@ -366,6 +382,9 @@ class Ui_MainWindow(object):
         self.pB_set_setup.setAutoFillBackground(False)
         self.pB_set_setup.setObjectName("pB_set_setup")
         self.horizontalLayout_10.addWidget(self.pB_set_setup)
+        self.chB_set_setup_full = QtWidgets.QCheckBox(self.toolBox_4Page1)
+        self.chB_set_setup_full.setObjectName("chB_set_setup_full")
+        self.horizontalLayout_10.addWidget(self.chB_set_setup_full)
         self.pB_get_setup = QtWidgets.QPushButton(self.toolBox_4Page1)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Preferred, QtWidgets.QSizePolicy.Fixed)
         sizePolicy.setHorizontalStretch(0)
@@ -1345,6 +1364,9 @@ class Ui_MainWindow(object):
         self.pB_compute.setText(_translate("MainWindow", "Compute"))
         self.pB_compute.setShortcut(_translate("MainWindow", "Esc"))
         self.pB_activate_calibration.setText(_translate("MainWindow", "Activate calibration"))
+        self.lab_compute_policy.setText(_translate("MainWindow", "Compute policy"))
+        self.cB_compute_policy.setStatusTip(_translate("MainWindow", "Backpressure policy of the computation: which recieved frames are computed"))
+        self.sB_compute_policy_n.setStatusTip(_translate("MainWindow", "N of \"Every Nth\" / size of the \"Bounded FIFO\""))
         self.groupBox_9.setTitle(_translate("MainWindow", "EIT Model"))
         self.lab_eit_mdl_ctlg.setText(_translate("MainWindow", "Catalogue"))
         self.pB_eit_mdl_refresh_ctlg.setStatusTip(_translate("MainWindow", "reload the catalog "))
@@ -1389,6 +1411,8 @@ class Ui_MainWindow(object):
         self.pB_set_setup.setStatusTip(_translate("MainWindow", "Send measurements parameters to connected device (Shift +S)"))
         self.pB_set_setup.setText(_translate("MainWindow", "Set Setup"))
         self.pB_set_setup.setShortcut(_translate("MainWindow", "Shift+S"))
+        self.chB_set_setup_full.setStatusTip(_translate("MainWindow", "Send the whole setup and not only its changes (e.g. after a power cycle of the device)"))
+        self.chB_set_setup_full.setText(_translate("MainWindow", "full"))
         self.pB_get_setup.setStatusTip(_translate("MainWindow", "Ask measurements parameters from connected device (Shift +G)"))
         self.pB_get_setup.setText(_translate("MainWindow", "Get Setup"))
         self.pB_get_setup.setShortcut(_translate("MainWindow", "Shift+G"))
@@ -0,0 +1,239 @@
+""" Offline rebuild of a measurement dataset from a raw frame journal
+
+The measurement streams recorded in a raw frame journal (see
+eit_app.sciospec.wire_journal) are decoded and assembled in frames in
+parallel, the frames are written in a dataset file (see
+eit_app.sciospec.dataset_file) which can then be loaded as any measurement
+dataset. No gui (Qt) is needed.
+
+The streams are assigned to the frames like during the acquisition: a frame
+is complete when the streams of the last frequency have been recieved for
+all excitations and channel groups. The streams of a last incomplete frame
+are ignored.
+
+example of Use is
+
+    python -m eit_app.journal_rebuild path/to/raw_journal.sjrnl
+        --output path/to/dataset_dir --workers 8
+"""
+
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Union
+
+import numpy as np
+from eit_app.sciospec.constants import (
+    CMD_START_STOP_MEAS,
+    MEAS_STREAM_DTYPE,
+    N_CH_PER_STREAM,
+)
+from eit_app.sciospec.dataset_file import VOLTAGE_DTYPE, MeasurementDatasetFile
+from eit_app.sciospec.wire_journal import RawFrameJournalReader
+from glob_utils.file.json_utils import save_to_json
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16384  # nb of measurement streams decoded per task
+
+
+## =============================================================================
+##  Indexing
+## =============================================================================
+
+
+def index_meas_streams(
+    reader: RawFrameJournalReader, n_freq: int, n_exc: int, n_ch: int
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """Select the measurement streams of the journal and assign them to
+    frames (only the few bytes needed are read)
+
+    Args:
+        reader (RawFrameJournalReader): opened journal
+        n_freq (int): nb of frequencies
+        n_exc (int): nb of excitations
+        n_ch (int): nb of channels
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, int]: position of the streams in the
+        journal, frame index of each stream, nb of complete frames
+    """
+    is_meas = reader.lengths == MEAS_STREAM_DTYPE.itemsize
+    offsets = reader.offsets[is_meas]
+    offsets = offsets[reader.raw[offsets] == CMD_START_STOP_MEAS.tag]
+    pos = offsets + MEAS_STREAM_DTYPE.fields["freq_indx"][1]
+    freq_indx = reader.raw[pos].astype(np.int64) << 8 | reader.raw[pos + 1]
+
+    is_last = (freq_indx == n_freq - 1).astype(np.int64)
+    streams_per_frame = n_exc * max(n_ch // N_CH_PER_STREAM, 1)
+    frame_idx = (np.cumsum(is_last) - is_last) // streams_per_frame
+    n_frames = int(is_last.sum()) // streams_per_frame
+    complete = frame_idx < n_frames
+    return offsets[complete], frame_idx[complete], n_frames
+
+
+## =============================================================================
+##  Decoding (worker processes)
+## =============================================================================
+
+
+def _decode_chunk(
+    journal_path: str,
+    offsets: np.ndarray,
+    frame_idx: np.ndarray,
+    dataset_path: str,
+    data_offset: int,
+    shape: tuple[int, int, int, int],
+    excitation: list[list[int]],
+) -> int:
+    """Decode measurement streams and write their voltages in the frames of
+    the dataset file (the file has its final size)
+
+    Returns:
+        int: nb of streams written
+    """
+    raw = np.memmap(journal_path, dtype=np.uint8, mode="r")
+    itemsize = MEAS_STREAM_DTYPE.itemsize
+    streams = np.ascontiguousarray(raw[offsets[:, None] + np.arange(itemsize)])
+    streams = streams.view(MEAS_STREAM_DTYPE)[:, 0]
+
+    # excitation pair -> excitation index (unknown pairs -> 0 as online)
+    exc_lut = np.zeros(256 * 256, dtype=np.int64)
+    for i, (inj, sink) in reversed(list(enumerate(excitation))):
+        exc_lut[int(inj) * 256 + int(sink)] = i
+    exc = streams["exc"].astype(np.int64)
+    exc_idx = exc_lut[exc[:, 0] * 256 + exc[:, 1]]
+
+    freq_idx = streams["freq_indx"].astype(np.int64)
+    ch = (streams["ch_group"].astype(np.int64) - 1)[:, None] * N_CH_PER_STREAM
+    ch = ch + np.arange(N_CH_PER_STREAM)
+    valid = (freq_idx < shape[1]) & (ch[:, 0] >= 0) & (ch[:, -1] < shape[3])
+    if not valid.all():
+        logger.warning(f"{np.count_nonzero(~valid)} streams out of the frames ignored")
+
+    out = np.memmap(
+        dataset_path, dtype=VOLTAGE_DTYPE, mode="r+", offset=data_offset, shape=shape
+    )
+    out[
+        frame_idx[valid, None], freq_idx[valid, None], exc_idx[valid, None], ch[valid]
+    ] = streams["voltage"][valid]
+    out.flush()
+    return int(np.count_nonzero(valid))
+
+
+## =============================================================================
+##  Rebuild
+## =============================================================================
+
+
+def rebuild_dataset(
+    journal_path: str,
+    output_dir: str = None,
+    name: str = None,
+    workers: int = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Union[str, None]:
+    """Rebuild the measurement dataset recorded in a raw frame journal
+
+    Args:
+        journal_path (str): journal file path
+        output_dir (str, optional): dataset directory. Defaults to None (
+        directory named after the journal, next to it).
+        name (str, optional): name of the dataset. Defaults to None (name of
+        the journal).
+        workers (int, optional): nb of processes. Defaults to None (nb of
+        cpus).
+        chunk_size (int, optional): nb of streams per task. Defaults to
+        CHUNK_SIZE.
+
+    Returns:
+        Union[str, None]: dataset directory, `None` if the journal contains
+        no complete frame
+    """
+    reader = RawFrameJournalReader(journal_path)
+    freq_list, excitation = reader.get("freq_list"), reader.get("excitation")
+    n_ch = reader.get("n_channel")
+    frame_shape = (len(freq_list), len(excitation), n_ch)
+    offsets, frame_idx, n_frames = index_meas_streams(reader, *frame_shape)
+    logger.info(
+        f"Journal {journal_path}: {len(reader)} frames recieved, {len(offsets)} meas. streams, {n_frames} complete meas. frames"
+    )
+    if n_frames == 0:
+        logger.warning(f"No complete frames in journal {journal_path}")
+        return None
+
+    base = os.path.splitext(os.path.abspath(journal_path))[0]
+    output_dir = output_dir or base
+    name = name or os.path.basename(base)
+    os.makedirs(output_dir, exist_ok=True)
+    dataset_file = MeasurementDatasetFile.create(
+        output_dir,
+        frame_shape=frame_shape,
+        name=name,
+        time_stamps=reader.get("time_stamps", ""),
+        setup=reader.get("setup"),
+        freq_list=freq_list,
+        excitation=excitation,
+    )
+    dataset_file.close()
+    # frames are written in place by the workers
+    size = dataset_file.data_offset + n_frames * dataset_file.frame_nbytes
+    os.truncate(dataset_file.path, size)
+    save_to_json(os.path.join(output_dir, f"setup_{name}"), reader.get("setup"))
+
+    shape = (n_frames, *frame_shape)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _decode_chunk,
+                journal_path,
+                offsets[i : i + chunk_size],
+                frame_idx[i : i + chunk_size],
+                dataset_file.path,
+                dataset_file.data_offset,
+                shape,
+                excitation,
+            )
+            for i in range(0, len(offsets), chunk_size)
+        ]
+        for n_done, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            logger.info(f"Chunks decoded: {n_done}/{len(futures)}")
+    logger.info(f"Dataset of {n_frames} frames rebuilt in: {output_dir}")
+    return output_dir
+
+
+## =============================================================================
+##  Command line
+## =============================================================================
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m eit_app.journal_rebuild",
+        description="Rebuild a measurement dataset from a raw frame journal",
+    )
+    parser.add_argument("journal", help="raw frame journal file")
+    parser.add_argument(
+        "-o", "--output", help="dataset directory (default: next to the journal)"
+    )
+    parser.add_argument("--name", help="dataset name (default: journal name)")
+    parser.add_argument("-w", "--workers", type=int, help="nb of processes")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    """Run the rebuild from command line"""
+    args = build_parser().parse_args(argv)
+    output_dir = rebuild_dataset(
+        args.journal, args.output, args.name, args.workers, args.chunk_size
+    )
+    return 0 if output_dir is not None else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -1,10 +1,13 @@
 import logging
 from abc import ABC, abstractmethod
-from queue import Queue
-from typing import Any
+from contextlib import contextmanager
+from threading import Condition
+from time import monotonic
+from typing import Any, Union
 
 import matplotlib.pyplot
-from eit_app.com_channels import Data2Plot, SignalReciever
+import numpy as np
+from eit_app.com_channels import AddToGuiSignal, Data2Plot, SignalReciever
 from eit_model.data import EITData, EITImage, EITMeasMonitoringData
 from eit_model.plot import (
     EITCustomPlots,
@@ -15,26 +18,50 @@ from eit_model.plot import (
     MeasErrorPlot,
 )
 from glob_utils.file.utils import FileExt, append_extension
-from glob_utils.thread_process.threads_worker import Poller
+from eit_app.update_gui import EvtDataPlotStats
+from eit_app.worker import WORKER_TIMEOUT, EventWorker
+from matplotlib.artist import Artist
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT
+from matplotlib.collections import Collection
 from matplotlib.figure import Figure
 from PyQt5.QtWidgets import QVBoxLayout
 
 logger = logging.getLogger(__name__)
 
+# during live update the axes limits are only changed if the data exceed them
+# or if the data span is smaller than LIMITS_SHRINK x the actual span
+LIMITS_SHRINK = 0.5
+PLOT_STATS_PERIOD = 1.0  # in s, min time between two plot stats sent to the gui
+FALLBACK_LOG_PERIOD = 10.0  # in s, min time between two live update fallback logs
+
+
+class LiveUpdateError(Exception):
+    """The live artists can not be updated with the data"""
+
 
 class Plotter(ABC):
 
     _allowed_data_type: tuple = None
     _plotting_func: list[EITCustomPlots] = None
     _tag: str = ""
+    _live_update: bool = False  # data of the artists are updated (no rebuild)
+    _figure: Figure = None  # figure in which the live artists are
+    _artists: list[Artist] = None  # live artists (data dependent)
+    _n_fallbacks: int = 0  # nb of live updates which needed a rebuild
+    _last_fallback_log: float = -FALLBACK_LOG_PERIOD
 
     def __init__(self) -> None:
         """Create a plotter which plot defined type of data using predefined
         plotting function
+
+        For live plotters (_live_update), the figure is built only once and
+        the data dependent artists (lines, collections, images, titles) are
+        then updated with the new data by _update, they are animated so
+        that they can be redrawn by blitting
         """
         super().__init__()
         self._allowed_data_type = ()
+        self._artists = []
         self._post_init_()
 
     @abstractmethod
@@ -47,6 +74,7 @@ class Plotter(ABC):
         valid kwargs:"""
         for p in self._plotting_func:
             p.set_options(**kwargs)
+        self.invalidate()
 
     def build(self, fig: Figure, data: Data2Plot):
         """Build the layout of the figure with the data
@@ -66,6 +94,81 @@ class Plotter(ABC):
 
         self._build(fig, data.data, data.labels)
 
+        self._figure = fig
+        self._artists = []
+        if self._live_update:
+            self._artists = _live_artists(fig)
+            self.set_animated(True)
+
+    def update(self, fig: Figure, data: Data2Plot) -> Union[bool, None]:
+        """Update the live artists of the figure with the data (see _update),
+        the figure has to be rebuilt if it is not possible (the fallbacks
+        are logged and counted)
+
+        Args:
+            fig (matplotlib.pyplot.Figure): figure were to plot
+            data (Data2Plot): data to plot
+
+        Returns:
+            Union[bool, None]: `None` if the figure has to be (re)built,
+            `True` if the static part of the figure has changed (axes or color
+            limits) and a full draw is needed, `False` if the redraw of the
+            live artists is enough
+        """
+        if not self._live_update or not self._artists or fig is not self._figure:
+            return None
+        if not isinstance(data.data, self._allowed_data_type):
+            return None
+        try:
+            return self._update(fig, data.data, data.labels)
+        except Exception as e:
+            self._n_fallbacks += 1
+            if monotonic() - self._last_fallback_log >= FALLBACK_LOG_PERIOD:
+                self._last_fallback_log = monotonic()
+                logger.warning(
+                    f"Live update of {self._tag} not possible, figure rebuilt ({e!r}, {self._n_fallbacks} fallbacks)"
+                )
+            return None
+
+    def _update(self, fig: Figure, data: Any, labels: dict) -> bool:
+        """Custom update of the live artists of each live Plotter
+
+        Raises:
+            LiveUpdateError: if the artists can not be updated with the data
+
+        Returns:
+            bool: `True` if a full draw is needed (see update)
+        """
+        raise LiveUpdateError("no live update")
+
+    @property
+    def n_fallbacks(self) -> int:
+        """Nb of live updates which needed a rebuild of the figure"""
+        return self._n_fallbacks
+
+    @property
+    def live_artists(self) -> list[Artist]:
+        return self._artists
+
+    def invalidate(self) -> None:
+        """Force the rebuild of the figure at next plot"""
+        self._artists = []
+
+    def set_animated(self, animated: bool = True) -> None:
+        """Set the live artists as animated (not drawn by a figure draw)"""
+        for a in self._artists:
+            a.set_animated(animated)
+
+    @contextmanager
+    def not_animated(self):
+        """Context in which the live artists are drawn normally (e.g. for
+        saving the figure)"""
+        self.set_animated(False)
+        try:
+            yield
+        finally:
+            self.set_animated(True)
+
     @abstractmethod
     def _build(self, fig: Figure, data: Any, labels: dict):
         """Custom layout build of each custom Plotter"""
@@ -82,12 +185,24 @@ class PlotterEITImage2D(Plotter):
         self._allowed_data_type = EITImage
         self._plotting_func = [EITImage2DPlot()]
         self._tag = "EITImage2D"
+        self._live_update = True
+        self._autoscale = True
 
     def _build(self, fig: Figure, data: Any, labels: dict):
         ax = fig.add_subplot(1, 1, 1)
         lab = labels.get(self._plotting_func[0].type)
         fig, ax = self._plotting_func[0].plot(fig, ax, data, lab)
         fig.set_tight_layout(True)
+        # fixed color limits (colorbar_range) are kept during live update
+        self._autoscale = all(_autoscaled(c) for c in ax.collections)
+
+    def _update(self, fig: Figure, data: EITImage, labels: dict) -> bool:
+        (ax,) = _main_axes(fig)
+        if len(ax.collections) != 1:
+            raise LiveUpdateError(f"{len(ax.collections)} collections plotted")
+        _set_collection_values(ax.collections[0], data.data, self._autoscale)
+        _set_title(ax, labels.get(self._plotting_func[0].type))
+        return False  # the colorbar is a live artist
 
 
 class PlotterEITImage2Greit(Plotter):
@@ -131,6 +246,7 @@ class PlotterEITData(Plotter):
         self._allowed_data_type = EITData
         self._plotting_func = [EITUPlot(), EITUPlotDiff()]
         self._tag = "EITData"
+        self._live_update = True
 
     def _build(self, fig: Figure, data: Any, labels: dict):
         ax = [fig.add_subplot(2, 1, 1), fig.add_subplot(2, 1, 2)]
@@ -142,6 +258,14 @@ class PlotterEITData(Plotter):
         ax[0].set_xlabel("")
         fig.set_tight_layout(True)
 
+    def _update(self, fig: Figure, data: EITData, labels: dict) -> bool:
+        ax_u, ax_diff = _main_axes(fig)
+        _set_lines_ydata(ax_u, [data.ref_frame, data.frame])
+        _set_lines_ydata(ax_diff, [np.asarray(data.frame) - np.asarray(data.ref_frame)])
+        _set_title(ax_u, labels.get(self._plotting_func[0].type))
+        _set_title(ax_diff, labels.get(self._plotting_func[1].type))
+        return _update_limits(ax_u) | _update_limits(ax_diff)
+
 
 class PlotterEITChannelVoltage(Plotter):
     """Plot the voltages in a Uplot graph"""
@@ -150,6 +274,7 @@ class PlotterEITChannelVoltage(Plotter):
         self._allowed_data_type = EITData
         self._plotting_func = [EITUPlot()]
         self._tag = "EITChannelVoltage"
+        self._live_update = True
 
     def _build(self, fig: Figure, data: Any, labels: dict):
         ax = fig.add_subplot(1, 1, 1)
@@ -157,6 +282,12 @@ class PlotterEITChannelVoltage(Plotter):
         fig, ax = self._plotting_func[0].plot(fig, ax, data, lab)
         fig.set_tight_layout(True)
 
+    def _update(self, fig: Figure, data: EITData, labels: dict) -> bool:
+        (ax,) = _main_axes(fig)
+        _set_lines_ydata(ax, [data.ref_frame, data.frame])
+        _set_title(ax, labels.get(self._plotting_func[0].type))
+        return _update_limits(ax)
+
 
 class PlotterChannelVoltageMonitoring(Plotter):
     """_summary_"""
@@ -173,6 +304,121 @@ class PlotterChannelVoltageMonitoring(Plotter):
         fig.set_tight_layout(True)
 
 
+def _colorbar_axes(fig: Figure) -> list:
+    """Return the colorbar axes of the figure"""
+    cbar_axes = []
+    for ax in fig.axes:
+        for m in [*ax.collections, *ax.images]:
+            if (cbar := getattr(m, "colorbar", None)) is not None:
+                cbar_axes.append(cbar.ax)
+    return cbar_axes
+
+
+def _main_axes(fig: Figure) -> list:
+    """Return the axes of the figure which are not colorbar axes"""
+    cbar_axes = _colorbar_axes(fig)
+    return [ax for ax in fig.axes if ax not in cbar_axes]
+
+
+def _live_artists(fig: Figure) -> list[Artist]:
+    """Return the data dependent artists of the figure (lines, collections,
+    images, titles and axis labels of the main axes and the colorbar axes,
+    which follow the color limits)"""
+    artists = []
+    for ax in _main_axes(fig):
+        artists.extend([*ax.lines, *ax.collections, *ax.images])
+        artists.extend([ax.title, ax.xaxis.label, ax.yaxis.label])
+    return artists + _colorbar_axes(fig)
+
+
+def _new_limits(lim: tuple, new_lim: tuple) -> Union[tuple, None]:
+    """Return the limits to set for live update or `None` if the actual
+    limits can be kept (see LIMITS_SHRINK)"""
+    lo, hi = sorted(lim)
+    new_lo, new_hi = sorted(new_lim)
+    if new_lo >= lo and new_hi <= hi and new_hi - new_lo >= LIMITS_SHRINK * (hi - lo):
+        return None
+    return new_lim
+
+
+def _autoscaled(collection: Collection) -> bool:
+    """Assess if the color limits of a collection are those of its data"""
+    if (array := collection.get_array()) is None or np.all(np.isnan(array)):
+        return False
+    return tuple(collection.get_clim()) == (np.nanmin(array), np.nanmax(array))
+
+
+def _set_collection_values(
+    collection: Collection, values: np.ndarray, autoscale: bool
+) -> None:
+    """Set the values of a collection (e.g. tripcolor), the color limits
+    (and its colorbar) are autoscaled to the values if asked
+
+    Raises:
+        LiveUpdateError: if the nb of values is not the nb of elements
+    """
+    values = np.real(np.asarray(values)).ravel()
+    if (actual := collection.get_array()) is None or actual.size != values.size:
+        raise LiveUpdateError(f"{values.size} values for {np.size(actual)} elements")
+    if np.all(np.isnan(values)):
+        raise LiveUpdateError("no values")
+    collection.set_array(values)
+    if not autoscale:
+        return
+    clim = (np.nanmin(values), np.nanmax(values))
+    if tuple(collection.get_clim()) == clim:
+        return
+    collection.set_clim(*clim)
+    if (colorbar := getattr(collection, "colorbar", None)) is not None:
+        colorbar.update_normal(collection)
+
+
+def _set_lines_ydata(ax, ys: list[np.ndarray]) -> None:
+    """Set the y values of the lines of the axes (in order of plotting)
+
+    Raises:
+        LiveUpdateError: if the nb of lines or of values differ
+    """
+    if len(ax.lines) != len(ys):
+        raise LiveUpdateError(f"{len(ys)} lines to update, {len(ax.lines)} plotted")
+    for line, y in zip(ax.lines, ys):
+        y = np.real(np.asarray(y)).ravel()
+        if len(line.get_xdata()) != y.shape[0]:
+            raise LiveUpdateError(
+                f"{y.shape[0]} values for a line of {len(line.get_xdata())}"
+            )
+        line.set_ydata(y)
+
+
+def _set_title(ax, labels: Any) -> None:
+    """Set the title of the axes from the labels of the plot (CustomLabels
+    of eit_model)"""
+    if (title := getattr(labels, "title", None)) is not None:
+        ax.title.set_text(title)
+
+
+def _update_limits(ax) -> bool:
+    """Autoscale the axes limits to the data (see LIMITS_SHRINK)
+
+    Returns:
+        bool: `True` if the limits have changed
+    """
+    old = ax.get_xlim(), ax.get_ylim()
+    ax.relim()  # relim ignores the collections
+    for collection in ax.collections:
+        ax.update_datalim(collection.get_datalim(ax.transData).get_points())
+    ax.autoscale_view()
+    changed = False
+    for old_lim, get_lim, set_lim in zip(
+        old, [ax.get_xlim, ax.get_ylim], [ax.set_xlim, ax.set_ylim]
+    ):
+        if _new_limits(old_lim, get_lim()) is None:
+            set_lim(old_lim, auto=None)
+        else:
+            changed = True
+    return changed
+
+
 class CanvasLayout(object):
 
     _figure: Figure = None
@@ -182,6 +428,7 @@ class CanvasLayout(object):
     _visible: bool = True
     _gui = None
     _last_data: Data2Plot = None
+    _background: Any = None  # canvas without the live artists (for blitting)
 
     def __init__(self, gui, layout: QVBoxLayout, plotter: Plotter) -> None:
         """Create a CanvasLayout object with predefined plotter,
@@ -209,12 +456,14 @@ class CanvasLayout(object):
         self._plotter = plotter()
         self._init_layout()
         self._export_path = []
+        self._export_done = Condition()  # notified after each export
 
     def _init_layout(self, **kwargs):
         """"""
         dpi = kwargs.pop("dpi", 100)
         self._figure: Figure = matplotlib.pyplot.figure(dpi=dpi)
         self._canvas = FigureCanvasQTAgg(self._figure)
+        self._canvas.mpl_connect("draw_event", self._on_draw)
         self._toolbar = NavigationToolbar2QT(self._canvas, self._gui)
         self._layout.addWidget(self._toolbar)
         self._layout.addWidget(self._canvas)
@@ -240,42 +489,102 @@ class CanvasLayout(object):
         if not self._visible:
             self.clear_canvas()
 
+    @property
+    def plotter_type(self) -> type:
+        """Type of the plotter (destination of the data to plot)"""
+        return type(self._plotter)
+
+    def is_consuming(self) -> bool:
+        """Assess if the data to plot are needed (canvas shown on the gui or
+        plot to export)"""
+        return (self._visible and self._canvas.isVisible()) or not self.all_exported()
+
     def clear_canvas(self):
         """Make the Canvas visible or insisible"""
+        self._plotter.invalidate()
         self._figure.clear()
         self._canvas.draw()
 
     def add_export_path(self, path: str):
         logger.debug(f"{path}")
-        self._export_path.append(path)
+        with self._export_done:
+            self._export_path.append(path)
 
     def all_exported(self) -> bool:
         return len(self._export_path) == 0
 
+    def wait_exported(self, timeout: float = None) -> bool:
+        """Block until all export paths have been exported
+
+        Args:
+            timeout (float, optional): max waiting time in s. Defaults to None.
+
+        Returns:
+            bool: `False` if the timeout elapsed
+        """
+        with self._export_done:
+            return self._export_done.wait_for(self.all_exported, timeout)
+
     def auto_export(self):
-        if self._export_path:
-            self.export_plot(self._export_path.pop(0))
+        with self._export_done:
+            if not self._export_path:
+                return
+            self.export_plot(self._export_path[0])
+            self._export_path.pop(0)
+            self._export_done.notify_all()
 
     def export_plot(self, path: str = "test") -> None:
         """"""
         path = self._plotter.get_saving_path(path)
         logger.info(f"figure saved: {path}")
-        self._figure.savefig(path)
+        with self._plotter.not_animated():
+            self._figure.savefig(path)
 
     def plot(self, data: Data2Plot):
         """Plot the data in Make the Canvas visible or insisible"""
         if not self._visible:
             self.clear_canvas()
             return
-        self._plotter.build(self._figure, data)
+        redraw = self._plotter.update(self._figure, data)
+        if redraw is None:
+            self._plotter.build(self._figure, data)
+            redraw = True
         self._last_data = data
-        self._canvas.draw()
+        if redraw:
+            self._canvas.draw()
+        else:
+            self._blit()
         self.auto_export()
 
+    def _on_draw(self, event=None):
+        """After a full draw, save the background for blitting and draw the
+        live artists (animated, so not drawn by the full draw)"""
+        if not self._plotter.live_artists:
+            self._background = None
+            return
+        self._background = self._canvas.copy_from_bbox(self._figure.bbox)
+        self._draw_live_artists()
+
+    def _blit(self):
+        """Redraw only the live artists over the saved background"""
+        if self._background is None:
+            self._canvas.draw()
+            return
+        self._canvas.restore_region(self._background)
+        self._draw_live_artists()
+        self._canvas.blit(self._figure.bbox)
+
+    def _draw_live_artists(self):
+        for a in self._plotter.live_artists:
+            self._figure.draw_artist(a)
 
-class PlottingAgent(SignalReciever):
+
+class PlottingAgent(SignalReciever, AddToGuiSignal):
 
     _canvaslayout: list[CanvasLayout]
+    _pending: dict[Any, Data2Plot]  # latest data to plot per destination
+    _n_dropped: int  # nb of data replaced by newer ones before plotting
+    _n_plotted: int  # nb of data plotted
 
     def __init__(self) -> None:
         """The PlottingAgent is responsible of actualizating plots in the gui
@@ -294,34 +603,76 @@ class PlottingAgent(SignalReciever):
             >> plotting_agent.add_data2plot(Data2Plot(...))
 
 
-        They are then retrieved one by one by a Thread and plot in their
-        corrresponding Canvas layout destination
+        Only the latest data per destination are kept (older ones not yet
+        plotted are dropped and counted), so that the plots always show the
+        most recent data and the memory stays bounded. The nb of data
+        plotted and dropped and the nb of live updates which needed a
+        rebuild are sent to the gui (at most every PLOT_STATS_PERIOD).
+
+        They are then retrieved all together by a Thread (as soon as
+        available) and plot in their corrresponding Canvas layout destination
 
         """
         super().__init__()
         self.init_reciever(data_callbacks={Data2Plot: self.add_data2plot})
-        self._input_buf = Queue()
-        self._worker = Poller(
-            name="plot", pollfunc=self._poll_input_buffer, sleeptime=0.01
-        )
+        self._pending = {}
+        self._n_dropped = 0
+        self._n_plotted = 0
+        self._last_stats = (0, 0, 0)  # (plotted, dropped, fallbacks) last sent
+        self._last_stats_time = -PLOT_STATS_PERIOD
+        self._new_data = Condition()
+        self._worker = EventWorker(name="plot", func=self._wait_and_process)
         self._worker.start()
-        self._worker.start_polling()
+        self._worker.start_processing()
         self._canvaslayout = []
 
     def add_canvas(self, canvaslayout: CanvasLayout) -> None:
         """Add a CanvasLayout fro uptatding via this plotting agent"""
         self._canvaslayout.append(canvaslayout)
 
-    def add_data2plot(self, data: Data2Plot, **kwargs) -> None:
-        """Add data to plot in input buffer"""
-        self._input_buf.put(data)
+    @property
+    def canvaslayouts(self) -> list[CanvasLayout]:
+        """CanvasLayouts updated via this plotting agent"""
+        return self._canvaslayout
 
-    def _poll_input_buffer(self) -> None:
-        """Retrieve the data to plot one by one"""
-        if self._input_buf.empty():
+    def add_data2plot(self, data: Data2Plot, **kwargs) -> None:
+        """Add data to plot, replacing the pending data for the same
+        destination"""
+        with self._new_data:
+            if data.destination in self._pending:
+                self._n_dropped += 1
+            self._pending[data.destination] = data
+            self._new_data.notify()
+
+    @property
+    def n_dropped(self) -> int:
+        """Nb of data dropped (replaced by newer ones before plotting)"""
+        return self._n_dropped
+
+    def _wait_and_process(self) -> None:
+        """Wait for data to plot and plot all pending data"""
+        with self._new_data:
+            if not self._new_data.wait_for(lambda: self._pending, WORKER_TIMEOUT):
+                self._emit_stats(throttled=False)  # last counters when idle
+                return
+            pending, self._pending = self._pending, {}
+        for data in pending.values():
+            self._process(data)
+        self._n_plotted += len(pending)
+        self._emit_stats()
+
+    def _emit_stats(self, throttled: bool = True) -> None:
+        """Send the nb of data plotted/dropped and of live update fallbacks
+        to the gui if they changed (at most every PLOT_STATS_PERIOD if
+        throttled)"""
+        fallbacks = sum(cl._plotter.n_fallbacks for cl in self._canvaslayout)
+        stats = (self._n_plotted, self._n_dropped, fallbacks)
+        if stats == self._last_stats:
+            return
+        if throttled and monotonic() - self._last_stats_time < PLOT_STATS_PERIOD:
             return
-        data = self._input_buf.get(block=True)
-        self._process(data)
+        self._last_stats, self._last_stats_time = stats, monotonic()
+        self.to_gui.emit(EvtDataPlotStats(*stats))
 
     def _process(self, data: Data2Plot) -> None:
         """Plot the data in their corrresponding Canvas layout destination"""
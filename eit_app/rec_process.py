@@ -0,0 +1,593 @@
+""" Reconstruction in a separate worker process
+
+The reconstruction (solver init, GN absolute imaging, AI inference,...)
+holds the GIL for long times. Run in a thread of the gui process it would
+starve the serial listener and the gui. Here the reconstruction runs in a
+dedicated worker process.
+
+The voltages of a frame and the reconstructed arrays are not pickled: they
+are transferred through shared memory slots (one input and one output
+block per slot). Only small messages (slot, array offsets/shapes, labels)
+go through the process queues. The objects built around the arrays
+(EITImage, EITData) are sent once as templates (without their arrays)
+after each (re)configuration of the reconstruction, and filled with the
+arrays of each result. The monitoring data (which content changes from a
+result to the other) is sent with each result but without its arrays.
+
+The nb of slots bounds the nb of frames in flight: submitting a frame
+blocks until a slot is free.
+
+example of Use is
+
+    rec_process = ReconstructionProcess()
+    eit_model, img_rec, data_sim = rec_process.start(eit_rec, solver, params)
+    future = rec_process.submit(v_ref, v_meas, monitoring=True)
+    results = future.result() # RecResults
+    ...
+    rec_process.start(eit_rec, new_solver, new_params) # restart
+    ...
+    rec_process.stop()
+"""
+
+import copy
+import logging
+import multiprocessing as mp
+from concurrent.futures import Future
+from dataclasses import dataclass
+from itertools import count
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty, Queue
+from threading import Lock
+from typing import Any, Union
+
+import numpy as np
+from eit_app.reconstruction_batch import build_rec_data, reconstruct_batch
+from eit_app.sciospec.voltage import EITChannelVoltage
+from eit_app.worker import WORKER_TIMEOUT, EventWorker
+
+logger = logging.getLogger(__name__)
+
+REC_SLOTS = 2  # nb of frames in flight (one reconstructed, one waiting)
+REC_SLOT_SIZE = 1024 ** 2  # in bytes, initial size of the slot blocks
+REC_INIT_TIMEOUT = 600.0  # in s, max time for a solver init
+REC_STOP_TIMEOUT = 2.0  # in s, max time for a graceful stop of the process
+SHM_ALIGN = 64  # in bytes, alignment of the arrays in a block
+
+# arrays of the outputs transferred through shared memory, an array is
+# given by an attribute name or by an (attribute name, key) for the arrays
+# stored in a dict attribute
+IMAGE_ARRAYS = ["data"]  # of EITImage
+DATA_ARRAYS = ["ref_frame", "frame"]  # of EITData (also of the channel data)
+
+
+@dataclass
+class RecResults:
+    """Results of the reconstruction of a frame"""
+
+    eit_image: Any  # EITImage, `None` if reconstruction disabled
+    eit_data: Any  # EITData
+    plot_labels: dict
+    monitoring_data: Any = None  # only set if monitoring was asked
+    ch_data: Any = None
+    ch_labels: dict = None
+
+
+## =============================================================================
+##  Array transfer through shared memory
+## =============================================================================
+
+
+def packed_size(arrays: list[Union[np.ndarray, None]]) -> int:
+    """Return the size of a block needed to pack the arrays in bytes"""
+    return sum(
+        -(-np.asarray(a).nbytes // SHM_ALIGN) * SHM_ALIGN
+        for a in arrays
+        if a is not None
+    )
+
+
+def pack_arrays(
+    buf: memoryview, arrays: list[Union[np.ndarray, None]]
+) -> Union[list[Union[tuple, None]], None]:
+    """Copy the arrays in a shared memory block
+
+    Returns:
+        Union[list[Union[tuple, None]], None]: (offset, shape, dtype) of each
+        array (`None` for `None` arrays) or `None` if the arrays can not be
+        packed (block too small or objects arrays)
+    """
+    metas = []
+    offset = 0
+    for a in arrays:
+        if a is None:
+            metas.append(None)
+            continue
+        a = np.asarray(a)
+        if a.dtype.hasobject or offset + a.nbytes > len(buf):
+            return None
+        np.ndarray(a.shape, a.dtype, buffer=buf, offset=offset)[...] = a
+        metas.append((offset, a.shape, a.dtype.str))
+        offset += -(-a.nbytes // SHM_ALIGN) * SHM_ALIGN
+    return metas
+
+
+def unpack_arrays(
+    buf: memoryview, metas: list[Union[tuple, None]]
+) -> list[Union[np.ndarray, None]]:
+    """Return a copy of the arrays packed in a shared memory block (see
+    pack_arrays)"""
+    return [
+        None
+        if m is None
+        else np.ndarray(m[1], np.dtype(m[2]), buffer=buf, offset=m[0]).copy()
+        for m in metas
+    ]
+
+
+def _is_packable(a: Any) -> bool:
+    return isinstance(a, np.ndarray) and not a.dtype.hasobject
+
+
+def _array_paths(obj: Any) -> list[Union[str, tuple]]:
+    """Return the paths of the arrays of an object (attributes or items of
+    its dict attributes) which can be transferred through shared memory"""
+    paths = []
+    for attr, value in getattr(obj, "__dict__", {}).items():
+        if _is_packable(value):
+            paths.append(attr)
+        elif isinstance(value, dict):
+            paths.extend((attr, k) for k, v in value.items() if _is_packable(v))
+    return paths
+
+
+def _get(obj: Any, path: Union[str, tuple]) -> Any:
+    if isinstance(path, str):
+        return getattr(obj, path, None)
+    attr, key = path
+    return getattr(obj, attr)[key]
+
+
+def _set(obj: Any, path: Union[str, tuple], value: Any, original: Any) -> None:
+    """Set the value of a path of a (shallow) copy, the dict attributes
+    shared with the original object are copied first"""
+    if isinstance(path, str):
+        setattr(obj, path, value)
+        return
+    attr, key = path
+    d = getattr(obj, attr)
+    if d is getattr(original, attr):
+        d = dict(d)
+        setattr(obj, attr, d)
+    d[key] = value
+
+
+def _strip(obj: Any, paths: list[Union[str, tuple]]) -> Any:
+    """Return a copy of the object without its arrays (template)"""
+    if obj is None:
+        return None
+    template = copy.copy(obj)
+    for path in paths:
+        _set(template, path, None, obj)
+    return template
+
+
+def _arrays(obj: Any, paths: list[Union[str, tuple]]) -> list[Union[np.ndarray, None]]:
+    return [None if obj is None else _get(obj, path) for path in paths]
+
+
+def _fill(template: Any, paths: list[Union[str, tuple]], arrays: list[np.ndarray]) -> Any:
+    """Return a copy of the template with its arrays (see _strip)"""
+    if template is None:
+        return None
+    obj = copy.copy(template)
+    for path, a in zip(paths, arrays):
+        _set(obj, path, a, template)
+    return obj
+
+
+class _Slot(object):
+    """Input and output shared memory blocks of a frame in flight"""
+
+    def __init__(self, size: int) -> None:
+        self.input = SharedMemory(create=True, size=size)
+        self.output = SharedMemory(create=True, size=size)
+
+    def ensure_input_size(self, size: int) -> None:
+        if size > self.input.size:
+            _release(self.input)
+            self.input = SharedMemory(create=True, size=_grow(size))
+
+    def ensure_output_size(self, size: int) -> None:
+        if size > self.output.size:
+            _release(self.output)
+            self.output = SharedMemory(create=True, size=_grow(size))
+
+    def close(self) -> None:
+        _release(self.input)
+        _release(self.output)
+
+
+def _grow(size: int) -> int:
+    """Return the next power of 2"""
+    return 1 << (size - 1).bit_length()
+
+
+def _release(shm: SharedMemory) -> None:
+    shm.close()
+    shm.unlink()
+
+
+## =============================================================================
+##  Worker process
+## =============================================================================
+
+
+class _RecWorker(object):
+    """Reconstruction running in the worker process"""
+
+    def __init__(self, results: mp.Queue) -> None:
+        self.results = results
+        self.eit_rec = None
+        self._shms: dict[tuple[int, str], SharedMemory] = {}  # attached blocks
+        self._templates_sent = False
+        self._ch_template_sent = False
+
+    def run(self, requests: mp.Queue) -> None:
+        while True:
+            msg = requests.get()
+            kind, req_id = msg[0], msg[1]
+            if kind == "stop":
+                break
+            try:
+                payload = getattr(self, f"_{kind}")(*msg[2:])
+            except Exception as e:
+                # the exception itself may not be picklable
+                error = RuntimeError(f"Reconstruction {kind}: {type(e).__name__} {e}")
+                self.results.put((kind, req_id, False, error))
+                continue
+            if req_id is not None:
+                self.results.put((kind, req_id, True, payload))
+        for shm in self._shms.values():
+            shm.close()
+
+    def _init(self, eit_rec, solver, params, cache_key, solver_cache) -> tuple:
+        self.eit_rec = eit_rec
+        self._reset_templates()
+        entry = None
+        if solver_cache is not None and cache_key is not None:
+            entry = solver_cache.get(cache_key)
+        if entry is not None:
+            self.eit_rec.solver, self.eit_rec.eit_model, img_rec, data_sim = entry
+        else:
+            img_rec, data_sim = self.eit_rec.init_solver(solver, params)
+            if solver_cache is not None and cache_key is not None:
+                entry = (self.eit_rec.solver, self.eit_rec.eit_model, img_rec, data_sim)
+                solver_cache.put(cache_key, entry)
+        return self.eit_rec.eit_model, img_rec, data_sim
+
+    def _call(self, method: str, args: tuple) -> None:
+        getattr(self.eit_rec, method)(*args)
+        self._reset_templates()
+
+    def _set(self, attr: str, value: Any) -> None:
+        setattr(self.eit_rec, attr, value)
+        self._reset_templates()
+
+    def _rec(self, slot, in_name, in_metas, labels, monitoring, out_name) -> dict:
+        v_ref, v_meas = unpack_arrays(self._attach(slot, "in", in_name).buf, in_metas)
+        data_rec = build_rec_data(
+            EITChannelVoltage(v_ref, labels[0]), EITChannelVoltage(v_meas, labels[1])
+        )
+        self.eit_rec.rec_process(data_rec)
+        mon = self.eit_rec.monitoring_results() if monitoring else None
+        eit_image, eit_data, plot_labels = self.eit_rec.imaging_results()
+
+        arrays = _arrays(eit_image, IMAGE_ARRAYS) + _arrays(eit_data, DATA_ARRAYS)
+        if mon is not None:
+            monitoring_data, ch_data, ch_labels = mon
+            mon_paths = _array_paths(monitoring_data)
+            arrays += _arrays(ch_data, DATA_ARRAYS) + _arrays(monitoring_data, mon_paths)
+        metas = pack_arrays(self._attach(slot, "out", out_name).buf, arrays)
+        payload = dict(
+            metas=metas,
+            arrays=None if metas is not None else arrays,  # pickled if not packed
+            out_size=packed_size(arrays),
+            plot_labels=plot_labels,
+            monitoring=None,
+        )
+        if not self._templates_sent:
+            payload["templates"] = (
+                _strip(eit_image, IMAGE_ARRAYS),
+                _strip(eit_data, DATA_ARRAYS),
+            )
+            self._templates_sent = True
+        if mon is not None:
+            payload["monitoring"] = (
+                _strip(monitoring_data, mon_paths),
+                mon_paths,
+                ch_labels,
+            )
+            if not self._ch_template_sent:
+                payload["ch_template"] = _strip(ch_data, DATA_ARRAYS)
+                self._ch_template_sent = True
+        return payload
+
+    def _reset_templates(self) -> None:
+        """Send the templates again with the next results (after a
+        (re)configuration of the reconstruction)"""
+        self._templates_sent = False
+        self._ch_template_sent = False
+
+    def _batch(self, v_ref, v_meas) -> list:
+        return reconstruct_batch(self.eit_rec, v_ref, v_meas)
+
+    def _attach(self, slot: int, block: str, name: str) -> SharedMemory:
+        """Return the attached block of a slot, the blocks replaced by the
+        parent (grown) are detached"""
+        shm = self._shms.get((slot, block))
+        if shm is not None and shm.name == name:
+            return shm
+        if shm is not None:
+            shm.close()
+        # the blocks are owned (and unlinked) by the parent process, the
+        # resource tracker is shared with it (spawn context)
+        shm = SharedMemory(name=name)
+        self._shms[(slot, block)] = shm
+        return shm
+
+
+def _rec_process_main(requests: mp.Queue, results: mp.Queue) -> None:
+    """Entry point of the worker process"""
+    _RecWorker(results).run(requests)
+
+
+## =============================================================================
+##  Process handling (gui process)
+## =============================================================================
+
+
+class ReconstructionProcess(object):
+    """Run the reconstruction in a worker process, the frames are
+    transferred through shared memory slots"""
+
+    _slots: list[_Slot]
+    _free_slots: Queue  # indexes of the free slots
+    _pending: dict[int, tuple[Future, Union[int, None]]]  # id -> (future, slot)
+
+    def __init__(self, n_slots: int = REC_SLOTS, slot_size: int = REC_SLOT_SIZE) -> None:
+        """
+        Args:
+            n_slots (int, optional): nb of frames in flight. Defaults to
+            REC_SLOTS.
+            slot_size (int, optional): initial size of the slot blocks in
+            bytes (grown if needed). Defaults to REC_SLOT_SIZE.
+        """
+        self._ctx = mp.get_context("spawn")
+        self._slots = [_Slot(slot_size) for _ in range(n_slots)]
+        self._free_slots = Queue()
+        for i in range(n_slots):
+            self._free_slots.put(i)
+        self._pending = {}
+        self._lock = Lock()  # pending requests
+        self._ids = count()
+        self._templates = (None, None)
+        self._ch_template = None
+        self._process = None
+        self._requests = None
+        self._results = None
+        self._listener = None
+
+    def start(
+        self,
+        eit_rec: Any,
+        solver: Any,
+        params: Any,
+        cache_key: str = None,
+        solver_cache: Any = None,
+        timeout: float = REC_INIT_TIMEOUT,
+    ) -> tuple:
+        """(Re)start the worker process and initialize its solver
+
+        The actual process is stopped, its frames in flight are cancelled.
+
+        Args:
+            eit_rec (EITReconstruction): reconstruction to run in the process
+            (copied)
+            solver (Solver): solver class
+            params (Any): solver parameters
+            cache_key (str, optional): key of the solver in the solver_cache.
+            Defaults to None.
+            solver_cache (SolverCache, optional): cache of the initialized
+            solvers. Defaults to None.
+            timeout (float, optional): max time for the init in s. Defaults to
+            REC_INIT_TIMEOUT.
+
+        Returns:
+            tuple: (eit_model, img_rec, data_sim) results of the init
+        """
+        self.stop()
+        self._requests = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._process = self._ctx.Process(
+            target=_rec_process_main,
+            args=(self._requests, self._results),
+            name="reconstruction",
+            daemon=True,
+        )
+        self._process.start()
+        self._listener = EventWorker(name="rec_results", func=self._wait_results)
+        self._listener.start()
+        self._listener.start_processing()
+        logger.info(f"Reconstruction process (pid {self._process.pid}) - STARTED")
+        future = self._request("init", None, eit_rec, solver, params, cache_key, solver_cache)
+        try:
+            return future.result(timeout)
+        except Exception:
+            self.stop()
+            raise
+
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def submit(
+        self, v_ref: EITChannelVoltage, v_meas: EITChannelVoltage, monitoring: bool = True
+    ) -> Future:
+        """Submit a frame for reconstruction, block until a slot is free
+
+        Args:
+            v_ref (EITChannelVoltage): reference voltages
+            v_meas (EITChannelVoltage): measured voltages
+            monitoring (bool, optional): compute the monitoring results too.
+            Defaults to True.
+
+        Returns:
+            Future: resolves to the RecResults
+        """
+        i = self._acquire_slot()
+        slot = self._slots[i]
+        arrays = [np.asarray(v_ref.volt), np.asarray(v_meas.volt)]
+        slot.ensure_input_size(packed_size(arrays))
+        metas = pack_arrays(slot.input.buf, arrays)
+        return self._request(
+            "rec",
+            i,
+            i,
+            slot.input.name,
+            metas,
+            (v_ref.labels, v_meas.labels),
+            monitoring,
+            slot.output.name,
+        )
+
+    def reconstruct_batch(
+        self, v_ref: Any, v_meas: list, timeout: float = None
+    ) -> list:
+        """Reconstruct a stack of frames in the process (see
+        reconstruction_batch.reconstruct_batch), the voltages and images are
+        pickled"""
+        return self._request("batch", None, v_ref, v_meas).result(timeout)
+
+    def call(self, method: str, *args: Any) -> None:
+        """Call a method of the reconstruction of the process (e.g.
+        set_monitoring)"""
+        if self.is_running():
+            self._requests.put(("call", None, method, args))
+
+    def set_attr(self, attr: str, value: Any) -> None:
+        """Set an attribute of the reconstruction of the process (e.g.
+        imaging)"""
+        if self.is_running():
+            self._requests.put(("set", None, attr, value))
+
+    def stop(self) -> None:
+        """Stop the worker process, the frames in flight are cancelled"""
+        if self._process is None:
+            return
+        self._requests.put(("stop", None))
+        self._process.join(REC_STOP_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._listener.stop()
+        self._fail_pending(RuntimeError("Reconstruction process stopped"))
+        logger.info(f"Reconstruction process (pid {self._process.pid}) - STOPPED")
+        self._process = None
+        self._templates = (None, None)
+        self._ch_template = None
+
+    def close(self) -> None:
+        """Stop the worker process and release the slots"""
+        self.stop()
+        for slot in self._slots:
+            slot.close()
+
+    ## -------------------------------------------------------------------------
+    ##  Internal methods
+    ## -------------------------------------------------------------------------
+
+    def _acquire_slot(self) -> int:
+        while True:
+            if not self.is_running():
+                raise RuntimeError("Reconstruction process not running")
+            try:
+                return self._free_slots.get(timeout=WORKER_TIMEOUT)
+            except Empty:
+                continue
+
+    def _request(self, kind: str, slot: Union[int, None], *args: Any) -> Future:
+        future = Future()
+        req_id = next(self._ids)
+        with self._lock:
+            self._pending[req_id] = (future, slot)
+        self._requests.put((kind, req_id, *args))
+        return future
+
+    def _wait_results(self) -> None:
+        """Wait for the next result of the process and resolve its future"""
+        try:
+            kind, req_id, ok, payload = self._results.get(timeout=WORKER_TIMEOUT)
+        except Empty:
+            if not self._process.is_alive():
+                self._fail_pending(
+                    RuntimeError(
+                        f"Reconstruction process died (exitcode {self._process.exitcode})"
+                    )
+                )
+            return
+        with self._lock:
+            future, slot = self._pending.pop(req_id, (None, None))
+        if future is None:
+            if not ok:
+                logger.error(f"{payload}")
+            return
+        try:
+            if not ok:
+                future.set_exception(payload)
+            elif kind == "rec":
+                future.set_result(self._build_results(slot, payload))
+            else:
+                future.set_result(payload)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            if slot is not None:
+                self._free_slots.put(slot)
+
+    def _build_results(self, slot: int, payload: dict) -> RecResults:
+        if (templates := payload.get("templates")) is not None:
+            self._templates = templates
+        if "ch_template" in payload:
+            self._ch_template = payload["ch_template"]
+        output = self._slots[slot].output
+        arrays = payload["arrays"]
+        if arrays is None:
+            arrays = unpack_arrays(output.buf, payload["metas"])
+        else:
+            logger.debug("Reconstruction results pickled (output slot too small)")
+        self._slots[slot].ensure_output_size(payload["out_size"])
+        n_img = len(IMAGE_ARRAYS)
+        n = n_img + len(DATA_ARRAYS)
+        results = RecResults(
+            _fill(self._templates[0], IMAGE_ARRAYS, arrays[:n_img]),
+            _fill(self._templates[1], DATA_ARRAYS, arrays[n_img:n]),
+            payload["plot_labels"],
+        )
+        if payload["monitoring"] is not None:
+            mon_template, mon_paths, results.ch_labels = payload["monitoring"]
+            n_ch = n + len(DATA_ARRAYS)
+            results.ch_data = _fill(self._ch_template, DATA_ARRAYS, arrays[n:n_ch])
+            results.monitoring_data = _fill(mon_template, mon_paths, arrays[n_ch:])
+        return results
+
+    def _fail_pending(self, error: Exception) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, slot in pending.values():
+            if not future.done():
+                future.set_exception(error)
+            if slot is not None:
+                self._free_slots.put(slot)
+
+
+if __name__ == "__main__":
+    """"""
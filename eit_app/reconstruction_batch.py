@@ -0,0 +1,143 @@
+""" Batch reconstruction of multiple measurement frames
+
+For linear solvers (pyEIT JAC one-step, BP, GREIT) the reconstruction of a
+frame is a fixed matrix H applied to the voltage difference vector:
+
+    ds = - H @ dv, with dv = v_meas - v_ref (or (v_meas - v_ref) / |v_ref|)
+
+so that a stack of frames can be reconstructed with one matrix-matrix
+product instead of one pipeline round trip per frame. For other solvers the
+frames are reconstructed one by one.
+
+This module do not depend on Qt so that it can be used for offline
+analysis.
+"""
+
+import copy
+import logging
+from typing import Union
+
+import numpy as np
+from eit_model.data import EITFrameMeasuredChannelVoltage, EITImage, EITReconstructionData
+from eit_model.reconstruction import EITReconstruction
+from eit_app.sciospec.voltage import EITChannelVoltage
+
+logger = logging.getLogger(__name__)
+
+
+def build_rec_data(
+    v_ref: EITChannelVoltage, v_meas: EITChannelVoltage
+) -> EITReconstructionData:
+    """Convert ref and meas voltages to EITReconstructionData"""
+    return EITReconstructionData(
+        ref_frame=EITFrameMeasuredChannelVoltage(
+            volt=v_ref.volt,
+            name=v_ref.get_frame_name(),
+            freq=v_ref.get_frame_freq(),
+        ),
+        meas_frame=EITFrameMeasuredChannelVoltage(
+            volt=v_meas.volt,
+            name=v_meas.get_frame_name(),
+            freq=v_meas.get_frame_freq(),
+        ),
+    )
+
+
+def linear_rec_matrix(eit_rec: EITReconstruction) -> Union[np.ndarray, None]:
+    """Return the reconstruction matrix H of the actual solver if it is a
+    linear pyEIT solver (JAC, BP, GREIT), otherwise `None`"""
+    pyeit_solver = getattr(eit_rec.solver, "pyeit_solver", None)
+    H = getattr(pyeit_solver, "H", None)
+    return H if isinstance(H, np.ndarray) and H.ndim == 2 else None
+
+
+def solve_linear_batch(
+    H: np.ndarray, v_ref: np.ndarray, v_meas: np.ndarray, normalize: bool = False
+) -> np.ndarray:
+    """Reconstruct a stack of frames with a linear reconstruction matrix
+
+    Args:
+        H (np.ndarray): reconstruction matrix of shape (n_out, n_meas)
+        v_ref (np.ndarray): reference voltages of shape (n_meas,) or
+        (n_frames, n_meas)
+        v_meas (np.ndarray): measured voltages of shape (n_frames, n_meas)
+        normalize (bool, optional): normalize the voltage difference by the
+        reference voltages. Defaults to False.
+
+    Returns:
+        np.ndarray: reconstructed data of shape (n_frames, n_out)
+    """
+    dv = v_meas - v_ref
+    if normalize:
+        dv = dv / np.abs(v_ref)
+    return -(dv @ H.T)
+
+
+def reconstruct_batch(
+    eit_rec: EITReconstruction,
+    v_ref: Union[EITChannelVoltage, list[EITChannelVoltage]],
+    v_meas: list[EITChannelVoltage],
+) -> list[EITImage]:
+    """Reconstruct a stack of measurement frames
+
+    For linear solvers, the imaging is done frame by frame but all frames are
+    reconstructed with one matrix-matrix product. Otherwise each frame goes
+    through the whole reconstruction process.
+
+    Args:
+        eit_rec (EITReconstruction): initialized reconstruction (solver,
+        imaging and eit model set)
+        v_ref (Union[EITChannelVoltage, list[EITChannelVoltage]]): reference
+        voltages, the same for all frames (TD) or one per frame (FD)
+        v_meas (list[EITChannelVoltage]): measured voltages of the frames
+
+    Returns:
+        list[EITImage]: reconstructed images (one per frame)
+    """
+    if not v_meas:
+        return []
+    if isinstance(v_ref, EITChannelVoltage):
+        v_ref = [v_ref] * len(v_meas)
+    if len(v_ref) != len(v_meas):
+        raise ValueError(f"Wrong nb of ref voltages {len(v_ref)}, expected {len(v_meas)}")
+
+    data_rec = [build_rec_data(r, m) for r, m in zip(v_ref, v_meas)]
+
+    H = linear_rec_matrix(eit_rec)
+    process_data = getattr(eit_rec.imaging, "process_data", None)
+    if H is None or not callable(process_data):
+        logger.info("Solver not linear, frames reconstructed one by one")
+        return [_reconstruct(eit_rec, d) for d in data_rec]
+
+    # the first frame goes through the whole process, its image is used as
+    # template for the other ones (mesh, labels,...)
+    template = _reconstruct(eit_rec, data_rec[0])
+    images = [template]
+    if len(data_rec) == 1:
+        return images
+    eit_data = [
+        process_data(d.ref_frame, d.meas_frame, eit_rec.eit_model)[0]
+        for d in data_rec[1:]
+    ]
+    ref = np.stack([np.asarray(d.ref_frame).ravel() for d in eit_data])
+    meas = np.stack([np.asarray(d.frame).ravel() for d in eit_data])
+    normalize = bool(getattr(eit_rec.solver.params, "normalize", False))
+    ds = solve_linear_batch(H, ref, meas, normalize)
+    logger.debug(f"Batch reconstruction of {len(ds)} frames with H{H.shape}")
+
+    for d in ds:
+        img = copy.copy(template)
+        img.data = np.real(d) if np.isrealobj(template.data) else d
+        images.append(img)
+    return images
+
+
+def _reconstruct(eit_rec: EITReconstruction, data_rec: EITReconstructionData) -> EITImage:
+    """Reconstruct a single frame through the whole reconstruction process"""
+    eit_rec.rec_process(data_rec)
+    eit_image, _, _ = eit_rec.imaging_results()
+    return copy.copy(eit_image)
+
+
+if __name__ == "__main__":
+    """"""
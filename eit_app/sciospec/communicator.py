@@ -1,8 +1,10 @@
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
 from enum import Enum
 import logging
-from queue import Queue
-from time import sleep
+from threading import Condition
+from typing import Any
 from eit_app.sciospec.constants import (
     ACK_FRAME,
     CMD_BYTE_INDX,
@@ -20,15 +22,17 @@ from eit_app.sciospec.constants import (
     is_stop_meas,
 )
 from eit_app.sciospec.interface import Interface
+from eit_app.sciospec.rx_ring import RxFrameRing, RxOverflowPolicy
 from glob_utils.flags.flag import CustomFlag
-from glob_utils.flags.timer import CustomTimer
 from glob_utils.directory.utils import get_datetime_s
-from glob_utils.thread_process.buffer import BufferList
 from glob_utils.thread_process.signal import Signal
-from glob_utils.thread_process.threads_worker import Poller
+from eit_app.worker import WORKER_TIMEOUT, EventWorker
 
 logger = logging.getLogger(__name__)
 
+CMD_TIMEOUT = 5.0  # in s, max waiting time for the acks of the device
+IN_FLIGHT_WINDOW = 16  # max nb of cmds sent and not yet acknowledged
+
 
 class CommunicatorError(Exception):
     """"""
@@ -39,12 +43,16 @@ class TxCmdOpData:
     """Transmit Command/option data
 
     gather the transmitted cmd/op and tx_frame and
-    the corresponding transmition time"""
+    the corresponding transmition time
+
+    the future resolves on the ack of the device with the response frame
+    (cmd with answer) or `True` (cmd waiting for ack only)"""
 
     cmd: SciospecCmd
     op: SciospecOption
     tx_frame: list[bytes]
     time_stamp: str
+    future: Future = field(default_factory=Future, repr=False, compare=False)
 
     @property
     def info_long(self) -> str:
@@ -92,20 +100,35 @@ class SciospecCommunicator:  # TODO >> AddStatus
     - a processing of the rx_frame
     """
 
-    def __init__(self) -> None:
-        """Constructor"""
-        self.rx_frame = Queue(maxsize=2048)
-        self.processor = Poller(
-            name="process_rx_frame",
-            pollfunc=self._process_last_rx_frame,
-            sleeptime=0.01,
+    def __init__(
+        self,
+        window: int = IN_FLIGHT_WINDOW,
+        overflow_policy: RxOverflowPolicy = RxOverflowPolicy.SPILL,
+    ) -> None:
+        """Constructor
+
+        Args:
+            window (int, optional): max nb of cmds sent and not yet
+            acknowledged, further sends block. Defaults to IN_FLIGHT_WINDOW.
+            overflow_policy (RxOverflowPolicy, optional): policy applied
+            when the rx frames come faster than they are processed (see
+            RxFrameRing). Defaults to RxOverflowPolicy.SPILL.
+        """
+        # rx frames put by the interface listener, drained in batches by the
+        # processor
+        self.rx_ring = RxFrameRing(policy=overflow_policy)
+        self.processor = EventWorker(
+            name="process_rx_frame", func=self._process_rx_batch
         )
         self.processor.start()
-        self.processor.start_polling()
-        self.timer_busy = CustomTimer(5.0, 1)  # max 5s timeout! #TODO >> Timer??
+        self.processor.start_processing()
+        self.window = window
+        # notified each time a cmd is done (ack recieved or failed)
+        self._in_flight = Condition()
+        self._n_in_flight = 0
 
-        self.cmd_op_hist = BufferList()
-        self.resp_hist = BufferList()
+        self.cmd_op_hist: deque[TxCmdOpData] = deque()
+        self.resp_hist: deque[RxRespData] = deque()
 
         self.new_rx_setup_stream = Signal(self)
         self.new_rx_meas_stream = Signal(self)
@@ -115,22 +138,57 @@ class SciospecCommunicator:  # TODO >> AddStatus
         self.process_meas_enabled.clear()
 
     def reinit(self) -> None:
-        """Reinit the communicator"""
-        self.status = StatusCommunicator.IDLE
-        self.cmd_op_hist.clear()
-        self.resp_hist.clear()
-
-    def wait_not_busy(self) -> None:
-        """Wait until the Communicator get all ack fro all commands send"""
-        self.timer_busy.reset()
-        while self.is_waiting():
-            logger.debug(
-                f"waiting for device {self.timer_busy.cnt}/{self.timer_busy.max_cnt}"
-            )
-            if self.timer_busy.increment():
-                logger.error("Waiting device - Timeout")
-                self.reinit()
-            sleep(1)
+        """Reinit the communicator, the cmds still waiting for an ack fail"""
+        with self._in_flight:
+            pending = list(self.cmd_op_hist)
+            self.status = StatusCommunicator.IDLE
+            self.cmd_op_hist.clear()
+            self.resp_hist.clear()
+            self._n_in_flight = 0
+            self._in_flight.notify_all()
+        for tx_cmd in pending:
+            self._resolve(tx_cmd, error=CommunicatorError(f"{tx_cmd.info} - ABORTED"))
+
+    def close(self) -> None:
+        """Stop the processor and close the rx ring (the spilled frames are
+        removed), should only be called once the interface listener is
+        stopped"""
+        self.processor.stop(timeout=None)
+        self.rx_ring.close()
+        logger.info(f"Communicator closed, RX frames: {self.rx_ring.stats}")
+
+    def wait_not_busy(self, timeout: float = CMD_TIMEOUT) -> bool:
+        """Wait until the Communicator get all ack fro all commands send
+
+        It returns as soon as the last ack has been recieved, if the timeout
+        elapsed the communicator is reinitialized.
+
+        Args:
+            timeout (float, optional): max waiting time in s. Defaults to
+            CMD_TIMEOUT.
+
+        Returns:
+            bool: `False` if the timeout elapsed
+        """
+        with self._in_flight:
+            if self._in_flight.wait_for(lambda: self._n_in_flight == 0, timeout):
+                return True
+        logger.error("Waiting device - Timeout")
+        self.reinit()
+        return False
+
+    def wait_cmd_done(self, future: Future, timeout: float = CMD_TIMEOUT) -> bool:
+        """Wait for the ack of a cmd (see send_cmd_frame)
+
+        Returns:
+            bool: `True` if the cmd has been acknowledged in time
+        """
+        try:
+            future.result(timeout)
+        except Exception as e:
+            logger.error(f"Waiting device - {e or 'Timeout'}")
+            return False
+        return True
 
     def processing_meas_enable(self, cmd: SciospecCmd, op: SciospecOption):
         """Activate or deactivate the processing of measuremnet frame"""
@@ -150,44 +208,68 @@ class SciospecCommunicator:  # TODO >> AddStatus
         op: SciospecOption,
         data: list[bytes],
         cmd_append: bool = True,
-    ) -> bool:
+    ) -> Future:
         """Send a command frame to the device
         - build the cmd frame
-        - write the cmd_frame to the interface
-        - add the cmd and op in the history if its successfull"""
+        - wait until less than `window` cmds are waiting for an ack
+        - add the cmd and op in the history and write the cmd_frame to the
+        interface (the cmd is removed from the history if it fails)
+
+        Returns:
+            Future: resolves on the ack of the device to the response frame
+            (cmd with answer) or `True` (cmd waiting for ack only), fails
+            with a CommunicatorError on NACK, writing error or reinit
+        """
 
         # TODO activate listening!
         self.processing_meas_enable(cmd, op)
         tx_frame = build_cmd_frame(cmd, op, data)
 
         tx_cmd = TxCmdOpData(cmd, op, tx_frame, get_datetime_s())
-        success = interface.write(tx_frame)
-        # s='SUCCESS' if success else "ERROR"
-        if success:
-            self.cmd_op_hist.add(tx_cmd)
+        with self._in_flight:
+            if not self._in_flight.wait_for(
+                lambda: self._n_in_flight < self.window, CMD_TIMEOUT
+            ):
+                logger.error(f"{tx_cmd.info} - too many cmds waiting for the device")
+                self._resolve(tx_cmd, error=CommunicatorError(f"{tx_cmd.info} - NOT SENT"))
+                return tx_cmd.future
+            # registered before writing, the ack can come before write returns
+            self.cmd_op_hist.append(tx_cmd)
+            self._n_in_flight += 1
             self.status = StatusCommunicator.WAIT_FOR_DEVICE
+            success = interface.write(tx_frame)
+            if not success:
+                self.cmd_op_hist.pop()  # the last one, appended under lock
+                self._n_in_flight -= 1
+                self._update_status()
         logger.debug(f"{tx_cmd.info_long} - {SUCCESS[success]}")
-        return success
+        if not success:
+            self._resolve(tx_cmd, error=CommunicatorError(f"{tx_cmd.info} - NOT SENT"))
+        return tx_cmd.future
 
     ## =========================================================================
     ##  Processing of rx_frame
     ## =========================================================================
 
     def add_rx_frame(self, rx_frame: list[bytes], **kwargs) -> None:
-        """Add a recieved frame in the queue to be treated"""
+        """Add a recieved frame in the ring to be treated (never blocks nor
+        raises, the overflows are handled by the ring), should only be called
+        by the interface listener"""
         logger.debug(f"RX_Frame added to process: {rx_frame[:10]}")
-        self.rx_frame.put_nowait(rx_frame)
+        self.rx_ring.put(rx_frame)
 
-    # @catch_error
-    def _process_last_rx_frame(self) -> None:
-        """Method polled by the processor to process all rx_frames one by one"""
-        if self.rx_frame.empty():
-            return
-        rx_frame = self.rx_frame.get_nowait()
-        self._process_rx_frame(rx_frame)
+    def _process_rx_batch(self) -> None:
+        """Called by the processor in loop, wait for rx frames and process
+        them one by one, an error on a frame does not affect the next ones"""
+        for rx_frame in self.rx_ring.get_batch(timeout=WORKER_TIMEOUT):
+            try:
+                self._process_rx_frame(rx_frame)
+            except Exception as e:
+                logger.exception(f"RX_Frame {rx_frame[:10]} not processed ({e})")
 
     def _process_rx_frame(self, rx_frame: list[bytes]) -> None:
-        """Sort the recieved frames between ACKNOWLEGMENT, MEASURING, RESPONSE
+        """Called for each rx_frame (one by one).
+        Sort the recieved frames between ACKNOWLEGMENT, MEASURING, RESPONSE
         and process them accordingly"""
         rx_frame = self._check_rx_frame(rx_frame)
         if self._is_ack(rx_frame):
@@ -236,7 +318,8 @@ class SciospecCommunicator:  # TODO >> AddStatus
         - add the response to the history (it will be treated after ack)"""
         resp = RxRespData(rx_frame, get_datetime_s())
         logger.debug(f"{resp.info}")
-        self.resp_hist.add(resp)
+        with self._in_flight:
+            self.resp_hist.append(resp)
 
     def _identify_ack(self, rx_frame: list[bytes]) -> SciospecAck:
         """return the corresponding SciospecAck object
@@ -254,35 +337,62 @@ class SciospecCommunicator:  # TODO >> AddStatus
         -raise an error ... Handling of NACK is not implemented..."""
         msg = f"RX_NACK: {rx_ack.__dict__} - nothing implemented yet, to handle it!!!"
         logger.error(msg)
-        raise CommunicatorError(msg)
+        if (tx_cmd := self._pop_oldest_cmd()) is None:
+            return
+        self._resolve(tx_cmd, error=CommunicatorError(f"{tx_cmd.info} - {rx_ack.name}"))
+        self._cmd_done()
 
     def _handle_ack(self, rx_ack: SciospecAck) -> None:
         """Handle Ack:
         - get oldest cmd and tresponse out of the histories
         - process them
         """
-        # logger.debug(f"{self.cmd_op_hist.buffer}")
-        if self.cmd_op_hist.is_empty():
+        if (tx_cmd := self._pop_oldest_cmd()) is None:
             logger.debug(f"No CMD registered: {rx_ack.name} - IGNORED")
             return
 
-        tx_cmd: TxCmdOpData = self.cmd_op_hist.pop_oldest()
-
+        result = True
         if tx_cmd.wait_ans_and_ack():
-            if self.resp_hist.is_empty():
+            with self._in_flight:
+                rx_resp = self.resp_hist.popleft() if self.resp_hist else None
+            if rx_resp is None:
                 logger.debug(
                     f"SHOULD NOT HAPPEND ! resp_hist empty {rx_ack.name} - IGNORED"
                 )
+                self._resolve(tx_cmd, error=CommunicatorError(f"{tx_cmd.info} - NO RESPONSE"))
+                self._cmd_done()
                 return
-            rx_resp: RxRespData = self.resp_hist.pop_oldest()
             msg = f"{rx_ack.name} of:\r\n{tx_cmd.info}\r\n{rx_resp.info} - SUCCESS"
             self._emit_rx_frame(rx_resp.rx_frame)
+            result = rx_resp.rx_frame
 
         elif tx_cmd.wait_ack_only():
             msg = f"{rx_ack.name} of:\r\n{tx_cmd.info} - SUCCESS"
 
         logger.debug(msg)
-        self._update_status()
+        self._resolve(tx_cmd, result)
+        self._cmd_done()
+
+    def _pop_oldest_cmd(self) -> TxCmdOpData:
+        """Return the oldest cmd waiting for an ack (`None` if none)"""
+        with self._in_flight:
+            return self.cmd_op_hist.popleft() if self.cmd_op_hist else None
+
+    def _cmd_done(self) -> None:
+        """Count a popped cmd as done and wake up the waiting threads"""
+        with self._in_flight:
+            self._n_in_flight = max(0, self._n_in_flight - 1)
+            self._update_status()
+            self._in_flight.notify_all()
+
+    def _resolve(self, tx_cmd: TxCmdOpData, result: Any = None, error: Exception = None):
+        """Set the result or the error of the future of a cmd"""
+        if tx_cmd.future.done():
+            return
+        if error is None:
+            tx_cmd.future.set_result(result)
+        else:
+            tx_cmd.future.set_exception(error)
 
     def _emit_rx_frame(self, rx_frame: list[bytes]):
         """Emit the rx_frame via the new setup and new_meas signal"""
@@ -303,7 +413,7 @@ class SciospecCommunicator:  # TODO >> AddStatus
 
     def _update_status(self):
         """Change the status to the commands history and c"""
-        if self.cmd_op_hist.is_empty():
+        if self._n_in_flight == 0:
             self.status = StatusCommunicator.IDLE
 
     def is_waiting(self):
@@ -1,6 +1,8 @@
 from dataclasses import dataclass, field
 from enum import Enum, auto
 
+import numpy as np
+
 ################################################################################
 ##  Diverse CONSTANTS for Sciopec device #######################################
 ################################################################################
@@ -22,6 +24,24 @@ MIN_SAMPLING_TIME = 208 * 10**-6  # in s
 DELAY_BTW_2INJ = 651 * 10**-6  # in s
 UPPER_LIMIT_FRAME_RATE = 100  # in fps
 
+N_CH_PER_STREAM = 16
+
+# Layout of a measurement stream frame (see documentation of Sciospec EIT device)
+# [CMD, LL, ch_group, exc (2 bytes), freq_indx (2 bytes), time_stamp (4 bytes),
+# voltages (N_CH_PER_STREAM x real/imag as big endian single float), CMD]
+MEAS_STREAM_DTYPE = np.dtype(
+    [
+        ("cmd", "u1"),
+        ("length", "u1"),
+        ("ch_group", "u1"),
+        ("exc", "u1", (2,)),
+        ("freq_indx", ">u2"),
+        ("time_stamp", ">u4"),
+        ("voltage", ">c8", (N_CH_PER_STREAM,)),
+        ("cmd_end", "u1"),
+    ]
+)
+
 
 class Answer(Enum):
     WAIT_FOR_ANSWER_AND_ACK = auto()
@@ -0,0 +1,430 @@
+""" Container file for measurement datasets
+
+All frames of a measurement dataset are saved in a single binary file:
+
+    | MAGIC (8 bytes) | header length (uint32 LE) | header (JSON, utf-8) |
+    | padding up to DATA_ALIGN | frame 0 | frame 1 | ... | frame n |
+
+The header regroups the dataset infos (name, time stamps, device setup,
+frequency list, excitation pattern) and the shape of the frames. Each frame
+is a contiguous complex array of shape (n_freq, n_exc, n_ch) (dtype
+VOLTAGE_DTYPE), the frames are appended one after the other. The nb of
+frames is deduced from the file size, so that a recording interrupted
+during the writing of a frame stays readable.
+
+During acquisition the frames are written by a DatasetFileWriter which
+decouples the disk accesses from the acquisition (write-behind queue). The
+acquisition never waits for the disk and no frame is ever dropped, so that
+the position of a frame in the file is its frame index.
+"""
+
+import json
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass
+from queue import Empty, Full, Queue
+from threading import Lock
+from time import perf_counter
+from typing import Any, BinaryIO, Union
+
+import numpy as np
+from eit_app.worker import WORKER_TIMEOUT, EventWorker
+
+logger = logging.getLogger(__name__)
+
+DATASET_FILENAME = "meas_dataset.eitds"
+MAGIC = b"EITDSET1"
+DATA_ALIGN = 64  # in bytes, alignment of the first frame
+VOLTAGE_DTYPE = np.dtype("<c8")  # the device send single float real/imag
+HEADER_VERSION = 1
+WRITER_QUEUE_SIZE = 1024  # in frames, max nb of frames waiting for writing
+WRITER_BATCH_SIZE = 64  # in frames, max nb of frames written in one batch
+FSYNC_PERIOD = 1.0  # in s, min time between two fsync
+OVERFLOW_LOG_PERIOD = 1.0  # in s, min time between two "queue full" logs
+
+
+class DatasetFileError(Exception):
+    """"""
+
+
+def dataset_file_path(dir_path: str) -> str:
+    """Return the path of the dataset file contained in a dataset directory"""
+    return os.path.join(dir_path, DATASET_FILENAME)
+
+
+def is_dataset_file_in(dir_path: str) -> bool:
+    """Assess if a dataset directory contains a dataset file"""
+    return bool(dir_path) and os.path.isfile(dataset_file_path(dir_path))
+
+
+def _json_default(obj: Any) -> Any:
+    """Convert numpy objects for json serialization"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+
+
+class MeasurementDatasetFile(object):
+    """Read and write a dataset file (see module description)"""
+
+    path: str
+    header: dict
+    frame_shape: tuple[int, int, int]
+    data_offset: int
+    _file: BinaryIO
+
+    def __init__(self, path: str, header: dict, data_offset: int) -> None:
+        self.path = path
+        self.header = header
+        self.frame_shape = tuple(header["frame_shape"])
+        self.data_offset = data_offset
+        self._file = None
+
+    ## =========================================================================
+    ##  Creation/opening
+    ## =========================================================================
+
+    @classmethod
+    def create(
+        cls,
+        dir_path: str,
+        frame_shape: tuple[int, int, int],
+        **infos,
+    ) -> "MeasurementDatasetFile":
+        """Create a new dataset file (without frames) in a dataset directory,
+        the file stays opened for appending frames
+
+        Args:
+            dir_path (str): dataset directory
+            frame_shape (tuple[int, int, int]): (n_freq, n_exc, n_ch)
+            infos: dataset infos to save in the header (e.g. name,
+            time_stamps, setup, freq_list, excitation), should be json
+            serializable (ndarrays are accepted)
+
+        Returns:
+            MeasurementDatasetFile: the created dataset file
+        """
+        header = {
+            "version": HEADER_VERSION,
+            "dtype": VOLTAGE_DTYPE.str,
+            "frame_shape": [int(n) for n in frame_shape],
+            **infos,
+        }
+        raw = json.dumps(header, default=_json_default).encode("utf-8")
+        data_offset = len(MAGIC) + 4 + len(raw)
+        padding = -data_offset % DATA_ALIGN
+        data_offset += padding
+
+        path = dataset_file_path(dir_path)
+        f = open(path, "wb")
+        f.write(MAGIC)
+        f.write(len(raw).to_bytes(4, "little"))
+        f.write(raw)
+        f.write(b"\0" * padding)
+        f.flush()
+
+        dataset_file = cls(path, json.loads(raw), data_offset)
+        dataset_file._file = f
+        logger.debug(f"Dataset file created: {path}")
+        return dataset_file
+
+    @classmethod
+    def open(cls, dir_path: str) -> "MeasurementDatasetFile":
+        """Open an existing dataset file (read only)
+
+        Args:
+            dir_path (str): dataset directory
+
+        Raises:
+            DatasetFileError: if the file is not a dataset file
+
+        Returns:
+            MeasurementDatasetFile: the opened dataset file
+        """
+        path = dataset_file_path(dir_path)
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise DatasetFileError(f"{path} is not a dataset file")
+            length = int.from_bytes(f.read(4), "little")
+            header = json.loads(f.read(length).decode("utf-8"))
+        if np.dtype(header["dtype"]) != VOLTAGE_DTYPE:
+            raise DatasetFileError(f"Unsupported dtype {header['dtype']} in {path}")
+        data_offset = len(MAGIC) + 4 + length
+        data_offset += -data_offset % DATA_ALIGN
+        return cls(path, header, data_offset)
+
+    ## =========================================================================
+    ##  Writing
+    ## =========================================================================
+
+    def append(self, voltages: np.ndarray) -> None:
+        """Append a frame at the end of the file (the file is not flushed)
+
+        Args:
+            voltages (np.ndarray): frame voltages of shape frame_shape
+
+        Raises:
+            DatasetFileError: if the file is not opened for writing or the
+            shape is wrong
+        """
+        if self._file is None:
+            raise DatasetFileError(f"Dataset file {self.path} not opened for writing")
+        if voltages.shape != self.frame_shape:
+            raise DatasetFileError(
+                f"Wrong frame shape {voltages.shape}, expected {self.frame_shape}"
+            )
+        self._file.write(voltages.astype(VOLTAGE_DTYPE, copy=False).tobytes())
+
+    def flush(self, sync: bool = False) -> None:
+        """Flush the file opened for writing
+
+        Args:
+            sync (bool, optional): if `True` the data are also synchronized
+            on the disk (fsync). Defaults to False.
+        """
+        if self._file is None:
+            return
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Close the file opened for writing"""
+        if self._file is not None:
+            self.flush(sync=True)
+            self._file.close()
+            self._file = None
+            logger.debug(f"Dataset file closed: {self.path}")
+
+    ## =========================================================================
+    ##  Reading
+    ## =========================================================================
+
+    @property
+    def frame_nbytes(self) -> int:
+        return int(np.prod(self.frame_shape)) * VOLTAGE_DTYPE.itemsize
+
+    @property
+    def n_frames(self) -> int:
+        """Nb of complete frames contained in the file"""
+        size = os.path.getsize(self.path) - self.data_offset
+        return max(size, 0) // self.frame_nbytes
+
+    def read_voltages(self) -> np.ndarray:
+        """Read all frames
+
+        Returns:
+            np.ndarray: voltages of shape (n_frames, n_freq, n_exc, n_ch)
+        """
+        n = self.n_frames
+        volt = np.fromfile(
+            self.path,
+            dtype=VOLTAGE_DTYPE,
+            count=n * self.frame_nbytes // VOLTAGE_DTYPE.itemsize,
+            offset=self.data_offset,
+        )
+        return volt.reshape((n, *self.frame_shape))
+
+    def memmap_voltages(self) -> np.ndarray:
+        """Map all frames in memory without reading them, the pages are only
+        loaded when accessed. The mapping is copy-on-write, modifications of
+        the array are not written in the file
+
+        Returns:
+            np.ndarray: voltages of shape (n_frames, n_freq, n_exc, n_ch)
+        """
+        n = self.n_frames
+        if n == 0:  # mmap of an empty region is not possible
+            return np.empty((0, *self.frame_shape), dtype=VOLTAGE_DTYPE)
+        return np.memmap(
+            self.path,
+            dtype=VOLTAGE_DTYPE,
+            mode="c",
+            offset=self.data_offset,
+            shape=(n, *self.frame_shape),
+        )
+
+    def get(self, key: str, default: Any = None) -> Union[Any, None]:
+        """Return an info of the header"""
+        return self.header.get(key, default)
+
+
+## =============================================================================
+##  Write-behind writer
+## =============================================================================
+
+
+@dataclass
+class WriterStats:
+    """Counters of a DatasetFileWriter"""
+
+    queue_depth: int = 0  # nb of frames actually waiting for writing
+    queue_depth_max: int = 0  # max nb of frames waiting for writing
+    written: int = 0  # nb of frames written
+    overflowed: int = 0  # nb of frames put in the overflow (queue full)
+    overflow_depth: int = 0  # nb of frames actually waiting in the overflow
+    overflow_depth_max: int = 0  # max nb of frames waiting in the overflow
+    latency_last: float = 0.0  # in s, latency (put -> written) of the last frame
+    latency_max: float = 0.0  # in s, max latency (put -> written)
+    latency_mean: float = 0.0  # in s, mean latency (put -> written)
+
+
+class DatasetFileWriter(object):
+    """Write-behind writer of a dataset file
+
+    The frames are put in a bounded queue and written by a dedicated thread
+    in batches, the file is synchronized on the disk (fsync) at most every
+    FSYNC_PERIOD. Putting a frame never blocks: if the queue is full the
+    frames are appended to an unbounded overflow list, which the writer
+    drains in order once the queue is empty (dropping a frame would shift
+    the position of all the next frames in the file).
+    """
+
+    dataset_file: MeasurementDatasetFile
+    _queue: Queue
+    _overflow: deque  # frames put while the queue was full, in order
+    _overflow_lock: Lock
+    _worker: EventWorker
+    _stats: WriterStats
+    _latency_sum: float
+    _last_sync: float
+    _unsynced: bool
+    _last_overflow_log: float
+
+    def __init__(
+        self, dataset_file: MeasurementDatasetFile, maxsize: int = WRITER_QUEUE_SIZE
+    ) -> None:
+        """
+        Args:
+            dataset_file (MeasurementDatasetFile): dataset file opened for
+            writing (see MeasurementDatasetFile.create)
+            maxsize (int, optional): max nb of frames waiting for writing.
+            Defaults to WRITER_QUEUE_SIZE.
+        """
+        self.dataset_file = dataset_file
+        self._queue = Queue(maxsize=maxsize)
+        self._overflow = deque()
+        self._overflow_lock = Lock()
+        self._stats = WriterStats()
+        self._latency_sum = 0.0
+        self._last_sync = perf_counter()
+        self._unsynced = False
+        self._last_overflow_log = -OVERFLOW_LOG_PERIOD
+        self._worker = EventWorker(name="dataset_writer", func=self._wait_and_write)
+        self._worker.start()
+        self._worker.start_processing()
+
+    def put(self, voltages: np.ndarray) -> bool:
+        """Queue a frame for writing (never blocks), the frame is put in the
+        overflow if the queue is full or if frames are already waiting in
+        the overflow (to keep the order)
+
+        Args:
+            voltages (np.ndarray): frame voltages of shape frame_shape, the
+            array should not be modified afterwards
+
+        Returns:
+            bool: `False` if the frame has been put in the overflow
+        """
+        item = (perf_counter(), voltages)
+        with self._overflow_lock:
+            if not self._overflow:
+                try:
+                    self._queue.put_nowait(item)
+                    depth = self._queue.qsize()
+                    self._stats.queue_depth_max = max(self._stats.queue_depth_max, depth)
+                    return True
+                except Full:
+                    pass
+            self._overflow.append(item)
+            depth = len(self._overflow)
+        self._stats.overflowed += 1
+        self._stats.overflow_depth_max = max(self._stats.overflow_depth_max, depth)
+        self._log_overflow(depth)
+        return False
+
+    def _log_overflow(self, depth: int) -> None:
+        """Log the overflow (at most every OVERFLOW_LOG_PERIOD)"""
+        if perf_counter() - self._last_overflow_log < OVERFLOW_LOG_PERIOD:
+            return
+        self._last_overflow_log = perf_counter()
+        logger.warning(
+            f"Dataset writer queue full, {depth} frames waiting in the overflow ({self._stats.overflowed} overflowed)"
+        )
+
+    @property
+    def stats(self) -> WriterStats:
+        """Return the actual counters of the writer"""
+        self._stats.queue_depth = self._queue.qsize()
+        self._stats.overflow_depth = len(self._overflow)
+        return self._stats
+
+    def stop(self) -> WriterStats:
+        """Stop the writer thread, write the remaining frames, synchronize
+        and close the dataset file
+
+        Returns:
+            WriterStats: final counters of the writer
+        """
+        # wait the end of the thread (and of the batch it is writing), so
+        # that the remaining frames are written after it and only once
+        self._worker.stop(timeout=None)
+        self._write_batch(self._get_batch(block=False))
+        self.dataset_file.close()
+        stats = self.stats
+        logger.info(f"Dataset file {self.dataset_file.path} closed: {stats}")
+        return stats
+
+    def _wait_and_write(self) -> None:
+        """Wait for frames and write them as batch"""
+        self._write_batch(self._get_batch(block=True))
+        if self._unsynced and perf_counter() - self._last_sync >= FSYNC_PERIOD:
+            self._sync()
+
+    def _get_batch(self, block: bool) -> list[tuple[float, np.ndarray]]:
+        """Return the frames waiting in the queue, then those waiting in the
+        overflow once the queue is empty (max WRITER_BATCH_SIZE if
+        blocking)"""
+        batch = []
+        try:
+            if block and not self._overflow:
+                batch.append(self._queue.get(timeout=WORKER_TIMEOUT))
+            while not block or len(batch) < WRITER_BATCH_SIZE:
+                batch.append(self._queue.get_nowait())
+        except Empty:
+            # the frames of the overflow were put after those of the queue
+            with self._overflow_lock:
+                while self._overflow and (not block or len(batch) < WRITER_BATCH_SIZE):
+                    batch.append(self._overflow.popleft())
+        return batch
+
+    def _write_batch(self, batch: list[tuple[float, np.ndarray]]) -> None:
+        """Write a batch of frames and update the counters"""
+        if not batch:
+            return
+        for _, voltages in batch:
+            self.dataset_file.append(voltages)
+        self.dataset_file.flush()
+        self._unsynced = True
+
+        now = perf_counter()
+        for t_put, _ in batch:
+            latency = now - t_put
+            self._latency_sum += latency
+            self._stats.latency_max = max(self._stats.latency_max, latency)
+        self._stats.latency_last = latency
+        self._stats.written += len(batch)
+        self._stats.latency_mean = self._latency_sum / self._stats.written
+
+    def _sync(self) -> None:
+        """Synchronize the file on the disk"""
+        self.dataset_file.flush(sync=True)
+        self._last_sync = perf_counter()
+        self._unsynced = False
+
+
+if __name__ == "__main__":
+    """"""
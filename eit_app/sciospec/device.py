@@ -1,5 +1,7 @@
+from concurrent.futures import Future
 from enum import Enum
 import logging
+import os
 from time import sleep
 from typing import Any, Union
 
@@ -8,9 +10,6 @@ from eit_app.sciospec.constants import (
     CMD_GET_ETHERNET_CONFIG,
     CMD_GET_MEAS_SETUP,
     CMD_GET_OUTPUT_CONFIG,
-    CMD_SET_ETHERNET_CONFIG,
-    CMD_SET_MEAS_SETUP,
-    CMD_SET_OUTPUT_CONFIG,
     CMD_SOFT_RESET,
     CMD_START_STOP_MEAS,
     OP_BURST_COUNT,
@@ -24,7 +23,6 @@ from eit_app.sciospec.constants import (
     OP_IP_ADRESS,
     OP_MAC_ADRESS,
     OP_NULL,
-    OP_RESET_SETUP,
     OP_START_MEAS,
     OP_STOP_MEAS,
     OP_TIME_STAMP,
@@ -33,13 +31,20 @@ from eit_app.sciospec.constants import (
     SciospecOption,
 )
 from eit_app.sciospec.communicator import SciospecCommunicator
-from eit_app.sciospec.interface import SciospecSerialInterface
+from eit_app.sciospec.discovery import SciospecDeviceDiscovery
+from eit_app.sciospec.interface import Interface, SciospecSerialInterface
 from eit_app.sciospec.measurement import (
     DataAddRxMeasStream,
     DataInit4Start,
     DataReInit4Pause,
 )
 from eit_app.sciospec.setup import SciospecSetup
+from eit_app.sciospec.setup_cache import (
+    DeviceSetupCache,
+    setup_delta,
+    setup_wire_image,
+)
+from eit_app.sciospec.wire_journal import JOURNAL_EXT
 from eit_app.video.capture import SetStatusWMeasStatus
 from eit_app.com_channels import (
     AddToCaptureSignal,
@@ -48,6 +53,7 @@ from eit_app.com_channels import (
     DataCheckBurst,
     DataLoadLastDataset,
     DataLoadSetup,
+    DataStartRawJournal,
     SignalReciever,
 )
 from eit_app.update_gui import (
@@ -60,8 +66,10 @@ from eit_app.update_gui import (
     EvtPopMsgBox,
     MeasuringStatus,
 )
+from glob_utils.flags.flag import CustomFlag
 from glob_utils.flags.status import AddStatus
 from glob_utils.log.log import main_log
+from glob_utils.types.dict import dict_nested
 import glob_utils.dialog.Qt_dialogs
 from serial import (  # get from http://pyserial.sourceforge.net/
     PortNotOpenError,
@@ -97,14 +105,16 @@ class SciospecEITDevice(
     device_name: str
 
     setup: SciospecSetup
-    serial_interface: SciospecSerialInterface
+    # per default a SciospecSerialInterface, but any Interface can be used
+    # (e.g. SimulatedSciospecInterface)
+    serial_interface: Interface
 
     # The communicator is charged to send cmd to the interface, sort and
     # manage the comunitation (ack, etc). it dispatch the data recivied on
     # two different Signals new_rx_meas_stream/new_rx_setup_stream
     communicator: SciospecCommunicator
 
-    def __init__(self, n_channel: int = 32):
+    def __init__(self, n_channel: int = 32, interface: Interface = None):
         super().__init__()
 
         self.init_status(status_values=MeasuringStatus)
@@ -112,14 +122,21 @@ class SciospecEITDevice(
             data_callbacks={
                 DataLoadSetup: self.load_setup_from_signal,
                 DataCheckBurst: self.check_burst,
+                DataStartRawJournal: self.start_raw_journal,
             }  # TODO
         )
         self.n_channel = n_channel
         self.sciospec_devices = {}
         self.device_name: str = NONE_DEVICE
         self.setup = SciospecSetup(self.n_channel)
-        self.serial_interface = SciospecSerialInterface()
+        self.serial_interface = interface or SciospecSerialInterface()
         self.communicator = SciospecCommunicator()
+        self.discovery = SciospecDeviceDiscovery()
+        # setups last confirmed by the devices (per serial number)
+        self.setup_cache = DeviceSetupCache()
+        # if set, the raw rx frames are journaled during the measurements
+        self.raw_journal = CustomFlag()
+        self.raw_journal.clear()
 
         # all the errors from the interface are catch and send through this
         # error signal, the error are then here handled. Some of then need
@@ -201,8 +218,13 @@ class SciospecEITDevice(
     ##  Methods on Comunicator
     ## =========================================================================
 
-    def send_cmd(self, cmd: SciospecCmd, op: SciospecOption) -> bool:
-        """Send a command option to interface via the communicator"""
+    def send_cmd(self, cmd: SciospecCmd, op: SciospecOption) -> Future:
+        """Send a command option to interface via the communicator
+
+        Returns:
+            Future: resolves on the ack of the device (see
+            SciospecCommunicator.send_cmd_frame)
+        """
         data = self.setup.get_data(cmd, op)
         return self.communicator.send_cmd_frame(self.serial_interface, cmd, op, data)
 
@@ -282,14 +304,20 @@ class SciospecEITDevice(
     @check_not_measuring()
     def get_devices(self, *args, **kwargs) -> dict:
         """Lists the available Sciospec device is available
-        - Device infos are ask and if an ack is get: it is a Sciospec device..."""
-        ports = self.serial_interface.get_ports_available()
-        self.sciospec_devices = {}
-        for port in ports:
-            device_name = self._check_is_sciospec_dev(port)
-            if device_name is not None:
-                self.sciospec_devices[device_name] = port
-                self.device_name = device_name
+        - Device infos are ask and if an ack is get: it is a Sciospec device...
+
+        The USB serial ports are probed concurrently (see
+        SciospecDeviceDiscovery), other interfaces port by port"""
+        if isinstance(self.serial_interface, SciospecSerialInterface):
+            self._discover_devices()
+        else:
+            ports = self.serial_interface.get_ports_available()
+            self.sciospec_devices = {}
+            for port in ports:
+                device_name = self._check_is_sciospec_dev(port)
+                if device_name is not None:
+                    self.sciospec_devices[device_name] = port
+                    self.device_name = device_name
         self.to_gui.emit(EvtDataSciospecDevices(self.sciospec_devices))
         logger.info(f"Sciospec devices available: {list(self.sciospec_devices)}")
         return self.sciospec_devices
@@ -301,6 +329,8 @@ class SciospecEITDevice(
             return False
         if success := self._connect_interface(port):
             self.get_device_infos()
+            # the device can have been reset or power cycled meanwhile
+            self.setup_cache.invalidate(self.setup.get_sn())
 
         self.device_name = self.device_name if success else NONE_DEVICE
         self.to_gui_emit_connect_status()
@@ -321,6 +351,18 @@ class SciospecEITDevice(
         self.to_gui_emit_connect_status()
         self.get_devices()  # update the list of Sciospec devices available ????
 
+    def close(self) -> None:
+        """Close the device on application exit: the measurements are
+        stopped, the interface is closed and its listener stopped, then the
+        communicator is closed"""
+        if self.is_connected:
+            if not self.is_idle:
+                self._stop_meas()
+            self._disconnect_interface()
+        self.serial_interface.stop_journal()
+        self.serial_interface.listener.stop(timeout=None)
+        self.communicator.close()
+
     ## -------------------------------------------------------------------------
     ##  Internal methods
     ## -------------------------------------------------------------------------
@@ -333,6 +375,19 @@ class SciospecEITDevice(
         """Disconnect actual interface"""
         return self.serial_interface.close()
 
+    def _discover_devices(self) -> None:
+        """Probe concurrently the USB serial ports, the port of the connected
+        device is not probed"""
+        connected = {}
+        if self.is_connected and self.device_name in self.sciospec_devices:
+            connected[self.device_name] = self.sciospec_devices[self.device_name]
+        self.sciospec_devices = {
+            **self.discovery.discover(exclude=list(connected.values())),
+            **connected,
+        }
+        if not connected and self.sciospec_devices:
+            self.device_name = list(self.sciospec_devices)[-1]
+
     def _check_is_sciospec_dev(self, port) -> Union[str, None]:
         """Return a device name if the device presents on the port is a
         sciospec device otherwise return `None`"""
@@ -372,8 +427,10 @@ class SciospecEITDevice(
         """Switcht Measuring mode to assure
         start, pause and resume functionality"""
         if self.is_status(MeasuringStatus.NOT_MEASURING):
-            self.to_dataset.emit(DataInit4Start(self.setup))
-            self._begin_meas()
+            # the dataset starts the raw journal in its directory if enabled
+            self.to_dataset.emit(DataInit4Start(self.setup, self.raw_journal.is_set()))
+            if not self._begin_meas():
+                self.serial_interface.stop_journal()
         elif self.is_status(MeasuringStatus.MEASURING):
             self._pause_meas()
         elif self.is_status(MeasuringStatus.PAUSED):
@@ -381,16 +438,44 @@ class SciospecEITDevice(
 
     def stop_meas(self, *args, **kwargs) -> None:
         """Stop measurements"""
-        if success := self._stop_meas():
+        success = self._stop_meas()
+        # the measurement is over for the journal even if the device did not
+        # acknowledge the stop
+        self.serial_interface.stop_journal()
+        if success:
             self.set_status(MeasuringStatus.NOT_MEASURING)
             self.to_gui.emit(EvtDataNewFrameProgress(0, 0))
             self.to_dataset.emit(DataLoadLastDataset())
         logger.info(f"Stop Measurements - {SUCCESS[success]}")
+        logger.info(f"RX frames: {self.communicator.rx_ring.stats}")
+
+    def set_raw_journal(self, enable: bool = True, *args, **kwargs) -> None:
+        """Enable/disable the raw journal of the rx frames for the next
+        measurements (see eit_app.sciospec.wire_journal). The dataset can be
+        rebuilt offline from the journal with eit_app.journal_rebuild"""
+        self.raw_journal.set(enable)
+        logger.info(f"Raw journal of the measurements - {'ON' if enable else 'OFF'}")
 
     ## -------------------------------------------------------------------------
     ##  Internal methods
     ## -------------------------------------------------------------------------
 
+    def start_raw_journal(self, data: DataStartRawJournal) -> None:
+        """Start the raw journal of the rx frames in the dataset directory,
+        with the setup needed for the rebuild (called by a signal)"""
+        if not self.raw_journal.is_set():
+            return
+        path = os.path.join(data.dir, f"raw_journal_{data.time_stamps}{JOURNAL_EXT}")
+        self.serial_interface.start_journal(
+            path,
+            time_stamps=data.time_stamps,
+            device_name=self.device_name,
+            setup=dict_nested(self.setup, ignore_private=True),
+            freq_list=self.setup.get_freqs_list(),
+            excitation=self.setup.get_exc_pattern(),
+            n_channel=self.setup.get_channel(),
+        )
+
     @check_not_measuring()
     def _begin_meas(self) -> bool:  # sourcery skip: class-extract-method
         """Begin measurements"""
@@ -421,18 +506,16 @@ class SciospecEITDevice(
 
         Send cmd to device
         """
-        success = self.send_cmd(CMD_START_STOP_MEAS, OP_START_MEAS)
-        self.communicator.wait_not_busy()
-        return success
+        future = self.send_cmd(CMD_START_STOP_MEAS, OP_START_MEAS)
+        return self.communicator.wait_cmd_done(future)
 
     def _stop_meas(self) -> bool:
         """Stop measurements
 
         Send cmd to device
         """
-        success = self.send_cmd(CMD_START_STOP_MEAS, OP_STOP_MEAS)
-        self.communicator.wait_not_busy()
-        return success
+        future = self.send_cmd(CMD_START_STOP_MEAS, OP_STOP_MEAS)
+        return self.communicator.wait_cmd_done(future)
 
     ## =========================================================================
     ##  Setup device
@@ -448,23 +531,36 @@ class SciospecEITDevice(
 
     @check_not_measuring()
     def set_setup(self, *args, **kwargs) -> None:
-        """Send the setup to the device"""
+        """Send the setup to the device
+
+        Only the commands which differ from the setup last confirmed by the
+        device since its connection are sent. To force a full transfer (e.g.
+        the device has been power cycled) use kwargs force=True
+        """
         logger.info("Setting device setup - start...")
-        self.send_cmd(CMD_SET_OUTPUT_CONFIG, OP_EXC_STAMP)
-        self.send_cmd(CMD_SET_OUTPUT_CONFIG, OP_CURRENT_STAMP)
-        self.send_cmd(CMD_SET_OUTPUT_CONFIG, OP_TIME_STAMP)
-        self.send_cmd(CMD_SET_ETHERNET_CONFIG, OP_DHCP)
-        self.send_cmd(CMD_SET_MEAS_SETUP, OP_RESET_SETUP)
-        self.send_cmd(CMD_SET_MEAS_SETUP, OP_EXC_AMPLITUDE)
-        self.send_cmd(CMD_SET_MEAS_SETUP, OP_BURST_COUNT)
-        self.send_cmd(CMD_SET_MEAS_SETUP, OP_FRAME_RATE)
-        self.send_cmd(CMD_SET_MEAS_SETUP, OP_EXC_FREQUENCIES)
-        for idx in range(len(self.setup.get_exc_pattern())):
-            self.setup.set_exc_pattern_idx(idx)
-            self.send_cmd(CMD_SET_MEAS_SETUP, OP_EXC_PATTERN)
-        self.communicator.wait_not_busy()
-        self.get_setup()
-        logger.info("Setting device setup - done")
+        sn = self.setup.get_sn()
+        desired = setup_wire_image(self.setup)
+        confirmed = None if kwargs.get("force") else self.setup_cache.get(sn)
+        futures = []
+        for cmd, op in setup_delta(desired, confirmed):
+            if op != OP_EXC_PATTERN:
+                futures.append(self.send_cmd(cmd, op))
+                continue
+            for idx in range(len(self.setup.get_exc_pattern())):
+                self.setup.set_exc_pattern_idx(idx)
+                futures.append(self.send_cmd(cmd, op))
+        logger.debug(f"Setup commands sent: {len(futures)}")
+        success = self.communicator.wait_not_busy() and all(
+            self.communicator.wait_cmd_done(f) for f in futures
+        )
+        if not success:
+            self.setup_cache.invalidate(sn)
+        elif confirmed is None:
+            self.get_setup()  # read back the whole setup from the device
+        else:
+            self.setup_cache.put(sn, desired)
+            self.to_gui.emit(EvtDataSciospecDevSetup(self.setup))
+        logger.info(f"Setting device setup - {SUCCESS[success]}")
 
     @check_not_measuring()
     def get_setup(self, *args, **kwargs) -> None:
@@ -481,7 +577,8 @@ class SciospecEITDevice(
         self.send_cmd(CMD_GET_ETHERNET_CONFIG, OP_IP_ADRESS)
         self.send_cmd(CMD_GET_ETHERNET_CONFIG, OP_MAC_ADRESS)
         self.send_cmd(CMD_GET_ETHERNET_CONFIG, OP_DHCP)
-        self.communicator.wait_not_busy()
+        if self.communicator.wait_not_busy() and self.setup.is_sciospec():
+            self.setup_cache.put(self.setup.get_sn(), setup_wire_image(self.setup))
         self.to_gui.emit(EvtDataSciospecDevSetup(self.setup))
         logger.info("Getting device setup - done")
 
@@ -491,6 +588,7 @@ class SciospecEITDevice(
         Notes: a restart is needed after this method
         """
         logger.info("Softreset of device - start...")
+        self.setup_cache.invalidate(self.setup.get_sn())
         self.send_cmd(CMD_SOFT_RESET, OP_NULL)
         self.communicator.wait_not_busy()
         sleep(10)
@@ -0,0 +1,191 @@
+""" Parallel discovery of the Sciospec devices connected on serial ports
+
+Only the USB serial ports are probed (the Sciospec devices are USB devices),
+all of them concurrently. A probe opens the port, sends a stop-meas and a
+get-device-infos command and waits at most DISCOVERY_TIMEOUT for the
+serial number of the device.
+
+The results are cached per port and hardware id: only the new ports and
+the ports whose USB device changed (other hardware id) are probed. The
+serial number of a found device is reused as long as its port keeps the
+same hardware id, and ports which were not Sciospec devices are not probed
+again (as long as some Sciospec device is found).
+
+example of Use is
+
+    discovery = SciospecDeviceDiscovery()
+    devices = discovery.discover() # {device_name: port}
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Union
+
+import serial.tools.list_ports
+from eit_app.sciospec.constants import (
+    CMD_BYTE_INDX,
+    CMD_GET_DEVICE_INFOS,
+    CMD_START_STOP_MEAS,
+    OP_NULL,
+    OP_STOP_MEAS,
+    build_cmd_frame,
+)
+from eit_app.sciospec.interface import (
+    SER_TIMEOUT,
+    SERIAL_BAUD_RATE_DEFAULT,
+    RxFrameRingBuffer,
+)
+from eit_app.sciospec.setup import DeviceInfos
+from serial import Serial, SerialException
+
+logger = logging.getLogger(__name__)
+
+DISCOVERY_TIMEOUT = 1.0  # in s, max time to wait for the answer of a device
+DISCOVERY_WORKERS = 16  # max nb of ports probed concurrently
+
+
+def build_device_name(sn: str, port: str) -> str:
+    """Create a generic sciopsec device name (see
+    SciospecSetup.build_sciospec_device_name)"""
+    return f'Device (SN: {sn}) on "{port}"'
+
+
+def list_usb_serial_ports() -> dict[str, str]:
+    """Return the USB serial ports available on the system
+
+    Returns:
+        dict[str, str]: hardware ids of the ports {port: hwid}
+    """
+    ports = {}
+    for p in serial.tools.list_ports.comports():
+        if p.vid is None or "Bluetooth" in p.device:  # not an USB device
+            logger.debug(f"Port: {p.device} - ignored")
+            continue
+        ports[p.device] = p.hwid
+    return ports
+
+
+def probe_port(port: str, timeout: float = DISCOVERY_TIMEOUT) -> Union[str, None]:
+    """Return the serial number of the Sciospec device on the port
+
+    Args:
+        port (str): serial port
+        timeout (float, optional): max time to wait for the answer in s.
+        Defaults to DISCOVERY_TIMEOUT.
+
+    Returns:
+        Union[str, None]: serial number or `None` if no Sciospec device
+        answers on the port
+    """
+    stop_meas = build_cmd_frame(CMD_START_STOP_MEAS, OP_STOP_MEAS, [])
+    get_infos = build_cmd_frame(CMD_GET_DEVICE_INFOS, OP_NULL, [])
+    rx_buffer = RxFrameRingBuffer()
+    try:
+        with Serial(
+            port, SERIAL_BAUD_RATE_DEFAULT, timeout=SER_TIMEOUT, write_timeout=timeout
+        ) as ser:
+            ser.reset_input_buffer()
+            # stop-meas in case that the device is still measuring!
+            ser.write(bytearray(stop_meas + get_infos))
+            deadline = monotonic() + timeout
+            while monotonic() < deadline:
+                if chunk := ser.read(max(1, ser.in_waiting)):
+                    rx_buffer.write(chunk)
+                for rx_frame in rx_buffer.pop_frames():
+                    if rx_frame[CMD_BYTE_INDX] == CMD_GET_DEVICE_INFOS.tag:
+                        infos = DeviceInfos()
+                        infos.set_sn(rx_frame)
+                        return infos.get_sn() if infos.is_sn_sciopec() else None
+    except (OSError, SerialException) as e:
+        logger.debug(f"Port: {port} - not probed ({e})")
+    return None
+
+
+class SciospecDeviceDiscovery(object):
+    """Discover the Sciospec devices connected on the USB serial ports"""
+
+    sn_ports: dict[str, str]  # serial number -> port of the found devices
+    _found: dict[str, tuple[str, str]]  # port -> (hwid, sn) of found devices
+    _not_sciospec: dict[str, str]  # port -> hwid of other devices
+
+    def __init__(
+        self, timeout: float = DISCOVERY_TIMEOUT, max_workers: int = DISCOVERY_WORKERS
+    ) -> None:
+        """
+        Args:
+            timeout (float, optional): max time to wait for the answer of a
+            device in s. Defaults to DISCOVERY_TIMEOUT.
+            max_workers (int, optional): max nb of ports probed concurrently.
+            Defaults to DISCOVERY_WORKERS.
+        """
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.sn_ports = {}
+        self._found = {}
+        self._not_sciospec = {}
+
+    def discover(self, exclude: list[str] = None) -> dict[str, str]:
+        """Probe concurrently the new or changed USB serial ports (see
+        module description)
+
+        Args:
+            exclude (list[str], optional): ports not to probe (e.g. port in
+            use). Defaults to None.
+
+        Returns:
+            dict[str, str]: found devices {device_name: port}
+        """
+        exclude = exclude or []
+        ports = {p: h for p, h in list_usb_serial_ports().items() if p not in exclude}
+        to_probe = [p for p, h in ports.items() if not self._is_cached(p, h)]
+        logger.debug(
+            f"Ports to probe: {to_probe} ({len(ports) - len(to_probe)} cached)"
+        )
+        sns = {}
+        if to_probe:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_workers, len(to_probe)),
+                thread_name_prefix="discovery",
+            ) as pool:
+                sns = dict(
+                    zip(to_probe, pool.map(lambda p: probe_port(p, self.timeout), to_probe))
+                )
+        self._update_cache(ports, sns)
+        return {build_device_name(sn, p): p for p, (_, sn) in self._found.items()}
+
+    def clear(self) -> None:
+        """Clear the cached results"""
+        self.sn_ports = {}
+        self._found = {}
+        self._not_sciospec = {}
+
+    def _is_cached(self, port: str, hwid: str) -> bool:
+        """Assess if the result of the probe of the port is cached for the
+        USB device (hardware id)"""
+        if port in self._found:
+            return self._found[port][0] == hwid
+        return self._not_sciospec.get(port) == hwid
+
+    def _update_cache(self, ports: dict[str, str], sns: dict[str, Union[str, None]]):
+        for p, sn in sns.items():
+            if sn is None:
+                self._not_sciospec[p] = ports[p]
+                self._found.pop(p, None)
+            else:
+                self._found[p] = (ports[p], sn)
+                self._not_sciospec.pop(p, None)
+        # forget the unplugged (or excluded) devices
+        self._found = {p: v for p, v in self._found.items() if p in ports}
+        self.sn_ports = {sn: p for p, (_, sn) in self._found.items()}
+        if not self._found:
+            # e.g. device still booting: all ports probed again next time
+            self._not_sciospec = {}
+
+
+if __name__ == "__main__":
+    """"""
+    from glob_utils.log.log import main_log
+
+    main_log()
+    print(SciospecDeviceDiscovery().discover())
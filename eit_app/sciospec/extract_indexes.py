@@ -0,0 +1,72 @@
+""" Indexes of the frames and frequencies used for computation
+
+Kept free of any gui dependency, so that it can be used for offline
+reconstruction.
+"""
+import logging
+from dataclasses import dataclass
+
+from eit_model.imaging import IMAGING_TYPE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExtractIndexes:
+    """This Class is used to transform the frame and frequencies indexes
+
+    ref_idx: int > ref frame index for TD
+    ref_freq: int > ref freq index for FD
+    meas_idx: int > actual frame index (for TD and absolute)
+    meas_freq: int > frequency index fro TD or freq 1 for FD
+    imaging: str
+
+
+    for TD abd absolute
+        ref_idx= None   >> the ref frame of the measuremnet setup will be used
+        ref_freq= meas_freq
+        meas_idx
+        meas_freq
+
+    for FD
+        ref_idx= meas_idx   >> the same frame is used but a different frequency
+        ref_freq
+        meas_idx
+        meas_freq
+
+    """
+
+    ref_idx: int
+    ref_freq: int
+    meas_idx: int
+    meas_freq: int
+    imaging: str
+
+    def __post_init__(self):
+        if self.imaging not in IMAGING_TYPE:
+            logger.error(
+                f"Wrong imaging {self.imaging}, expected {IMAGING_TYPE.keys()}"
+            )
+        if any(s in self.imaging for s in ["Time", "Absolute"]):
+            self.set_TD_mode()
+        elif "Frequence" in self.imaging:
+            self.set_FD_mode()
+
+    def set_ref_idx(self, idx: int):
+        if self.ref_idx is not None:
+            self.ref_idx = idx
+
+    def set_meas_idx(self, idx: int):
+        if idx is not None:
+            self.meas_idx = idx
+
+    def set_TD_mode(self):
+        self.ref_idx = None
+        self.ref_freq = self.meas_freq
+
+    def set_FD_mode(self):
+        self.ref_idx = self.meas_idx
+
+
+if __name__ == "__main__":
+    """"""
@@ -51,7 +51,8 @@ from serial import (
     PortNotOpenError,
 )  # get from http://pyserial.sourceforge.net/
 from eit_app.sciospec.constants import *
-from glob_utils.thread_process.threads_worker import Poller
+from eit_app.sciospec.wire_journal import RawFrameJournal
+from eit_app.worker import EventWorker
 from glob_utils.thread_process.signal import Signal
 from glob_utils.flags.flag import CustomFlag
 
@@ -62,6 +63,7 @@ SERIAL_BAUD_RATE_DEFAULT = 115200
 HARDWARE_NOT_DETECTED = 0xFF
 
 SUCCESS = {True: "SUCCESS", False: "FAIL"}
+RX_BUFFER_SIZE = 64 * 1024  # in bytes, a Sciospec frame is max. 258 bytes long
 
 # ===============================================================================
 #     Serial Interface Error (Obslete)
@@ -87,31 +89,60 @@ class Interface(ABC):
     new_rx_frame: Signal  # Signal used to transmit new rx frame
     error: Signal  # Signal used to transmit error occruring during opening, writing, or listening process
     is_connected: CustomFlag
+    journal: Union[RawFrameJournal, None]  # raw journal of the rx frames
 
-    def __init__(
-        self, name_listener_thread: str = "listener", sleeptime: float = 0.01
-    ) -> None:
+    def __init__(self, name_listener_thread: str = "listener") -> None:
         super().__init__()
 
         self.new_rx_frame = Signal(self)
         self.error = Signal(self)
         self.is_connected = CustomFlag()
         self.is_connected.clear()
+        self.journal = None
 
-        self.listener = Poller(
-            name=name_listener_thread, sleeptime=sleeptime, pollfunc=self._poll
-        )
+        self.listener = EventWorker(name=name_listener_thread, func=self._poll)
         self.listener.start()
 
     def _poll(self):
         self.listen()
 
     def listening_activate(self, activate: bool = True):
-        """Activate/Deactivate the polling"""
+        """Activate/Deactivate the listening"""
         if activate:
-            self.listener.start_polling()
+            self.listener.start_processing()
         else:
-            self.listener.stop_polling()
+            self.listener.stop_processing()
+
+    def start_journal(self, path: str, **infos) -> RawFrameJournal:
+        """Start to append all rx frames to a raw frame journal (before any
+        parsing), a running journal is closed
+
+        Args:
+            path (str): journal file path
+            infos: infos to save in the header of the journal (see
+            RawFrameJournal)
+        """
+        self.stop_journal()
+        self.journal = RawFrameJournal(path, **infos)
+        return self.journal
+
+    def stop_journal(self) -> None:
+        """Stop and close the raw frame journal"""
+        journal, self.journal = self.journal, None
+        if journal is not None:
+            journal.close()
+
+    def _emit_rx_frames(self, rx_frames: list[list[bytes]]) -> None:
+        """Append the rx frames to the journal (if started) then emit them
+        one by one"""
+        if not rx_frames:
+            return
+        if (journal := self.journal) is not None:
+            journal.append(rx_frames)
+        for rx_frame in rx_frames:
+            self.rx_frame = rx_frame
+            kwargs = {"rx_frame": self.rx_frame}
+            self.new_rx_frame.emit(**kwargs)
 
     @abstractmethod
     def open(self) -> bool:
@@ -120,7 +151,7 @@ class Interface(ABC):
     @abstractmethod
     def close(self):
         """Close serial interface
-        don't forget to stop the listener with self.listener.stop_polling()"""
+        don't forget to stop the listener with self.listener.stop_processing()"""
 
     @abstractmethod
     def write(self, data) -> bool:
@@ -128,9 +159,104 @@ class Interface(ABC):
 
     @abstractmethod
     def listen(self):
-        """Method called by the listener
+        """Method called in loop by the listener
+
+        here come the code to read the port or wahtever you want to listen.
+        It should block until data are available or a short timeout
+        (e.g. SER_TIMEOUT) elapsed, it should never return immediately
+        without data"""
+
+
+# ===============================================================================
+#     Ring buffer for rx frames
+# ===============================================================================
+
+
+class RxFrameRingBuffer(object):
+    """Preallocated ring buffer in which the bytes read on an interface are
+    stored and out of which the complete Sciospec frames are extracted.
+
+    A Sciospec frame looks like [CMD, LL, data (LL bytes), CMD], the length
+    byte (LENGTH_BYTE_INDX) is used to split the stream in frames. Partial
+    frames are kept in the buffer until the missing bytes have been written.
+    """
+
+    def __init__(self, size: int = RX_BUFFER_SIZE) -> None:
+        self._buf = bytearray(size)
+        self._size = size
+        self._head = 0  # index of the oldest byte
+        self._cnt = 0  # nb of bytes stored
+
+    @property
+    def free(self) -> int:
+        """Nb of bytes which can still be written in the buffer"""
+        return self._size - self._cnt
+
+    def __len__(self) -> int:
+        return self._cnt
+
+    def clear(self) -> None:
+        """Discard all stored bytes"""
+        self._head = 0
+        self._cnt = 0
 
-        here come the code to read the port or wahtever you want to listen"""
+    def write(self, data: bytes) -> int:
+        """Copy data at the end of the buffer
+
+        Args:
+            data (bytes): bytes to store, bytes exceeding the free space are
+            ignored
+
+        Returns:
+            int: nb of bytes written
+        """
+        n = min(len(data), self.free)
+        tail = (self._head + self._cnt) % self._size
+        first = min(n, self._size - tail)
+        self._buf[tail : tail + first] = data[:first]
+        if n > first:  # wrap around
+            self._buf[: n - first] = data[first:n]
+        self._cnt += n
+        if n < len(data):
+            logger.error(f"RX buffer overflow: {len(data) - n} bytes lost")
+        return n
+
+    def pop_frames(self) -> list[list[bytes]]:
+        """Extract all complete frames contained in the buffer
+
+        Returns:
+            list[list[bytes]]: complete frames in order of reception
+        """
+        frames = []
+        while self._cnt >= FRAME_LENGTH_MIN:
+            # [CMD, LL, data (LL bytes), CMD]
+            frame_len = self._peek(LENGTH_BYTE_INDX) + LENGTH_BYTE_INDX + 2
+            if self._cnt < frame_len:
+                break  # partial frame, wait for the rest
+            if self._peek(frame_len - 1) != self._peek(CMD_BYTE_INDX):
+                # start and end CMD byte differ: resync by dropping one byte
+                logger.warning(f"RX frame out of sync, byte {self._peek(0)} dropped")
+                self._skip(1)
+                continue
+            frames.append(self._pop(frame_len))
+        return frames
+
+    def _peek(self, offset: int) -> int:
+        return self._buf[(self._head + offset) % self._size]
+
+    def _skip(self, n: int) -> None:
+        self._head = (self._head + n) % self._size
+        self._cnt -= n
+
+    def _pop(self, n: int) -> list[bytes]:
+        end = self._head + n
+        if end <= self._size:
+            frame = list(self._buf[self._head : end])
+        else:  # wrap around
+            frame = list(self._buf[self._head :])
+            frame.extend(self._buf[: end - self._size])
+        self._skip(n)
+        return frame
 
 
 # ===============================================================================
@@ -141,13 +267,15 @@ class Interface(ABC):
 class SciospecSerialInterface(Interface):
     """Class to interface with the serial port of Sciospec Device.
 
-    Repeatedly polls hardware, unless we are sending a command
+    The listener blocks on the serial read (timeout SER_TIMEOUT) until some
+    bytes are recieved.
     "Ser" is a serial port class from the pyserial pacakge"""
 
     def __init__(self) -> None:
-        """Constructor responsible of attrs init and starting the HW Poller(thread)"""
-        super().__init__(name_listener_thread="serial listener", sleeptime=0.01)
+        """Constructor responsible of attrs init and starting the HW listener(thread)"""
+        super().__init__(name_listener_thread="serial listener")
         self.rx_frame = None  # last response retrieved by polling
+        self.rx_buffer = RxFrameRingBuffer()
         self.serial_port = Serial()
         self.is_connected.set(self.serial_port.is_open)
         self.ports_available = []
@@ -160,20 +288,22 @@ class SciospecSerialInterface(Interface):
         Args:
             port (str): serial port e.g. "COM1"
             baudrate (int, optional): Defaults to SERIAL_BAUD_RATE_DEFAULT.
-            kwargs see SerialBase
+            kwargs see SerialBase, the read timeout is per default SER_TIMEOUT
         """
         if baudrate is None:
             baudrate = SERIAL_BAUD_RATE_DEFAULT
+        kwargs.setdefault("timeout", SER_TIMEOUT)
+        self.rx_buffer.clear()
         success = self._open(port=port, baudrate=str(baudrate), **kwargs)
         self.is_connected.set(self.serial_port.is_open)
         logger.debug(f"Opening serial port: {port} - {SUCCESS[success]}")
-        self.listener.start_polling()
+        self.listener.start_processing()
         return success
 
     # @abstractmethod
     def close(self) -> bool:
         """Close serial interface"""
-        self.listener.stop_polling()
+        self.listener.stop_processing()
         port = self.get_port_name()
         success = self._close()
         self.is_connected.set(self.serial_port.is_open)
@@ -187,12 +317,12 @@ class SciospecSerialInterface(Interface):
 
     # @abstractmethod
     def listen(self):
-        """Listen the serial port"""
-        self.rx_frame = self._get_rx_frame()
-        if self.rx_frame is None:
+        """Listen the serial port, all complete frames are journaled (if a
+        journal is started) and emitted one by one"""
+        if not self.serial_port.is_open:
+            sleep(SER_TIMEOUT)
             return
-        kwargs = {"rx_frame": self.rx_frame}
-        self.new_rx_frame.emit(**kwargs)
+        self._emit_rx_frames(self._get_rx_frames())
 
     def _catch_error(return_result: bool = False, return_success: bool = False):
         """_summary_
@@ -240,6 +370,7 @@ class SciospecSerialInterface(Interface):
         """Reinit the interface"""
         self.ports_available = []
         self.rx_frame = None
+        self.rx_buffer.clear()
         logger.debug("Reinitialisation of SciospecSerialInterface - DONE")
 
     def get_port_name(self):
@@ -323,37 +454,39 @@ class SciospecSerialInterface(Interface):
         logger.debug(f"TX: {data}")
         self.serial_port.flush()
 
-    def _get_rx_frame(self) -> Union[list[bytes], None]:
-        """Return a complete data frame if available on the port
+    def _get_rx_frames(self) -> list[list[bytes]]:
+        """Return all complete data frames available on the port
+
+        All bytes waiting on the port are read in one chunk and pushed in the
+        ring buffer, out of which all complete frames are then extracted.
+        Incomplete frames stay in the ring buffer until the next read.
+        If no bytes are waiting, the read blocks until at least one byte is
+        recieved or the read timeout (SER_TIMEOUT) elapsed. On a port error
+        (e.g. device unplugged) the error is emitted and SER_TIMEOUT is waited
+        too, so that the listener does not spin and flood the errors.
 
         Returns:
-            Union[list[bytes], None]: complete data frame or
-            None if not availbale or an error occurs
+            list[list[bytes]]: complete data frames (can be empty)
         """
-        # a frame is at least 4 bytes
         n_bytes = self.read_nb_of_availables_bytes()
-        if n_bytes is None or n_bytes < FRAME_LENGTH_MIN:
-            return None
-        # read up to the length byte
-        rx_frame = self.read_bytes(LENGTH_BYTE_INDX + 1)
-        if rx_frame is None:
-            return None
-        # read also the additional "ending CMD Byte"
-        length_data2read = rx_frame[LENGTH_BYTE_INDX] + 1
-        # dangerous ...timer use?
-        while 1:
-            n_bytes = self.read_nb_of_availables_bytes()
-            if n_bytes is None:
-                return None
-            if not n_bytes < length_data2read:
-                break
-
-        tmp = self.read_bytes(length_data2read)
-        if tmp is None:
-            return None
-        rx_frame.extend(tmp)
-        logger.debug(f"RX: {rx_frame[:10]}")
-        return rx_frame
+        if n_bytes is None:
+            sleep(SER_TIMEOUT)
+            return []
+        chunk = self._read_chunk(max(1, min(n_bytes, self.rx_buffer.free)))
+        if chunk is None:
+            sleep(SER_TIMEOUT)
+        elif chunk:
+            self.rx_buffer.write(chunk)
+        rx_frames = self.rx_buffer.pop_frames()
+        if rx_frames:
+            logger.debug(f"RX: {len(rx_frames)} frames, last: {rx_frames[-1][:10]}")
+        return rx_frames
+
+    @_catch_error(return_result=True)
+    def _read_chunk(self, nb_bytes: int) -> bytes:
+        # can raise a SerialException("ClearCommError failed ({!r})".format(ctypes.WinError()))
+        # can raise a PortNotOpenError()
+        return self.serial_port.read(nb_bytes)
 
     def read_nb_of_availables_bytes(self) -> Union[int, None]:
         """Return the number of bytes available on the input buffer of the
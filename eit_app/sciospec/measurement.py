@@ -1,14 +1,21 @@
 import os
-from dataclasses import dataclass
 import logging
 from sys import argv
-from typing import Union
+from time import monotonic
+from typing import Callable, Union
 
 import numpy as np
 from eit_app.default.set_default_dir import APP_DIRS, AppStdDir
-from eit_app.sciospec.constants import OPTION_BYTE_INDX
+from eit_app.sciospec.constants import MEAS_STREAM_DTYPE, N_CH_PER_STREAM
 from eit_app.sciospec.setup import SciospecSetup
-from eit_app.sciospec.utils import convert4Bytes2Float, convertBytes2Int
+from eit_app.sciospec.extract_indexes import ExtractIndexes
+from eit_app.sciospec.dataset_file import (
+    DatasetFileError,
+    DatasetFileWriter,
+    MeasurementDatasetFile,
+    WriterStats,
+    is_dataset_file_in,
+)
 from eit_app.com_channels import (
     AddToCaptureSignal,
     AddToComputationSignal,
@@ -22,6 +29,7 @@ from eit_app.com_channels import (
     DataInit4Start,
     DataLoadLastDataset,
     DataLoadSetup,
+    DataStartRawJournal,
     DataReInit4Pause,
     DataReplayStart,
     DataSaveLoadImage,
@@ -29,11 +37,11 @@ from eit_app.com_channels import (
 )
 from eit_app.update_gui import (
     EvtDataAutosaveOptionsChanged,
+    EvtDataAutosaveStats,
     EvtDataMeasDatasetLoaded,
     EvtDataNewFrameInfo,
     EvtDataNewFrameProgress,
 )
-from eit_model.imaging import IMAGING_TYPE
 from glob_utils.decorator.decorator import catch_error
 from glob_utils.file.utils import FileExt, search_for_file_with_ext
 from glob_utils.file.json_utils import read_json, save_to_json
@@ -51,72 +59,13 @@ from eit_app.sciospec.voltage import EITChannelVoltage, EITVoltageLabels
 
 logger = logging.getLogger(__name__)
 
-N_CH_PER_STREAM = 16
-
-
+AUTOSAVE_STATS_PERIOD = 1.0  # in s, min time between two autosave stats updates
 
 ## =============================================================================
 ##  Class for the DataSet obtained from the EIT Device
 ## =============================================================================
 
 
-@dataclass
-class ExtractIndexes:
-    """This Class is used to transform the frame and frequencies indexes
-
-    ref_idx: int > ref frame index for TD
-    ref_freq: int > ref freq index for FD
-    meas_idx: int > actual frame index (for TD and absolute)
-    meas_freq: int > frequency index fro TD or freq 1 for FD
-    imaging: str
-
-
-    for TD abd absolute
-        ref_idx= None   >> the ref frame of the measuremnet setup will be used
-        ref_freq= meas_freq
-        meas_idx
-        meas_freq
-
-    for FD
-        ref_idx= meas_idx   >> the same frame is used but a different frequency
-        ref_freq
-        meas_idx
-        meas_freq
-
-    """
-
-    ref_idx: int
-    ref_freq: int
-    meas_idx: int
-    meas_freq: int
-    imaging: str
-
-    def __post_init__(self):
-        if self.imaging not in IMAGING_TYPE:
-            logger.error(
-                f"Wrong imaging {self.imaging}, expected {IMAGING_TYPE.keys()}"
-            )
-        if any(s in self.imaging for s in ["Time", "Absolute"]):
-            self.set_TD_mode()
-        elif "Frequence" in self.imaging:
-            self.set_FD_mode()
-
-    def set_ref_idx(self, idx: int):
-        if self.ref_idx is not None:
-            self.ref_idx = idx
-
-    def set_meas_idx(self, idx: int):
-        if idx is not None:
-            self.meas_idx = idx
-
-    def set_TD_mode(self):
-        self.ref_idx = None
-        self.ref_freq = self.meas_freq
-
-    def set_FD_mode(self):
-        self.ref_idx = self.meas_idx
-
-
 class RXMeasStreamData:
     """This Class is used for the extraction of single informations contained
     in a rx measurement frame
@@ -130,17 +79,25 @@ class RXMeasStreamData:
     time_stamp: int
     voltage: np.ndarray
 
-    def __init__(self, rx_meas_stream: list[bytes], excitation: list[list[int]]):
-        """See in Sciospec documentation"""
-        rx_data = rx_meas_stream[OPTION_BYTE_INDX:-1]
-        self.ch_group = rx_data[0]
-        self.exc_indx = self._find_excitation_indx(rx_data[1:3], excitation)
-        self.freq_indx = convertBytes2Int(rx_data[3:5])
-        self.time_stamp = convertBytes2Int(rx_data[5:9])
-        self.voltage = convert_meas_data(rx_data[9:])
-        logger.debug(
-            f"RX MEAS data: {self.ch_group=}, {self.exc_indx=}, {self.freq_indx=}, {self.time_stamp=}, {self.voltage=} - TREATED"
-        )
+    def __init__(
+        self,
+        rx_meas_stream: Union[bytes, memoryview, list[bytes]],
+        excitation: list[list[int]],
+    ):
+        """See in Sciospec documentation
+
+        The header and the voltages are decoded in one shot, voltage is a
+        view (dtype ">c8") on the frame buffer"""
+        rec = decode_meas_stream(rx_meas_stream)
+        self.ch_group = int(rec["ch_group"])
+        self.exc_indx = self._find_excitation_indx(rec["exc"].tolist(), excitation)
+        self.freq_indx = int(rec["freq_indx"])
+        self.time_stamp = int(rec["time_stamp"])
+        self.voltage = rec["voltage"]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"RX MEAS data: {self.ch_group=}, {self.exc_indx=}, {self.freq_indx=}, {self.time_stamp=} - TREATED"
+            )
 
     # def is_first(self):
     #     return self.ch_group + self.freq_indx + self.exc_indx == 1
@@ -398,6 +355,18 @@ class MeasurementFrame(object):
         """Return the measured voltage for the given frequency index"""
         return self.meas[idx_freq].get_voltage()
 
+    def get_all_voltages(self) -> np.ndarray:
+        """Return the measured voltages for all frequencies as an array of
+        shape (n_freq, n_exc, n_channel)"""
+        return np.stack([m.get_voltage() for m in self.meas])
+
+    def set_all_voltages(self, volt: np.ndarray) -> None:
+        """Set the measured voltages for all frequencies out of an array of
+        shape (n_freq, n_exc, n_channel), the frame is then complete"""
+        for m, v in zip(self.meas, volt):
+            m.voltage = v
+        self._meas_stream_cnt = self._meas_stream_max
+
     def get_idx(self) -> int:
         return self.idx
 
@@ -445,6 +414,63 @@ class MeasurementFrame(object):
         return True
 
 
+class LazyMeasurementFrames(object):
+    """Sequence of measurement frames backed by the (memory-mapped) voltages
+    of a dataset file
+
+    The frames are only built when accessed (and then kept), their voltages
+    are views on the voltages array. That way opening a dataset does not
+    depend on the nb of frames and the memory used scales with the frames
+    actually accessed.
+    """
+
+    _voltages: np.ndarray  # shape (n_frames, n_freq, n_exc, n_ch)
+    _build_frame: Callable[[int], MeasurementFrame]
+    _frames: dict[int, MeasurementFrame]
+
+    def __init__(
+        self, voltages: np.ndarray, build_frame: Callable[[int], MeasurementFrame]
+    ) -> None:
+        """
+        Args:
+            voltages (np.ndarray): voltages of all frames with shape
+            (n_frames, n_freq, n_exc, n_ch)
+            build_frame (Callable[[int], MeasurementFrame]): function returning
+            an empty measurement frame for a frame index
+        """
+        self._voltages = voltages
+        self._build_frame = build_frame
+        self._frames = {}
+
+    def __len__(self) -> int:
+        return len(self._voltages)
+
+    def __getitem__(self, idx: int) -> MeasurementFrame:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        idx = self._check_idx(idx)
+        if (frame := self._frames.get(idx)) is None:
+            frame = self._build_frame(idx)
+            frame.set_all_voltages(self._voltages[idx])
+            self._frames[idx] = frame
+        return frame
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def get_voltages(self, idx_frame: int = 0, idx_freq: int = 0) -> np.ndarray:
+        """Return the measured voltages of a frame for the given frequency
+        index as a view on the voltages array (no frame is built)"""
+        return self._voltages[self._check_idx(idx_frame), idx_freq]
+
+    def _check_idx(self, idx: int) -> int:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Frame index {idx} out of range (0-{len(self)-1})")
+        return idx
+
+
 ## =============================================================================
 ##  Class for the DataSet obtained from the EIT Device
 ## =============================================================================
@@ -465,11 +491,13 @@ class MeasurementDataset(
     output_dir: str
     dev_setup: SciospecSetup
     frame_cnt: int
-    meas_frame: list[
-        MeasurementFrame
+    meas_frame: Union[
+        list[MeasurementFrame], LazyMeasurementFrames
     ]  # meas. frame list used during acquisition and loading
     _rx_meas_frame: MeasurementFrame  # meas. frame used during acquisition
     _ref_frame: MeasurementFrame  # meas. frame used tio save acztual TD ref frame
+    _dataset_writer: DatasetFileWriter  # writer of the frames during acquisition
+    _last_autosave_stats: float  # time of the last autosave stats update
     _autosave: CustomFlag
     _save_img: CustomFlag
     _load_after_meas: CustomFlag
@@ -495,6 +523,8 @@ class MeasurementDataset(
         self._rx_meas_frame = None
         self.meas_frame = []
         self._ref_frame = None
+        self._dataset_writer = None
+        self._last_autosave_stats = 0.0
 
         self._autosave = CustomFlag()
         self._autosave.set()
@@ -510,15 +540,21 @@ class MeasurementDataset(
 
     def init_4_start(self, data: DataInit4Start) -> None:
         """Initialization of the dataset for acquisition (called by a signal)
-        - set output dir
+        - set output dir (created if the dataset is autosaved or if the raw
+        rx frames are journaled, the device then starts the journal in it)
         """
         self.dev_setup = data.dev_setup
         self.time_stamps = get_datetime_s()
         folder = append_date_time(self.name, self.time_stamps)
         self.output_dir = None
-        if self._autosave.is_set():
+        self._close_dataset_file()
+        if self._autosave.is_set() or data.raw_journal:
             self.output_dir = mk_new_dir(folder, APP_DIRS.get(AppStdDir.meas_set))
             self.dev_setup.save(self.output_dir)
+        if self._autosave.is_set():
+            self._create_dataset_file()
+        if data.raw_journal:
+            self.to_device.emit(DataStartRawJournal(self.output_dir, self.time_stamps))
 
         self.frame_cnt = 0
         self.meas_frame = [None]
@@ -540,7 +576,9 @@ class MeasurementDataset(
         self.emit_meas_frame(data.idx)
 
     def load_last_dataset(self, data: DataLoadLastDataset):
-
+        """Close the dataset file after acquisition and load it
+        (called by a signal)"""
+        self._close_dataset_file()
         if self._load_after_meas.is_set():
             self.load_auto(self.output_dir)
 
@@ -588,8 +626,12 @@ class MeasurementDataset(
         - output_dir=self.output_dir,
         - time_stamp=self.time_stamps,
         """
+        return self._build_frame(self.frame_cnt)
+
+    def _build_frame(self, index: int) -> MeasurementFrame:
+        """Return a new measurement frame #index out of the actual set"""
         return MeasurementFrame(
-            index=self.frame_cnt,
+            index=index,
             dataset_name=self.name,
             dev_setup=self.dev_setup,
             output_dir=self.output_dir,
@@ -639,9 +681,32 @@ class MeasurementDataset(
         self.to_device.emit(DataCheckBurst(self.get_frame_cnt()))
         self.to_computation.emit(Data2Compute(vref, vmeas))
         self.to_capture.emit(
-            DataSaveLoadImage(self.get_meas_path(self.extract_idx.meas_idx))
+            DataSaveLoadImage(
+                self.get_meas_path(self.extract_idx.meas_idx),
+                self.get_meas_idx(self.extract_idx.meas_idx),
+            )
         )
 
+    def get_data2compute_batch(self, frames: range = None) -> list[Data2Compute]:
+        """Return the data for computation of a range of frames using the
+        actual indexes for computation (imaging, ref frame, frequencies)
+
+        Args:
+            frames (range, optional): frames indexes. Defaults to None (all
+            frames).
+
+        Returns:
+            list[Data2Compute]: data for computation of each frame
+        """
+        if frames is None:
+            frames = range(self.get_frame_cnt())
+        data = []
+        for idx in frames:
+            self.extract_idx.set_ref_idx(idx)
+            self.extract_idx.set_meas_idx(idx)
+            data.append(Data2Compute(self._get_vref(), self._get_vmeas()))
+        return data
+
     def emit_progression(self) -> None:
         """Send signal to update Frame aquisition progress bar"""
         logger.debug(
@@ -683,16 +748,47 @@ class MeasurementDataset(
     ##  Save load
     ## =========================================================================
 
+    def _create_dataset_file(self) -> None:
+        """Create the dataset file in the output dir, the frames will be
+        appended to it during acquisition by a write-behind writer"""
+        freq_list = self.dev_setup.get_freqs_list()
+        excitation = self.dev_setup.get_exc_pattern()
+        dataset_file = MeasurementDatasetFile.create(
+            self.output_dir,
+            frame_shape=(len(freq_list), len(excitation), self.dev_setup.get_channel()),
+            name=self.name,
+            time_stamps=self.time_stamps,
+            setup=dict_nested(self.dev_setup, ignore_private=True),
+            freq_list=freq_list,
+            excitation=excitation,
+        )
+        self._dataset_writer = DatasetFileWriter(dataset_file)
+
+    def _close_dataset_file(self) -> None:
+        """Write the frames still queued and close the dataset file used
+        during acquisition"""
+        if self._dataset_writer is not None:
+            self._emit_autosave_stats(self._dataset_writer.stop())
+            self._dataset_writer = None
+
     @catch_error
     def _save_meas_frame(self, idx: int = 0, path: str = None) -> None:
-        """Save the meas_frame #idx as
+        """Save the meas_frame #idx, the frame is queued for writing in the
+        dataset file (never blocks). If a path is given the frame is saved
+        as a JSON-file (legacy)
 
         Args:
             idx (int, optional): index of the frame to save. Defaults to 0.
+            path (str, optional): path of the JSON-file. Defaults to None.
         """
         if not self._autosave.is_set():
             return
-        self.meas_frame[idx].save(path)
+        if path is not None or self._dataset_writer is None:
+            self.meas_frame[idx].save(path)
+            return
+        self._dataset_writer.put(self.meas_frame[idx].get_all_voltages())
+        if monotonic() - self._last_autosave_stats >= AUTOSAVE_STATS_PERIOD:
+            self._emit_autosave_stats(self.get_autosave_stats())
 
     def _load_frame(self, path: str) -> Union[MeasurementFrame, bool]:
         """Load measurement frame
@@ -715,8 +811,18 @@ class MeasurementDataset(
         self.load_auto()
 
     def load_auto(self, dir_path: str = None) -> None:
-        """Load measurement files contained in measurement dataset directory"""
-        if not self._load_json(dir_path):
+        """Load measurement files contained in measurement dataset directory
+
+        The dataset file is loaded if present, otherwise the frames
+        JSON-files (legacy format)
+        """
+        if (dir_path := self._get_meas_dir(dir_path)) is None:
+            return
+        if is_dataset_file_in(dir_path):
+            loaded = self._load_dataset_file(dir_path)
+        else:
+            loaded = self._load_json(dir_path)
+        if not loaded:
             return
         # Update GUI
         self.to_gui.emit(EvtDataMeasDatasetLoaded(self.output_dir, self.frame_cnt))
@@ -725,6 +831,49 @@ class MeasurementDataset(
         # Start replay of the measurements
         self.to_replay.emit(DataReplayStart(self.frame_cnt))
 
+    @catch_error
+    def _load_dataset_file(self, dir_path: str) -> bool:
+        """Load the dataset file contained in measurement dataset directory
+
+        The voltages are memory-mapped and the frames are built only when
+        accessed (see LazyMeasurementFrames)
+
+        Args:
+            dir_path (str): measurement dataset directory
+
+        Returns:
+            bool: sucess of loading
+        """
+        try:
+            dataset_file = MeasurementDatasetFile.open(dir_path)
+        except DatasetFileError as e:
+            logger.warning(f"DatasetFileError: ({e})")
+            glob_utils.dialog.Qt_dialogs.warningMsgBox("DatasetFileError", f"{e}")
+            return False
+
+        volt = dataset_file.memmap_voltages()
+        if not len(volt):
+            logger.warning(f"No Frames in dataset file: {dataset_file.path}!")
+            glob_utils.dialog.Qt_dialogs.warningMsgBox(
+                "Files Not Found", f"No Frames in dataset file: {dataset_file.path}!"
+            )
+            return False
+
+        # the setup is contained in the header of the dataset file
+        self.dev_setup = SciospecSetup(32)
+        self.dev_setup.set_from_dict(**dataset_file.get("setup"))
+        self.time_stamps = dataset_file.get("time_stamps", "")
+        self.name = dataset_file.get("name", "")
+        self.output_dir = dir_path
+
+        self.meas_frame = LazyMeasurementFrames(volt, self._build_frame)
+        self.frame_cnt = len(self.meas_frame)
+
+        self._rx_meas_frame = None  # not used with loaded dataset
+        self._ref_frame = self.meas_frame[0]  # reset for loaded dataset
+
+        return True
+
     @catch_error
     def _load_json(self, dir_path: str = None) -> bool:
         """Load a measurement files contained in measurement dataset directory
@@ -818,7 +967,10 @@ class MeasurementDataset(
         return self._rx_meas_frame.filling
 
     def get_meas_voltage(self, idx_frame: int = 0, idx_freq: int = 0) -> np.ndarray:
-        """Return the measured voltage for the given frequency index"""
+        """Return the measured voltage for the given frequency index
+        (for a loaded dataset file, a view on the memory-mapped voltages)"""
+        if isinstance(self.meas_frame, LazyMeasurementFrames):
+            return self.meas_frame.get_voltages(idx_frame, idx_freq)
         return self.meas_frame[idx_frame].get_voltages(idx_freq)
 
     def get_meas_labels(self, idx_frame: int = 0, idx_freq: int = 0) -> list[str]:
@@ -878,6 +1030,25 @@ class MeasurementDataset(
     def get_frame_cnt(self) -> int:
         return self.frame_cnt
 
+    def get_autosave_stats(self) -> Union[WriterStats, None]:
+        """Return the counters (queue depth, write latency, ...) of the
+        dataset writer, `None` if no dataset file is actually written"""
+        if self._dataset_writer is None:
+            return None
+        return self._dataset_writer.stats
+
+    def _emit_autosave_stats(self, stats: WriterStats) -> None:
+        """Send the counters of the dataset writer to the gui"""
+        self._last_autosave_stats = monotonic()
+        self.to_gui.emit(
+            EvtDataAutosaveStats(
+                stats.written,
+                stats.queue_depth,
+                stats.overflow_depth,
+                stats.overflow_depth_max,
+                stats.latency_max,
+            )
+        )
 
     def get_dataset_info(self) -> list[str]:
         """Return info of the dataset
@@ -929,18 +1100,35 @@ class MeasurementDataset(
         self._update_gui_autosave()
 
 
-def convert_meas_data(meas_data):
-    """return float voltages values () corresponding to meas data
-    (bytes single float)
+def decode_meas_stream(rx_meas_stream: Union[bytes, memoryview, list[bytes]]) -> np.void:
+    """Decode a measurement stream frame using MEAS_STREAM_DTYPE
+
+    Args:
+        rx_meas_stream (Union[bytes, memoryview, list[bytes]]): complete
+        measurement frame, a list of int8 is first converted to bytes
+
+    Raises:
+        ValueError: if the frame length is not the one of a measurement stream
+
+    Returns:
+        np.void: decoded record (fields are views on the frame buffer)
+    """
+    if isinstance(rx_meas_stream, list):
+        rx_meas_stream = bytes(rx_meas_stream)
+    if len(rx_meas_stream) != MEAS_STREAM_DTYPE.itemsize:
+        raise ValueError(
+            f"Wrong length of meas stream: {len(rx_meas_stream)}, expected {MEAS_STREAM_DTYPE.itemsize}"
+        )
+    return np.frombuffer(rx_meas_stream, dtype=MEAS_STREAM_DTYPE, count=1)[0]
+
+
+def convert_meas_data(meas_data: Union[bytes, list[bytes]]) -> np.ndarray:
+    """return complex voltages values corresponding to meas data
+    (pairs of real/imag as bytes single float)
     """
-    n_bytes_real_imag = 4  # we got 4Bytes per value
-    # reshape the meas data in block of 4 bytes
-    meas_data = np.reshape(np.array(meas_data), (-1, n_bytes_real_imag))
-    meas_data = meas_data.tolist()  # back to list for conversion
-    meas_f = [convert4Bytes2Float(m) for m in meas_data]  # conversion of each 4 bytes
-    # get a matrix with real and imag values in each column
-    meas_r_i = np.reshape(np.array(meas_f), (-1, 2))
-    return meas_r_i[:, 0] + 1j * meas_r_i[:, 1]
+    if isinstance(meas_data, list):
+        meas_data = bytes(meas_data)
+    return np.frombuffer(meas_data, dtype=">c8").astype(complex)
 
 
 if __name__ == "__main__":
@@ -7,9 +7,11 @@ from eit_app.sciospec.measurement import DataEmitFrame4Computation
 from eit_app.video.capture import SetStatusWReplayStatus
 from eit_app.com_channels import (
     AddToCaptureSignal,
+    AddToComputationSignal,
     AddToDatasetSignal,
     AddToGuiSignal,
     DataReplayStart,
+    SetComputeReplay,
     SignalReciever,
 )
 from eit_app.update_gui import (
@@ -62,7 +64,12 @@ class RepeatTimer(Timer):
 
 
 class ReplayMeasurementsAgent(
-    SignalReciever, AddStatus, AddToGuiSignal, AddToDatasetSignal, AddToCaptureSignal
+    SignalReciever,
+    AddStatus,
+    AddToGuiSignal,
+    AddToDatasetSignal,
+    AddToCaptureSignal,
+    AddToComputationSignal,
 ):
     """This Class is responsible of the replay of measurements"""
 
@@ -120,6 +127,10 @@ class ReplayMeasurementsAgent(
         self.activate_deactivate_timer()
         self.to_gui.emit(EvtDataReplayStatusChanged(status))
         self.to_capture.emit(SetStatusWReplayStatus(self.is_playing, self.is_idle))
+        if ReplayStatus.PLAYING in (status, was_status):
+            # during auto replay all frames are computed, the replay waits
+            # for the computation if needed
+            self.to_computation.emit(SetComputeReplay(self.is_playing))
         logger.debug(f"ReplayMeasurements Status set to : {status.value}")
 
     @property
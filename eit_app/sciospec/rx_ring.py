@@ -0,0 +1,317 @@
+""" Bounded single-producer/single-consumer queue of rx frames
+
+The frames recieved by the interface listener (the single producer) are
+passed to the communicator processor (the single consumer) through a
+preallocated ring of slots. The producer only advances a write counter and
+the consumer only a read counter, so that no lock is needed to put or get
+frames. The consumer is woken up by an event and drains the frames in
+batches.
+
+When the ring is full the configurable overflow policy applies:
+- DROP_OLDEST: the oldest frame is overwritten (the consumer counts the
+overwritten frames)
+- DROP_NEWEST: the new frame is dropped
+- SPILL: the new frames are appended to a raw frame journal on disk (see
+eit_app.sciospec.wire_journal) until the consumer has read them back, the
+order of the frames is kept and no frame is lost. Each spill episode uses a
+new journal file, which the consumer removes once the episode ended and all
+its frames have been read back.
+
+A put never raises nor blocks, all overflows are counted and the
+high-water marks of the ring and of the spill are recorded.
+
+example of Use is
+
+    ring = RxFrameRing(policy=RxOverflowPolicy.SPILL)
+    ring.put(rx_frame) # in the listener thread
+    for rx_frame in ring.get_batch(timeout=0.1): # in the processor thread
+        ...
+    print(ring.stats)
+    ring.close() # once producer and consumer are stopped
+"""
+
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from enum import Enum
+from threading import Event
+from time import monotonic
+from typing import BinaryIO, Union
+
+from eit_app.sciospec.wire_journal import RawFrameJournal, read_header, read_record
+
+logger = logging.getLogger(__name__)
+
+RX_RING_SIZE = 2048  # in frames
+RX_BATCH_SIZE = 256  # max nb of frames got at once
+OVERFLOW_LOG_PERIOD = 1.0  # in s, min time between two overflow logs
+
+
+class RxOverflowPolicy(Enum):
+    DROP_OLDEST = "Drop oldest"
+    DROP_NEWEST = "Drop newest"
+    SPILL = "Spill to disk"
+
+
+@dataclass
+class RxRingStats:
+    """Counters of a RxFrameRing"""
+
+    put: int = 0  # nb of frames put
+    got: int = 0  # nb of frames got by the consumer
+    overflows: int = 0  # nb of frames put while the ring was full (or spilling)
+    dropped: int = 0  # nb of frames lost (dropped or overwritten)
+    spilled: int = 0  # nb of frames spilled on disk
+    high_water: int = 0  # max nb of frames waiting in the ring
+    spill_high_water: int = 0  # max nb of spilled frames waiting
+
+
+class RxFrameRing(object):
+    """Bounded SPSC queue of rx frames (see module description)
+
+    `put` should only be called from one thread (producer), `get_batch`
+    from another one (consumer).
+    """
+
+    size: int
+    policy: RxOverflowPolicy
+    spill_path: str
+
+    def __init__(
+        self,
+        size: int = RX_RING_SIZE,
+        policy: RxOverflowPolicy = RxOverflowPolicy.SPILL,
+        spill_path: str = None,
+    ) -> None:
+        """
+        Args:
+            size (int, optional): nb of slots. Defaults to RX_RING_SIZE.
+            policy (RxOverflowPolicy, optional): overflow policy. Defaults to
+            RxOverflowPolicy.SPILL.
+            spill_path (str, optional): base path of the journal files of
+            the spilled frames (suffixed with the nb of the spill episode).
+            Defaults to None (files in the temp directory).
+        """
+        self.size = size
+        self.policy = policy
+        self.spill_path = spill_path or os.path.join(
+            tempfile.gettempdir(), f"eit_app_rx_spill_{os.getpid()}_{id(self)}.sjrnl"
+        )
+        self._slots = [None] * size
+        self._data = Event()  # set by the producer after each put
+        # written by the producer only
+        self._n_put = 0
+        self._write_cnt = 0
+        self._n_overflows = 0
+        self._n_dropped_newest = 0
+        self._high_water = 0
+        self._spilling = False
+        self._spill: Union[RawFrameJournal, None] = None
+        self._spill_gen = 0  # nb of the actual/last spill episode
+        self._spill_closed_gen = 0  # nb of the last ended spill episode
+        self._spill_write_cnt = 0
+        self._spill_high_water = 0
+        self._last_overflow_log = -OVERFLOW_LOG_PERIOD
+        # written by the consumer only
+        self._read_cnt = 0
+        self._n_overwritten = 0
+        self._spill_reader: Union[BinaryIO, None] = None
+        self._spill_reader_gen = 0
+        self._spill_read_cnt = 0
+
+    def __len__(self) -> int:
+        """Nb of frames waiting (ring and spill)"""
+        waiting = min(self._write_cnt - self._read_cnt, self.size)
+        return waiting + self._spill_write_cnt - self._spill_read_cnt
+
+    def set_policy(self, policy: RxOverflowPolicy) -> None:
+        """Set the overflow policy (already spilled frames are still read
+        back)"""
+        self.policy = policy
+
+    @property
+    def stats(self) -> RxRingStats:
+        """Return the actual counters of the ring"""
+        return RxRingStats(
+            put=self._n_put,
+            got=self._read_cnt - self._n_overwritten + self._spill_read_cnt,
+            overflows=self._n_overflows,
+            dropped=self._n_dropped_newest + self._n_overwritten,
+            spilled=self._spill_write_cnt,
+            high_water=self._high_water,
+            spill_high_water=self._spill_high_water,
+        )
+
+    ## =========================================================================
+    ##  Producer
+    ## =========================================================================
+
+    def put(self, rx_frame: list[int]) -> bool:
+        """Put a frame (never blocks nor raises)
+
+        Returns:
+            bool: `False` if a frame has been lost (new one or oldest one)
+        """
+        self._n_put += 1
+        if self._spilling and self._spill_read_cnt == self._spill_write_cnt:
+            self._end_spill()  # all spilled frames read back
+        if self._spilling:  # the order is kept, the ring waits for the spill
+            self._n_overflows += 1
+            self._spill_frame(rx_frame)
+            return True
+
+        waiting = self._write_cnt - self._read_cnt
+        lost = False
+        if waiting >= self.size:
+            self._n_overflows += 1
+            self._log_overflow()
+            if self.policy == RxOverflowPolicy.DROP_NEWEST:
+                self._n_dropped_newest += 1
+                return False
+            if self.policy == RxOverflowPolicy.SPILL:
+                self._start_spill()
+                self._spill_frame(rx_frame)
+                return True
+            lost = True  # DROP_OLDEST: the consumer counts the overwritten
+        else:
+            self._high_water = max(self._high_water, waiting + 1)
+
+        self._slots[self._write_cnt % self.size] = rx_frame
+        self._write_cnt += 1
+        self._data.set()
+        return not lost
+
+    def _start_spill(self) -> None:
+        """Start a spill episode in a new journal file"""
+        self._spill_gen += 1
+        self._spill = RawFrameJournal(self._spill_file(self._spill_gen), spill=True)
+        self._spilling = True
+
+    def _end_spill(self) -> None:
+        """End the actual spill episode, its journal file is removed by the
+        consumer"""
+        self._spilling = False
+        self._spill.close()
+        self._spill = None
+        self._spill_closed_gen = self._spill_gen
+
+    def _spill_file(self, gen: int) -> str:
+        """Return the journal file of the spill episode #gen"""
+        root, ext = os.path.splitext(self.spill_path)
+        return f"{root}_{gen}{ext}"
+
+    def _spill_frame(self, rx_frame: list[int]) -> None:
+        """Append a frame to the spill journal"""
+        self._spill.append([rx_frame])
+        self._spill_write_cnt += 1
+        pending = self._spill_write_cnt - self._spill_read_cnt
+        self._spill_high_water = max(self._spill_high_water, pending)
+        self._data.set()
+
+    def _log_overflow(self) -> None:
+        """Log the overflows (at most every OVERFLOW_LOG_PERIOD)"""
+        if monotonic() - self._last_overflow_log < OVERFLOW_LOG_PERIOD:
+            return
+        self._last_overflow_log = monotonic()
+        logger.error(
+            f"RX ring full ({self.size} frames), policy: {self.policy.value} - {self.stats}"
+        )
+
+    ## =========================================================================
+    ##  Consumer
+    ## =========================================================================
+
+    def get_batch(
+        self, max_n: int = RX_BATCH_SIZE, timeout: float = None
+    ) -> list[list[int]]:
+        """Get the oldest waiting frames, first those of the ring then the
+        spilled ones
+
+        Args:
+            max_n (int, optional): max nb of frames. Defaults to
+            RX_BATCH_SIZE.
+            timeout (float, optional): max time in s to wait for a frame if
+            none is waiting. Defaults to None (no waiting).
+
+        Returns:
+            list[list[int]]: frames in order of reception (can be empty)
+        """
+        batch = self._get_from_ring(max_n)
+        if not batch:
+            batch = self._get_from_spill(max_n)
+        if batch or timeout is None:
+            return batch
+        self._data.clear()
+        if not len(self):  # a put can have happened before the clear
+            self._data.wait(timeout)
+        batch = self._get_from_ring(max_n)
+        return batch or self._get_from_spill(max_n)
+
+    def _get_from_ring(self, max_n: int) -> list[list[int]]:
+        write_cnt = self._write_cnt
+        start = max(self._read_cnt, write_cnt - self.size)
+        self._n_overwritten += start - self._read_cnt
+        n = min(write_cnt - start, max_n)
+        batch = [self._slots[(start + i) % self.size] for i in range(n)]
+        # slots overwritten by the producer during the copy are discarded (a
+        # slot is written before the write counter is incremented, so the
+        # slot of the next write may already be overwritten)
+        if self.policy == RxOverflowPolicy.DROP_OLDEST and (
+            overwritten := min(self._write_cnt - self.size - start + 1, n)
+        ) > 0:
+            batch = batch[overwritten:]
+            self._n_overwritten += overwritten
+        self._read_cnt = start + n
+        return batch
+
+    def _get_from_spill(self, max_n: int) -> list[list[int]]:
+        self._release_spill()
+        n = min(self._spill_write_cnt - self._spill_read_cnt, max_n)
+        if n <= 0:
+            return []
+        if self._spill_reader is None:
+            # the frames not read back belong to the actual spill episode
+            self._spill_reader_gen = self._spill_gen
+            self._spill_reader = open(self._spill_file(self._spill_reader_gen), "rb")
+            read_header(self._spill_reader)
+        batch = []
+        for _ in range(n):
+            if (record := read_record(self._spill_reader)) is None:
+                break
+            batch.append(record[1])
+        self._spill_read_cnt += len(batch)
+        return batch
+
+    def _release_spill(self) -> None:
+        """Close and remove the journal file read back if its spill episode
+        ended (all its frames have then been read)"""
+        if self._spill_reader is None or self._spill_reader_gen > self._spill_closed_gen:
+            return
+        self._spill_reader.close()
+        self._spill_reader = None
+        os.remove(self._spill_file(self._spill_reader_gen))
+
+    def close(self) -> None:
+        """Close and remove the spill journals still open, the frames not
+        read back are lost. Should only be called when the producer and the
+        consumer are stopped, the ring should not be used afterwards"""
+        if (lost := self._spill_write_cnt - self._spill_read_cnt) > 0:
+            logger.warning(f"RX ring closed, {lost} spilled frames not read back")
+        paths = set()
+        if self._spill_reader is not None:
+            self._spill_reader.close()
+            self._spill_reader = None
+            paths.add(self._spill_file(self._spill_reader_gen))
+        if self._spill is not None:
+            self._spilling = False
+            self._spill.close()
+            self._spill = None
+            self._spill_closed_gen = self._spill_gen
+            paths.add(self._spill_file(self._spill_gen))
+        for path in paths:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    """"""
@@ -0,0 +1,149 @@
+""" Cache of the setups confirmed by the Sciospec devices
+
+A setup is compared on its "wire image": the data bytes sent to the device
+for each set command/option (see SciospecSetup.get_data). The image of the
+last setup confirmed by a device is cached per serial number, so that only
+the commands which differ from the confirmed setup have to be sent to the
+device. A device can have been reset or power cycled while disconnected, so
+its cached setup should be invalidated on each connection.
+
+The excitation patterns can only be appended to the measurement setup of
+the device, so a change of the patterns needs a reset of the measurement
+setup and a full transfer of it.
+
+example of Use is
+
+    cache = DeviceSetupCache()
+    cache.invalidate(sn) # on connection
+    desired = setup_wire_image(setup)
+    for cmd, op in setup_delta(desired, cache.get(sn)):
+        ... # send cmd/op (all patterns for OP_EXC_PATTERN)
+    cache.put(sn, desired)
+"""
+
+import logging
+from typing import Union
+
+from eit_app.sciospec.constants import (
+    CMD_SET_ETHERNET_CONFIG,
+    CMD_SET_MEAS_SETUP,
+    CMD_SET_OUTPUT_CONFIG,
+    OP_BURST_COUNT,
+    OP_CURRENT_STAMP,
+    OP_DHCP,
+    OP_EXC_AMPLITUDE,
+    OP_EXC_FREQUENCIES,
+    OP_EXC_PATTERN,
+    OP_EXC_STAMP,
+    OP_FRAME_RATE,
+    OP_RESET_SETUP,
+    OP_TIME_STAMP,
+    SciospecCmd,
+    SciospecOption,
+)
+from eit_app.sciospec.setup import SciospecSetup
+
+logger = logging.getLogger(__name__)
+
+# set commands/options of the setup (in sending order), without the patterns
+OUTPUT_CMDS = [
+    (CMD_SET_OUTPUT_CONFIG, OP_EXC_STAMP),
+    (CMD_SET_OUTPUT_CONFIG, OP_CURRENT_STAMP),
+    (CMD_SET_OUTPUT_CONFIG, OP_TIME_STAMP),
+    (CMD_SET_ETHERNET_CONFIG, OP_DHCP),
+]
+MEAS_SETUP_CMDS = [
+    (CMD_SET_MEAS_SETUP, OP_EXC_AMPLITUDE),
+    (CMD_SET_MEAS_SETUP, OP_BURST_COUNT),
+    (CMD_SET_MEAS_SETUP, OP_FRAME_RATE),
+    (CMD_SET_MEAS_SETUP, OP_EXC_FREQUENCIES),
+]
+EXC_PATTERN_KEY = "exc_pattern"
+
+
+def cmd_key(cmd: SciospecCmd, op: SciospecOption) -> str:
+    return f"{cmd.tag}/{op.tag}"
+
+
+def setup_wire_image(setup: SciospecSetup) -> dict[str, list]:
+    """Return the data bytes sent to the device for each set command/option
+    of the setup
+
+    Returns:
+        dict[str, list]: {"cmd_tag/op_tag": data} and {EXC_PATTERN_KEY: list
+        of the data of each excitation pattern}
+    """
+    image = {
+        cmd_key(cmd, op): [int(b) for b in setup.get_data(cmd, op)]
+        for cmd, op in OUTPUT_CMDS + MEAS_SETUP_CMDS
+    }
+    idx = setup.exc_pattern_idx
+    patterns = []
+    for i in range(len(setup.get_exc_pattern())):
+        setup.set_exc_pattern_idx(i)
+        patterns.append([int(b) for b in setup.get_data(CMD_SET_MEAS_SETUP, OP_EXC_PATTERN)])
+    setup.set_exc_pattern_idx(idx)
+    image[EXC_PATTERN_KEY] = patterns
+    return image
+
+
+def setup_delta(
+    desired: dict[str, list], confirmed: Union[dict[str, list], None]
+) -> list[tuple[SciospecCmd, SciospecOption]]:
+    """Return the commands/options to send to the device to pass from the
+    confirmed setup to the desired one
+
+    Args:
+        desired (dict[str, list]): wire image of the desired setup
+        confirmed (Union[dict[str, list], None]): wire image of the setup
+        confirmed by the device, `None` if unknown (full transfer)
+
+    Returns:
+        list[tuple[SciospecCmd, SciospecOption]]: commands/options in sending
+        order, (CMD_SET_MEAS_SETUP, OP_EXC_PATTERN) stands for all patterns
+    """
+    confirmed = confirmed or {}
+    delta = [
+        (cmd, op)
+        for cmd, op in OUTPUT_CMDS
+        if desired[cmd_key(cmd, op)] != confirmed.get(cmd_key(cmd, op))
+    ]
+    if desired[EXC_PATTERN_KEY] != confirmed.get(EXC_PATTERN_KEY):
+        delta.append((CMD_SET_MEAS_SETUP, OP_RESET_SETUP))
+        delta.extend(MEAS_SETUP_CMDS)
+        delta.append((CMD_SET_MEAS_SETUP, OP_EXC_PATTERN))
+    else:
+        delta.extend(
+            (cmd, op)
+            for cmd, op in MEAS_SETUP_CMDS
+            if desired[cmd_key(cmd, op)] != confirmed.get(cmd_key(cmd, op))
+        )
+    return delta
+
+
+class DeviceSetupCache(object):
+    """Wire images of the setups confirmed by the devices per serial number
+    (only valid while the device stays connected)"""
+
+    _setups: dict[str, dict[str, list]]
+
+    def __init__(self) -> None:
+        self._setups = {}
+
+    def get(self, sn: str) -> Union[dict[str, list], None]:
+        """Return the wire image of the setup confirmed by the device (`None`
+        if unknown)"""
+        return self._setups.get(sn)
+
+    def put(self, sn: str, image: dict[str, list]) -> None:
+        """Set the wire image of the setup confirmed by the device"""
+        self._setups[sn] = image
+
+    def invalidate(self, sn: str) -> None:
+        """Forget the setup of the device (e.g. on connection, after a reset
+        of the device or a failed transfer)"""
+        self._setups.pop(sn, None)
+
+
+if __name__ == "__main__":
+    """"""
@@ -0,0 +1,374 @@
+""" Simulated Sciospec device
+
+The class SimulatedSciospecInterface can be used instead of the
+SciospecSerialInterface, it answers the commands send to it like a Sciospec
+EIT device (ACK frames and setup responses) and once a start-measurement
+command is recieved it streams measurement frames (CMD_START_STOP_MEAS) at a
+configurable rate.
+
+It allows to test/load-test the acquisition > dataset > computation path
+without a physical device:
+
+    dev = SciospecEITDevice(32, interface=SimulatedSciospecInterface())
+
+"""
+
+import logging
+from queue import Empty, Queue
+from time import monotonic
+from typing import Callable, Union
+
+import numpy as np
+from eit_app.sciospec.constants import (
+    ACK_CMD_EXCECUTED,
+    CMD_BYTE_INDX,
+    CMD_GET_DEVICE_INFOS,
+    CMD_GET_ETHERNET_CONFIG,
+    CMD_GET_MEAS_SETUP,
+    CMD_GET_OUTPUT_CONFIG,
+    CMD_SAVE_SETTINGS,
+    CMD_SET_ETHERNET_CONFIG,
+    CMD_SET_MEAS_SETUP,
+    CMD_SET_OUTPUT_CONFIG,
+    CMD_SOFT_RESET,
+    CMD_START_STOP_MEAS,
+    DATA_START_INDX,
+    LENGTH_BYTE_INDX,
+    NACK_CMD_NOT_REGONIZED,
+    OP_BURST_COUNT,
+    OP_CURRENT_STAMP,
+    OP_DHCP,
+    OP_EXC_AMPLITUDE,
+    OP_EXC_FREQUENCIES,
+    OP_EXC_PATTERN,
+    OP_EXC_STAMP,
+    OP_FRAME_RATE,
+    OP_IP_ADRESS,
+    OP_MAC_ADRESS,
+    OP_RESET_SETUP,
+    OP_START_MEAS,
+    OP_TIME_STAMP,
+    OPTION_BYTE_INDX,
+    SciospecAck,
+)
+from eit_app.sciospec.interface import SER_TIMEOUT, SUCCESS, Interface
+from eit_app.sciospec.utils import (
+    convert4Bytes2Float,
+    convertBytes2Int,
+    convertFloat2Bytes,
+    convertInt2Bytes,
+)
+
+logger = logging.getLogger(__name__)
+
+SIMULATED_PORT = "SIMULATED"
+N_CH_PER_STREAM = 16  # nb of channel voltages per measurement stream
+SIMULATED_SN = [0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07]
+SIMULATED_IP = [192, 168, 1, 99]
+SIMULATED_MAC = [0x00, 0x11, 0x22, 0x33, 0x44, 0x55]
+
+# commands "get" answered with the data set with the corresponding "set"
+GET_2_SET_TAG = {
+    CMD_GET_MEAS_SETUP.tag: CMD_SET_MEAS_SETUP.tag,
+    CMD_GET_OUTPUT_CONFIG.tag: CMD_SET_OUTPUT_CONFIG.tag,
+    CMD_GET_ETHERNET_CONFIG.tag: CMD_SET_ETHERNET_CONFIG.tag,
+}
+
+
+def build_frame(cmd_tag: int, data: list[int]) -> list[int]:
+    """Return a Sciospec frame [CMD, LL, data (LL bytes), CMD]"""
+    return [cmd_tag, len(data), *data, cmd_tag]
+
+
+def build_ack_frame(ack: SciospecAck) -> list[int]:
+    """Return the acknowledgment frame of ack"""
+    return [0x18, 0x01, ack.ack_byte, 0x18]
+
+
+def default_voltages(
+    frame_idx: int, freq_idx: int, exc: list[int], n_channel: int
+) -> np.ndarray:
+    """Synthesize the channel voltages for one excitation
+
+    A simple potential decreasing with the distance to the excitation
+    electrodes plus some noise
+
+    Returns:
+        np.ndarray: complex voltages of shape(n_channel,)
+    """
+    ch = np.arange(1, n_channel + 1)
+    d_in = np.minimum(np.abs(ch - exc[0]), n_channel - np.abs(ch - exc[0])) + 1
+    d_out = np.minimum(np.abs(ch - exc[1]), n_channel - np.abs(ch - exc[1])) + 1
+    volt = 0.1 / d_in - 0.1 / d_out
+    volt = volt * (1 + 0.1 * freq_idx)
+    noise = np.random.normal(0, 1e-4, (2, n_channel))
+    return (volt + noise[0]) + 1j * noise[1] * (1 + freq_idx)
+
+
+class SimulatedSciospecInterface(Interface):
+    """Software stand-in for a Sciospec EIT device
+
+    The setup send by the SET-commands is memorized and returned with the
+    GET-commands. The measurement frames are build according to the actual
+    excitation pattern, frequency sweep, frame rate and burst count.
+    """
+
+    def __init__(
+        self,
+        n_channel: int = 32,
+        frame_rate: float = None,
+        exc_pattern: list[list[int]] = None,
+        freq_steps: int = 1,
+        voltage_func: Callable[[int, int, list[int], int], np.ndarray] = None,
+    ) -> None:
+        """Constructor
+
+        Args:
+            n_channel (int, optional): nb of channel of the device (multiple
+            of 16). Defaults to 32.
+            frame_rate (float, optional): frame rate used for streaming in
+            fps, if `None` the frame rate set by command is used, set it to
+            `0` to stream as fast as possible. Defaults to None.
+            exc_pattern (list[list[int]], optional): excitation pattern used
+            as long as none is set by command. Defaults to adjacent pattern.
+            freq_steps (int, optional): nb of frequencies of the sweep used
+            as long as none is set by command. Defaults to 1.
+            voltage_func (Callable, optional): function returning the complex
+            channel voltages of shape(n_channel,) for
+            (frame_idx, freq_idx, exc, n_channel). Defaults to
+            default_voltages.
+        """
+        super().__init__(name_listener_thread="simulated listener")
+        if n_channel % N_CH_PER_STREAM:
+            raise ValueError(f"{n_channel=} should be a multiple of {N_CH_PER_STREAM}")
+        self.n_channel = n_channel
+        self.frame_rate = frame_rate
+        self.voltage_func = voltage_func or default_voltages
+        self.port = None
+        self.rx_frame = None
+
+        self._default_exc_pattern = exc_pattern or [
+            [i + 1, (i + 1) % n_channel + 1] for i in range(n_channel)
+        ]
+        self._default_freq_steps = freq_steps
+        self._tx_frames = Queue()  # frames to send to the host
+        self.reinit()
+
+    def reinit(self) -> None:
+        """Reinit the simulated device (setup and measuring state)"""
+        self._measuring = False
+        self._frame_idx = 0
+        self._next_frame_time = 0.0
+        self._t0 = monotonic()
+        self._setup_data = {
+            CMD_SET_MEAS_SETUP.tag: {
+                OP_BURST_COUNT.tag: convertInt2Bytes(0, 2),
+                OP_FRAME_RATE.tag: convertFloat2Bytes(1.0),
+                OP_EXC_FREQUENCIES.tag: [
+                    *convertFloat2Bytes(1000.0),
+                    *convertFloat2Bytes(1000.0),
+                    *convertInt2Bytes(self._default_freq_steps, 2),
+                    0x00,
+                ],
+                OP_EXC_AMPLITUDE.tag: convertFloat2Bytes(0.01),
+            },
+            CMD_SET_OUTPUT_CONFIG.tag: {
+                OP_EXC_STAMP.tag: [1],
+                OP_CURRENT_STAMP.tag: [1],
+                OP_TIME_STAMP.tag: [1],
+            },
+            CMD_SET_ETHERNET_CONFIG.tag: {
+                OP_IP_ADRESS.tag: list(SIMULATED_IP),
+                OP_MAC_ADRESS.tag: list(SIMULATED_MAC),
+                OP_DHCP.tag: [1],
+            },
+        }
+        self._exc_pattern = [list(e) for e in self._default_exc_pattern]
+        with self._tx_frames.mutex:
+            self._tx_frames.queue.clear()
+
+    ## =========================================================================
+    ##  Interface
+    ## =========================================================================
+
+    # @abstractmethod
+    def open(self, port: str = None, baudrate: int = None, **kwargs) -> bool:
+        """Open the simulated device, always successful"""
+        self.port = port or SIMULATED_PORT
+        self.is_connected.set(True)
+        logger.debug(f"Opening simulated port: {self.port} - {SUCCESS[True]}")
+        self.listener.start_processing()
+        return True
+
+    # @abstractmethod
+    def close(self) -> bool:
+        """Close the simulated device, the measurements are stopped"""
+        self.listener.stop_processing()
+        self._measuring = False
+        self.is_connected.set(False)
+        logger.debug(f"Closing simulated port: {self.port} - {SUCCESS[True]}")
+        return True
+
+    # @abstractmethod
+    def write(self, data: list[bytes]) -> bool:
+        """Treat a command frame as the device would do"""
+        if not self.is_connected.is_set():
+            return False
+        logger.debug(f"TX (simulated): {data}")
+        self._treat_cmd_frame(list(data))
+        return True
+
+    # @abstractmethod
+    def listen(self):
+        """Emit the pending answers and the measurement frames when due.
+        Blocks until an answer is pending or the next frame is due"""
+        timeout = SER_TIMEOUT
+        if self._measuring:
+            timeout = min(timeout, max(0.0, self._next_frame_time - monotonic()))
+        try:
+            self._emit(self._tx_frames.get(timeout=timeout))
+            while True:
+                self._emit(self._tx_frames.get_nowait())
+        except Empty:
+            pass
+        if self._measuring and monotonic() >= self._next_frame_time:
+            self._stream_meas_frame()
+
+    def get_ports_available(self) -> list[str]:
+        """Return the simulated port"""
+        return [SIMULATED_PORT]
+
+    def get_port_name(self) -> str:
+        return self.port or "None"
+
+    ## =========================================================================
+    ##  Commands treatment
+    ## =========================================================================
+
+    def _treat_cmd_frame(self, tx_frame: list[int]) -> None:
+        """Answer a command frame: response(s) and ACK/NACK"""
+        cmd_tag = tx_frame[CMD_BYTE_INDX]
+        op_tag = tx_frame[OPTION_BYTE_INDX] if tx_frame[LENGTH_BYTE_INDX] else None
+        data = tx_frame[DATA_START_INDX:-1]
+        ack = ACK_CMD_EXCECUTED
+
+        if cmd_tag == CMD_START_STOP_MEAS.tag:
+            self._set_measuring(op_tag == OP_START_MEAS.tag)
+        elif cmd_tag == CMD_SET_MEAS_SETUP.tag and op_tag == OP_RESET_SETUP.tag:
+            self._exc_pattern = []
+        elif cmd_tag == CMD_SET_MEAS_SETUP.tag and op_tag == OP_EXC_PATTERN.tag:
+            self._exc_pattern.append(list(data))
+        elif cmd_tag in self._setup_data:
+            self._setup_data[cmd_tag][op_tag] = list(data)
+        elif cmd_tag in GET_2_SET_TAG:
+            if (resp := self._get_resp_data(GET_2_SET_TAG[cmd_tag], op_tag)) is None:
+                ack = NACK_CMD_NOT_REGONIZED
+            else:
+                self._tx_frames.put(build_frame(cmd_tag, [op_tag, *resp]))
+        elif cmd_tag == CMD_GET_DEVICE_INFOS.tag:
+            self._tx_frames.put(build_frame(cmd_tag, list(SIMULATED_SN)))
+        elif cmd_tag == CMD_SOFT_RESET.tag:
+            self._set_measuring(False)
+            self.reinit()
+        elif cmd_tag != CMD_SAVE_SETTINGS.tag:
+            ack = NACK_CMD_NOT_REGONIZED
+        self._tx_frames.put(build_ack_frame(ack))
+
+    def _get_resp_data(self, set_tag: int, op_tag: int) -> Union[list[int], None]:
+        """Return the data memorized for the command/option"""
+        if set_tag == CMD_SET_MEAS_SETUP.tag and op_tag == OP_EXC_PATTERN.tag:
+            return [b for exc in self._exc_pattern for b in exc]
+        return self._setup_data[set_tag].get(op_tag)
+
+    def _set_measuring(self, start: bool) -> None:
+        """Start/stop the streaming of measurement frames"""
+        if start and not self._measuring:
+            self._frame_idx = 0
+            self._next_frame_time = monotonic() + self.frame_period
+        self._measuring = start
+        logger.debug(f"Simulated device measuring: {start}")
+
+    ## =========================================================================
+    ##  Measurements streaming
+    ## =========================================================================
+
+    @property
+    def frame_period(self) -> float:
+        """Time between two frames in s"""
+        fps = self.frame_rate
+        if fps is None:
+            fps = convert4Bytes2Float(
+                self._setup_data[CMD_SET_MEAS_SETUP.tag][OP_FRAME_RATE.tag]
+            )
+        return 1 / fps if fps > 0 else 0.0
+
+    @property
+    def freq_steps(self) -> int:
+        data = self._setup_data[CMD_SET_MEAS_SETUP.tag][OP_EXC_FREQUENCIES.tag]
+        return convertBytes2Int(data[8:10]) or 1
+
+    @property
+    def burst(self) -> int:
+        return convertBytes2Int(
+            self._setup_data[CMD_SET_MEAS_SETUP.tag][OP_BURST_COUNT.tag]
+        )
+
+    def _stream_meas_frame(self) -> None:
+        """Emit all measurement streams of one frame, ordered like the device
+        does: for each frequency, for each excitation, for each channel group
+        """
+        self._emit_rx_frames(self.build_meas_frame(self._frame_idx))
+        self._frame_idx += 1
+        self._next_frame_time += self.frame_period
+        if self.burst > 0 and self._frame_idx >= self.burst:
+            self._measuring = False
+
+    def build_meas_frame(self, frame_idx: int) -> list[list[int]]:
+        """Build all measurement streams of the frame #frame_idx
+
+        a stream data is [ch_group, exc (2 bytes), freq_idx (2 bytes),
+        time_stamp (4 bytes), 16 x (real, imag) as big endian float32]
+        """
+        time_stamp = convertInt2Bytes(int((monotonic() - self._t0) * 1000), 4)
+        n_groups = self.n_channel // N_CH_PER_STREAM
+        streams = []
+        for freq_idx in range(self.freq_steps):
+            freq_bytes = convertInt2Bytes(freq_idx, 2)
+            for exc in self._exc_pattern:
+                volt = self.voltage_func(frame_idx, freq_idx, exc, self.n_channel)
+                volt_bytes = np.empty((self.n_channel, 2), dtype=">f4")
+                volt_bytes[:, 0] = np.real(volt)
+                volt_bytes[:, 1] = np.imag(volt)
+                volt_bytes = volt_bytes.tobytes()
+                n_bytes = N_CH_PER_STREAM * 8
+                for group in range(n_groups):
+                    data = [group + 1, *exc, *freq_bytes, *time_stamp]
+                    data.extend(volt_bytes[group * n_bytes : (group + 1) * n_bytes])
+                    streams.append(build_frame(CMD_START_STOP_MEAS.tag, data))
+        return streams
+
+    def _emit(self, rx_frame: list[int]) -> None:
+        self._emit_rx_frames([rx_frame])
+
+
+if __name__ == "__main__":
+    from time import sleep
+
+    from glob_utils.log.log import main_log
+
+    main_log()
+
+    cnt = {"meas": 0}
+
+    def count(rx_frame, **kwargs):
+        if rx_frame[CMD_BYTE_INDX] == CMD_START_STOP_MEAS.tag:
+            cnt["meas"] += 1
+
+    s = SimulatedSciospecInterface(frame_rate=0)
+    s.new_rx_frame.connect(count)
+    s.open()
+    s.write([0xB4, 0x01, 0x01, 0xB4])
+    sleep(2)
+    s.write([0xB4, 0x01, 0x00, 0xB4])
+    print(f"{cnt['meas']} streams in 2s")
+    s.close()
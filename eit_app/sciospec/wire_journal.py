@@ -0,0 +1,237 @@
+""" Append-only journal of the raw frames recieved from a Sciospec device
+
+During a measurement each frame recieved on the interface can be appended,
+before any parsing, to a single binary journal file:
+
+    | MAGIC (8 bytes) | header length (uint32 LE) | header (JSON, utf-8) |
+    | record 0 | record 1 | ... | record n |
+
+with a record:
+
+    | time (uint64 LE, in ns) | frame length (uint16 LE) | frame bytes |
+
+The time of a record is the monotonic time of reception relative to the
+opening of the journal (the wall-clock time of the opening is saved in the
+header as "wall_t0"). The header regroups also the infos needed to rebuild
+the measurement dataset offline (device setup, frequency list, excitation
+pattern, nb of channels), see eit_app.journal_rebuild.
+
+Writing a record costs only a copy in the file buffer, the file is flushed
+once per batch of frames recieved. A journal interrupted during the writing
+of a record stays readable (the partial record is ignored).
+
+example of Use is
+
+    journal = RawFrameJournal(path, setup=..., freq_list=..., ...)
+    journal.append([rx_frame, ...]) # in the listener thread
+    journal.close()
+
+    reader = RawFrameJournalReader(path)
+    for t, rx_frame in reader:
+        ...
+"""
+
+import json
+import logging
+import struct
+import threading
+from time import monotonic_ns, time
+from typing import Any, BinaryIO, Iterator, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_EXT = ".sjrnl"
+MAGIC = b"SCIOJRN1"
+HEADER_VERSION = 1
+RECORD_HEADER = struct.Struct("<QH")  # time in ns, frame length
+
+
+class JournalError(Exception):
+    """"""
+
+
+def read_header(f: BinaryIO) -> dict:
+    """Read the header of a journal file opened in binary mode, the file is
+    then positioned on the first record
+
+    Raises:
+        JournalError: if the file is not a raw frame journal
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise JournalError(f"{f.name} is not a raw frame journal")
+    length = int.from_bytes(f.read(4), "little")
+    return json.loads(f.read(length).decode("utf-8"))
+
+
+def read_record(f: BinaryIO) -> Union[tuple[int, list[int]], None]:
+    """Read the next record of a journal file opened in binary mode
+
+    Returns:
+        Union[tuple[int, list[int]], None]: time in ns, frame or `None` if
+        no complete record is available (the file stays positioned on it)
+    """
+    pos = f.tell()
+    raw = f.read(RECORD_HEADER.size)
+    if len(raw) == RECORD_HEADER.size:
+        t, n = RECORD_HEADER.unpack(raw)
+        frame = f.read(n)
+        if len(frame) == n:
+            return t, list(frame)
+    f.seek(pos)
+    return None
+
+
+def _json_default(obj: Any) -> Any:
+    """Convert numpy objects for json serialization"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+
+
+class RawFrameJournal(object):
+    """Writer of a raw frame journal (see module description)
+
+    The frames can be appended from the listener thread while the journal is
+    closed from another thread, frames appended after closing are ignored.
+    """
+
+    path: str
+    n_frames: int
+    n_bytes: int
+    _file: Union[BinaryIO, None]
+    _t0: int
+    _lock: threading.Lock
+
+    def __init__(self, path: str, **infos) -> None:
+        """Create the journal file
+
+        Args:
+            path (str): journal file path
+            infos: infos to save in the header (e.g. setup, freq_list,
+            excitation, n_channel), should be json serializable (ndarrays
+            are accepted)
+        """
+        self.path = path
+        self.n_frames = 0
+        self.n_bytes = 0
+        self._lock = threading.Lock()
+        self._t0 = monotonic_ns()
+        header = {"version": HEADER_VERSION, "wall_t0": time(), **infos}
+        raw = json.dumps(header, default=_json_default).encode("utf-8")
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._file.write(len(raw).to_bytes(4, "little"))
+        self._file.write(raw)
+        self._file.flush()
+        logger.info(f"Raw frame journal {path} - STARTED")
+
+    @property
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def append(self, rx_frames: list[list[int]]) -> None:
+        """Append frames recieved at the same time and flush the journal
+
+        Args:
+            rx_frames (list[list[int]]): raw frames in order of reception
+        """
+        t = monotonic_ns() - self._t0
+        with self._lock:
+            if self._file is None:
+                return
+            for rx_frame in rx_frames:
+                frame = bytes(rx_frame)
+                self._file.write(RECORD_HEADER.pack(t, len(frame)))
+                self._file.write(frame)
+                self.n_bytes += RECORD_HEADER.size + len(frame)
+            self._file.flush()
+            self.n_frames += len(rx_frames)
+
+    def close(self) -> None:
+        """Flush and close the journal"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+        logger.info(
+            f"Raw frame journal {self.path} - STOPPED ({self.n_frames} frames, {self.n_bytes} bytes)"
+        )
+
+
+class RawFrameJournalReader(object):
+    """Reader of a raw frame journal
+
+    The journal is memory-mapped and indexed at opening, the records are
+    accessible by index or by iteration.
+    """
+
+    path: str
+    header: dict
+    raw: np.ndarray  # all bytes of the journal (memory-mapped)
+    times: np.ndarray  # in ns, reception time of each frame
+    offsets: np.ndarray  # position of each frame in raw
+    lengths: np.ndarray  # length of each frame
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path (str): journal file path
+
+        Raises:
+            JournalError: if the file is not a raw frame journal
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self.header = read_header(f)
+            start = f.tell()
+        self.raw = np.memmap(path, dtype=np.uint8, mode="r")
+        self._index(start)
+
+    def _index(self, pos: int) -> None:
+        """Index all complete records starting at pos"""
+        buf, size = memoryview(self.raw), self.raw.shape[0]
+        times, offsets, lengths = [], [], []
+        while pos + RECORD_HEADER.size <= size:
+            t, n = RECORD_HEADER.unpack_from(buf, pos)
+            pos += RECORD_HEADER.size
+            if pos + n > size:
+                logger.warning(f"Raw frame journal {self.path}: last record truncated")
+                break
+            times.append(t)
+            offsets.append(pos)
+            lengths.append(n)
+            pos += n
+        self.times = np.array(times, dtype=np.uint64)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.lengths = np.array(lengths, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.offsets.shape[0]
+
+    def __getitem__(self, idx: int) -> list[int]:
+        """Return the frame #idx"""
+        start = self.offsets[idx]
+        return self.raw[start : start + self.lengths[idx]].tolist()
+
+    def __iter__(self) -> Iterator[tuple[float, list[int]]]:
+        """Iterate over the records
+
+        Yields:
+            tuple[float, list[int]]: reception time in s (relative to the
+            opening of the journal), frame
+        """
+        for i in range(len(self)):
+            yield int(self.times[i]) * 1e-9, self[i]
+
+    def get(self, key: str, default: Any = None) -> Union[Any, None]:
+        """Return an info of the header"""
+        return self.header.get(key, default)
+
+
+if __name__ == "__main__":
+    """"""
@@ -0,0 +1,207 @@
+""" Replay of the raw rx frames recorded in a raw frame journal
+
+The class WireReplayInterface can be used instead of the
+SciospecSerialInterface, it answers the commands like the simulated device
+(see SimulatedSciospecInterface) but once a start-measurement command is
+recieved it emits the measurement streams recorded in a raw frame journal
+(see eit_app.sciospec.wire_journal) through new_rx_frame. The recorded
+streams go so through the whole acquisition path (SciospecCommunicator >
+MeasurementDataset > ComputingAgent), which makes end-to-end benchmarks and
+regression tests of the acquisition reproducible.
+
+The streams are emitted with their original timing, with a scaled timing
+(speed) or as fast as possible (speed = REPLAY_ASAP). The recorded answers
+to commands (ACK, setup) are not replayed, the commands are answered by the
+simulated device.
+
+example of Use is
+
+    replay = WireReplayInterface(journal_path, speed=REPLAY_ASAP)
+    dev = SciospecEITDevice(replay.n_channel, interface=replay)
+    dev.setup.set_from_dict(**replay.recorded_setup)
+    ... # connect the device, start the measurements
+    replay.wait_finished()
+    print(replay.stats)
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from time import monotonic
+
+import numpy as np
+from eit_app.sciospec.constants import CMD_START_STOP_MEAS, MEAS_STREAM_DTYPE
+from eit_app.sciospec.simulation import SimulatedSciospecInterface
+from eit_app.sciospec.wire_journal import RawFrameJournalReader
+
+logger = logging.getLogger(__name__)
+
+REPLAY_PORT = "REPLAY"
+REPLAY_ASAP = 0.0  # speed to emit the streams as fast as possible
+REPLAY_BATCH_SIZE = 256  # max nb of streams emitted at once
+
+
+@dataclass
+class ReplayStats:
+    """Counters of a WireReplayInterface"""
+
+    emitted: int = 0  # nb of streams emitted
+    total: int = 0  # nb of streams recorded
+    elapsed: float = 0.0  # in s, replay time (pauses excluded)
+    rate: float = 0.0  # in streams/s, mean emission rate
+
+
+class WireReplayInterface(SimulatedSciospecInterface):
+    """Simulated device streaming the measurement streams of a raw frame
+    journal (see module description)"""
+
+    recording: RawFrameJournalReader  # replayed journal
+    speed: float
+    finished: threading.Event  # set when all streams have been emitted
+
+    def __init__(self, journal_path: str, speed: float = 1.0) -> None:
+        """
+        Args:
+            journal_path (str): raw frame journal file
+            speed (float, optional): replay speed, 1.0 for the original
+            timing, 2.0 for twice faster, etc. or REPLAY_ASAP to emit the
+            streams as fast as possible. Defaults to 1.0.
+        """
+        rec = self.recording = RawFrameJournalReader(journal_path)
+        is_meas = rec.lengths == MEAS_STREAM_DTYPE.itemsize
+        is_meas[is_meas] = rec.raw[rec.offsets[is_meas]] == CMD_START_STOP_MEAS.tag
+        self._streams = np.flatnonzero(is_meas)  # record index of the streams
+        self._times = rec.times[self._streams] * 1e-9  # in s
+        self.speed = speed
+        self.finished = threading.Event()
+        super().__init__(
+            n_channel=self.recording.get("n_channel"),
+            exc_pattern=self.recording.get("excitation"),
+            freq_steps=len(self.recording.get("freq_list")),
+        )
+        logger.info(
+            f"Replay of journal {journal_path}: {len(self._streams)} meas. streams"
+        )
+
+    @property
+    def recorded_setup(self) -> dict:
+        """Setup of the device during the recording (see
+        SciospecSetup.set_from_dict)"""
+        return self.recording.get("setup")
+
+    @property
+    def stats(self) -> ReplayStats:
+        """Return the actual counters of the replay"""
+        elapsed = self._elapsed
+        if self._measuring:
+            elapsed += monotonic() - self._t_start
+        return ReplayStats(
+            emitted=self._pos,
+            total=len(self._streams),
+            elapsed=elapsed,
+            rate=self._pos / elapsed if elapsed > 0 else 0.0,
+        )
+
+    def reinit(self) -> None:
+        """Reinit the simulated device and rewind the replay"""
+        super().reinit()
+        self.rewind()
+
+    def rewind(self) -> None:
+        """Restart the replay at the first recorded stream"""
+        self._pos = 0
+        self._elapsed = 0.0
+        self._t_start = monotonic()
+        self._t_resume = self._times[0] if len(self._times) else 0.0
+        self.finished.clear()
+
+    def wait_finished(self, timeout: float = None) -> bool:
+        """Wait until all streams have been emitted
+
+        Returns:
+            bool: `False` if the timeout elapsed
+        """
+        return self.finished.wait(timeout)
+
+    def get_ports_available(self) -> list[str]:
+        """Return the replay port"""
+        return [REPLAY_PORT]
+
+    ## =========================================================================
+    ##  Measurements streaming
+    ## =========================================================================
+
+    def _set_measuring(self, start: bool) -> None:
+        """Start/stop (pause) the replay, a stopped replay resumes at the
+        next stream"""
+        if start and not self._measuring:
+            self._t_start = monotonic()
+            if self._pos < len(self._streams):
+                self._t_resume = self._times[self._pos]
+            self._next_frame_time = self._t_start
+        elif not start and self._measuring:
+            self._elapsed += monotonic() - self._t_start
+        self._measuring = start
+        logger.debug(f"Replay measuring: {start}")
+
+    def _due_times(self, start: int, end: int) -> np.ndarray:
+        """Return the (monotonic) times at which the streams #start to #end
+        are due"""
+        if not self.speed:
+            return np.full(end - start, self._t_start)
+        return self._t_start + (self._times[start:end] - self._t_resume) / self.speed
+
+    def _stream_meas_frame(self) -> None:
+        """Emit all due streams (max REPLAY_BATCH_SIZE at once)"""
+        end = min(self._pos + REPLAY_BATCH_SIZE, len(self._streams))
+        due = self._due_times(self._pos, end)
+        n_due = max(int(np.searchsorted(due, monotonic(), side="right")), 1)
+        end = min(self._pos + n_due, len(self._streams))
+        streams = self._streams[self._pos : end]
+        self._emit_rx_frames([self.recording[i] for i in streams])
+        self._pos = end
+        if self._pos >= len(self._streams):
+            self._set_measuring(False)
+            self.finished.set()
+            logger.info(f"Replay finished: {self.stats}")
+            return
+        self._next_frame_time = self._due_times(self._pos, self._pos + 1)[0]
+
+
+if __name__ == "__main__":
+    import sys
+
+    from eit_app.sciospec.communicator import SciospecCommunicator
+    from eit_app.sciospec.constants import OP_START_MEAS
+    from glob_utils.log.log import main_log
+
+    main_log()
+
+    # throughput of the interface > communicator path
+    replay = WireReplayInterface(sys.argv[1], speed=REPLAY_ASAP)
+    total = replay.stats.total
+    cnt = {"meas": 0}
+    all_dispatched = threading.Event()
+
+    def count(**kwargs):
+        cnt["meas"] += 1
+        if cnt["meas"] >= total:
+            all_dispatched.set()
+
+    communicator = SciospecCommunicator()
+    replay.new_rx_frame.connect(communicator.add_rx_frame)
+    communicator.new_rx_meas_stream.connect(count)
+    replay.open()
+    t_start = monotonic()
+    future = communicator.send_cmd_frame(replay, CMD_START_STOP_MEAS, OP_START_MEAS, [])
+    communicator.wait_cmd_done(future)
+    replay.wait_finished()
+    # the last streams emitted can still be in the rx ring
+    if total and not all_dispatched.wait(timeout=60.0):
+        logger.warning("Not all streams dispatched by the communicator")
+    elapsed = monotonic() - t_start
+    print(
+        f"{replay.stats}, {cnt['meas']} streams dispatched in {elapsed:.3f} s ({cnt['meas'] / elapsed:.0f} streams/s)"
+    )
+    replay.close()
+    communicator.close()
@@ -0,0 +1,184 @@
+""" Persistent cache of initialized solvers
+
+The initialization of a solver (mesh refinement, jacobian, reconstruction
+matrix,...) can take some seconds, but the same configuration (eit model,
+chip, refinement, solver and its parameters) are often reused. The
+initialized solvers are saved (pickled) in a cache directory under a key
+which is the hash of the content of this configuration. The cache size is
+bounded, the least recently used entries are removed first.
+
+example of Use is
+
+    cache = SolverCache(dir_path)
+    key = SolverCache.build_key(mat_file_path, chip_file_path, refinement, solver, params)
+    if (entry := cache.get(key)) is None:
+        entry = compute_entry()
+        cache.put(key, entry)
+"""
+
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import pickle
+from typing import Any, Union
+
+import numpy as np
+from eit_app.default.set_default_dir import AppStdDir, get_dir
+
+logger = logging.getLogger(__name__)
+
+SOLVER_CACHE_DIRNAME = ".solver_cache"
+SOLVER_CACHE_EXT = ".pkl"
+SOLVER_CACHE_MAX_SIZE = 1024 ** 3  # in bytes, max size of the cache dir
+
+
+def default_solver_cache_dir() -> Union[str, None]:
+    """Return the default solver cache dir (in the EIT model dir) or `None`
+    if the EIT model dir is not set"""
+    eit_model_dir = get_dir(AppStdDir.eit_model)
+    if not eit_model_dir:
+        return None
+    return os.path.join(eit_model_dir, SOLVER_CACHE_DIRNAME)
+
+
+def default_eit_model_src(name: str) -> str:
+    """Return the source of the default eit model of the `eit_model`-package
+    to build a key: the file of the default model is internal to the package,
+    so its name and the version of the package are used instead"""
+    try:
+        version = importlib.metadata.version("eit_model")
+    except importlib.metadata.PackageNotFoundError:
+        version = "unknown"
+    return f"default:{name}:eit_model-{version}"
+
+
+def _hash_item(h: "hashlib._Hash", item: Any) -> None:
+    """Update the hash with the content of an item"""
+    if isinstance(item, str) and os.path.isfile(item):
+        with open(item, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    elif isinstance(item, np.ndarray):
+        h.update(str((item.dtype, item.shape)).encode())
+        h.update(np.ascontiguousarray(item).tobytes())
+    elif isinstance(item, type):
+        h.update(f"{item.__module__}.{item.__qualname__}".encode())
+    elif hasattr(item, "__dict__"):
+        h.update(type(item).__qualname__.encode())
+        _hash_item(h, vars(item))
+    else:
+        h.update(json.dumps(item, sort_keys=True, default=repr).encode())
+
+
+class SolverCache(object):
+    """Size-bounded LRU cache of pickled objects saved in a directory"""
+
+    dir_path: str
+    max_size: int
+
+    def __init__(self, dir_path: str, max_size: int = SOLVER_CACHE_MAX_SIZE) -> None:
+        """
+        Args:
+            dir_path (str): cache directory (created if not existing)
+            max_size (int, optional): max size of the cache directory in
+            bytes. Defaults to SOLVER_CACHE_MAX_SIZE.
+        """
+        self.dir_path = dir_path
+        self.max_size = max_size
+        os.makedirs(self.dir_path, exist_ok=True)
+
+    @staticmethod
+    def build_key(*items: Any) -> str:
+        """Return a key corresponding to the content of the items
+
+        Args:
+            items: existing file paths (their content is hashed), ndarrays,
+            classes (their name is hashed), objects (their attributes are
+            hashed) or json serializable values
+
+        Returns:
+            str: sha256 hex digest
+        """
+        h = hashlib.sha256()
+        for item in items:
+            _hash_item(h, item)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Union[Any, None]:
+        """Return the cached object corresponding to the key or `None` if not
+        cached (or not loadable)"""
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                obj = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Solver cache entry {path} not loadable, removed ({e})")
+            self._remove(path)
+            return None
+        os.utime(path)  # mark as recently used
+        logger.info(f"Solver cache hit: {key}")
+        return obj
+
+    def put(self, key: str, obj: Any) -> bool:
+        """Cache an object under the key, the least recently used entries are
+        removed if the cache is too big
+
+        Returns:
+            bool: `True` if the object has been cached
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Solver cache: object not cachable ({e})")
+            self._remove(tmp_path)
+            return False
+        logger.info(f"Solver cache entry saved: {key}")
+        self._evict()
+        return True
+
+    def clear(self) -> None:
+        """Remove all entries of the cache"""
+        for path, _, _ in self._entries():
+            self._remove(path)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.dir_path, f"{key}{SOLVER_CACHE_EXT}")
+
+    def _entries(self) -> list[tuple[str, float, int]]:
+        """Return the entries (path, last use time, size) sorted by last use"""
+        entries = []
+        for e in os.scandir(self.dir_path):
+            if e.is_file() and e.name.endswith(SOLVER_CACHE_EXT):
+                st = e.stat()
+                entries.append((e.path, st.st_mtime, st.st_size))
+        return sorted(entries, key=lambda x: x[1])
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache size is
+        below max_size (the most recent entry is always kept)"""
+        entries = self._entries()
+        size = sum(s for _, _, s in entries)
+        for path, _, s in entries[:-1]:
+            if size <= self.max_size:
+                break
+            self._remove(path)
+            size -= s
+            logger.debug(f"Solver cache entry removed: {path}")
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    """"""
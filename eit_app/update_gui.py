@@ -647,6 +647,41 @@ class EvtDataAutosaveOptionsChanged(EventDataClass):
     func: str = update_autosave_options.__name__
 
 
+# -------------------------------------------------------------------------------
+## Update autosave statistics
+# -------------------------------------------------------------------------------
+
+
+def update_autosave_stats(
+    ui: Ui_MainWindow,
+    written: int = 0,
+    queue_depth: int = 0,
+    overflow_depth: int = 0,
+    overflow_depth_max: int = 0,
+    latency_max: float = 0.0,
+) -> None:
+    """Show the counters of the dataset writer on the autosave checkbox,
+    highlighted if the writer queue has overflowed"""
+    ui.chB_dataset_autosave.setToolTip(
+        f"Frames written: {written}, waiting: {queue_depth}, in overflow: {overflow_depth} (max {overflow_depth_max}), max latency: {eng(latency_max, 's')}"
+    )
+    color = f"background-color: {orange_light}" if overflow_depth_max else ""
+    ui.chB_dataset_autosave.setStyleSheet(color)
+
+
+register_func_in_catalog(update_autosave_stats)
+
+
+@dataclass
+class EvtDataAutosaveStats(EventDataClass):
+    written: int = 0
+    queue_depth: int = 0
+    overflow_depth: int = 0
+    overflow_depth_max: int = 0
+    latency_max: float = 0.0
+    func: str = update_autosave_stats.__name__
+
+
 # -------------------------------------------------------------------------------
 ## Update dataset loaded
 # -------------------------------------------------------------------------------
@@ -848,6 +883,65 @@ class EvtPopMsgBox(EventDataClass):
     msgbox_type:str='info'
     func: str = update_pop_msg.__name__
 
+
+# -------------------------------------------------------------------------------
+## Update computation statistics
+# -------------------------------------------------------------------------------
+
+
+def update_compute_stats(
+    ui: Ui_MainWindow,
+    policy: str = "",
+    received: int = 0,
+    computed: int = 0,
+    dropped: int = 0,
+) -> None:
+    """Show the nb of frames recieved/computed/dropped by the computation
+    and the actual policy (which can be set by the replay)"""
+    if policy and ui.cB_compute_policy.currentText() != policy:
+        set_comboBox_index(ui.cB_compute_policy, ui.cB_compute_policy.findText(policy))
+    ui.statusbar.showMessage(
+        f"Computation ({policy}) - frames recieved: {received}, computed: {computed}, dropped: {dropped}"
+    )
+
+
+register_func_in_catalog(update_compute_stats)
+
+
+@dataclass
+class EvtDataComputeStats(EventDataClass):
+    policy: str = ""
+    received: int = 0
+    computed: int = 0
+    dropped: int = 0
+    func: str = update_compute_stats.__name__
+
+
+# -------------------------------------------------------------------------------
+## Update plotting statistics
+# -------------------------------------------------------------------------------
+
+
+def update_plot_stats(
+    ui: Ui_MainWindow, plotted: int = 0, dropped: int = 0, fallbacks: int = 0
+) -> None:
+    """Show the nb of data plotted/dropped (replaced by newer ones before
+    plotting) and of live updates which needed a rebuild on the plot tabs"""
+    msg = f"Data plotted: {plotted}, dropped: {dropped}, live update fallbacks: {fallbacks}"
+    ui.tabW_rec.setToolTip(msg)
+    ui.tabW_monitoring.setToolTip(msg)
+
+
+register_func_in_catalog(update_plot_stats)
+
+
+@dataclass
+class EvtDataPlotStats(EventDataClass):
+    plotted: int = 0
+    dropped: int = 0
+    fallbacks: int = 0
+    func: str = update_plot_stats.__name__
+
 if __name__ == "__main__":
     """"""
     a = EvtDataSciospecDevices("")
@@ -1,7 +1,9 @@
 import os
 from enum import Enum
 import logging
-from queue import Queue
+from time import sleep
+from typing import Union
+from queue import Empty, Queue
 
 import numpy as np
 from eit_app.com_channels import (
@@ -12,6 +14,8 @@ from eit_app.com_channels import (
     SignalReciever,
 )
 from eit_app.video.device_abs import CaptureDevices, handle_capture_device_error
+from eit_app.video.image_writer import ImageWriterPool
+from eit_app.video.recording import VideoRecorder, VideoReplay, is_video_in
 from eit_app.update_gui import (
     CaptureStatus,
     EvtDataCaptureDevices,
@@ -22,7 +26,7 @@ from glob_utils.file.utils import is_file, append_extension
 from glob_utils.flags.status import AddStatus
 import glob_utils.dialog.Qt_dialogs
 from glob_utils.directory.utils import get_datetime_s
-from glob_utils.thread_process.threads_worker import Poller
+from eit_app.worker import WORKER_TIMEOUT, EventWorker
 from PyQt5.QtGui import QImage
 
 logger = logging.getLogger(__name__)
@@ -38,7 +42,20 @@ IMAGE_SIZES = {
 
 IMAGE_FILE_FORMAT = {
     "PNG": ".png",
-    # "JPEG": ".jpg"
+    "PNG (fast)": ".png",
+    "JPEG": ".jpg",
+    "NPY (raw)": ".npy",
+}
+# encoding parameters of the image file formats (see CaptureDevices.save_frame)
+IMAGE_ENCODING = {
+    "PNG": {"png_compression": 3},
+    "PNG (fast)": {"png_compression": 0},
+    "JPEG": {"jpeg_quality": 95},
+    "NPY (raw)": {},
+}
+# single file recording of the frames (value: video codec)
+VIDEO_FILE_FORMAT = {
+    "Video (MJPG)": "MJPG",
 }
 EMPTY_FRAME = np.array([[]])
 
@@ -65,10 +82,10 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
         )
         self.init_status(status_values=CaptureStatus)
 
-        self._buffer_in = Queue()  # recieve path were the frame has to be saved
-        self._worker = Poller(name="live_capture", pollfunc=self._poll, sleeptime=0.05)
+        self._buffer_in = Queue()  # recieve frame paths to save/load the frame
+        self._worker = EventWorker(name="live_capture", func=self._poll)
         self._worker.start()
-        self._worker.start_polling()
+        self._worker.start_processing()
 
         self.capture_device = capture_dev
         self.snapshot_dir = snapshot_dir
@@ -81,6 +98,12 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
 
         self.image_size = IMAGE_SIZES[list(IMAGE_SIZES.keys())[0]]
         self.image_file_ext = IMAGE_FILE_FORMAT[list(IMAGE_FILE_FORMAT.keys())[0]]
+        self.image_encoding = dict(IMAGE_ENCODING[list(IMAGE_ENCODING.keys())[0]])
+        # images are saved in background, not to delay display and capture
+        self._image_writer = ImageWriterPool(save_func=capture_dev.save_frame)
+        self.video_fourcc = None  # if set, frames are recorded in a video
+        self._video_recorder: VideoRecorder = None
+        self._video_replay: VideoReplay = None
         self.process = {
             CaptureStatus.NOT_CONNECTED: self._process_replay,
             CaptureStatus.CONNECTED: self._process_replay,
@@ -135,6 +158,7 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
         if data.meas_status_dev:
             self.set_status(CaptureStatus.MEASURING)
         else:
+            self._stop_video_recording()
             self.reset_to_last_status()
 
     def set_status_w_replay(self, data: SetStatusWReplayStatus) -> None:
@@ -152,9 +176,9 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
             self.reset_to_last_status()
 
     def add_path(self, data: DataSaveLoadImage, **kwargs) -> None:
-        if (path := self._check_frame_path_exist(data.frame_path)) is not None:
-            self._buffer_in.put(path)
-            logger.info(f"Image to load: {path} - ADDED")
+        if data.frame_path is not None:
+            self._buffer_in.put(data)
+            logger.debug(f"Frame path: {data.frame_path} - ADDED")
 
     def get_devices(self) -> None:
         """Return a list of the name of the availbale devices
@@ -217,9 +241,25 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
             file_ext ([type], optional): file extension.
             Defaults to list(EXT_IMG.keys())[0].
         """
+        if file_ext in VIDEO_FILE_FORMAT:
+            self.video_fourcc = VIDEO_FILE_FORMAT[file_ext]
+            logger.debug(f"video recording selected {self.video_fourcc}")
+            return
+        self.video_fourcc = None
         self.image_file_ext = IMAGE_FILE_FORMAT[file_ext]
+        self.image_encoding = dict(IMAGE_ENCODING[file_ext])
         logger.debug(f"image_file_ext selected {self.image_file_ext}")
 
+    def set_image_encoding(self, **kwargs) -> None:
+        """Set the encoding parameters for image saving
+
+        valid kwargs:
+        png_compression= 0-9 (0: fastest, no compression)
+        jpeg_quality= 0-100
+        """
+        self.image_encoding.update(kwargs)
+        logger.debug(f"image encoding set to {self.image_encoding}")
+
     def start_stop(self, *args, **kwargs) -> None:
         """Start or Stop Live Capture,
         toggle between both modis IDLE and LIVE
@@ -246,22 +286,39 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
             self.set_status(CaptureStatus.CONNECTED)
 
     def _poll(self) -> None:
-        """Call the process corresponding to the actual status"""
+        """Call the process corresponding to the actual status
+        (called in loop by the worker, each process blocks until
+        something is to do)"""
         self.process[self.get_status()]()
 
+    def _wait_for_path(self) -> Union[DataSaveLoadImage, None]:
+        """Block until a frame path is recieved in the input buffer or
+        the timeout elapsed
+
+        Returns:
+            Union[DataSaveLoadImage, None]: recieved frame path or `None`
+        """
+        try:
+            return self._buffer_in.get(timeout=WORKER_TIMEOUT)
+        except Empty:
+            return None
+
     def _process_idle(self) -> None:
         """Idle process: nop"""
 
     def _process_replay(self) -> None:
         """Replay process:
         - retrieve path in the input buffer
-        - load the correspoding image
+        - load the correspoding image (from the recorded video if present)
         - send the image for display
         """
-        if self._buffer_in.empty():
+        if (data := self._wait_for_path()) is None:
             return
-        path = self._buffer_in.get()
-        frame = self.load_image(path)
+        frame = self._load_video_frame(data)
+        if frame is None:
+            if (path := self._check_frame_path_exist(data.frame_path)) is None:
+                return
+            frame = self.load_image(path)
         if not self.is_status(CaptureStatus.REPLAY_AUTO):
             self.set_status(CaptureStatus.REPLAY_MAN)
         self.emit_new_Qtimage(frame)
@@ -270,21 +327,58 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
         """Measuring process:
         - retrieve path in the input buffer
         - take an image (and send the image for display)
-        - save the image
+        - save the image (or record it in the video)
         """
-        if self._buffer_in.empty():
+        if (data := self._wait_for_path()) is None:
             return
-        path = self._buffer_in.get()
         frame = self._shoot_image()
-        self.save_image(frame, path)
+        if self.video_fourcc is not None and data.frame_idx is not None:
+            self._record_video_frame(frame, data)
+        else:
+            self.save_image(frame, data.frame_path)
         self.emit_new_Qtimage(frame)
 
+    def _record_video_frame(self, frame: np.ndarray, data: DataSaveLoadImage) -> None:
+        """Record the frame in the video of the frame directory"""
+        if frame is None:
+            return
+        dir_path = os.path.dirname(data.frame_path)
+        if self._video_recorder is None or self._video_recorder.dir_path != dir_path:
+            self._stop_video_recording()
+            self._video_recorder = VideoRecorder(dir_path, fourcc=self.video_fourcc)
+        self._video_recorder.put(frame, data.frame_idx)
+
+    def _stop_video_recording(self) -> None:
+        if self._video_recorder is not None:
+            self._video_recorder.close()
+            self._video_recorder = None
+
+    def _load_video_frame(self, data: DataSaveLoadImage) -> Union[np.ndarray, None]:
+        """Return the frame recorded in the video of the frame directory,
+        `None` if no video has been recorded"""
+        if data.frame_idx is None:
+            return None
+        dir_path = os.path.dirname(data.frame_path)
+        if self._video_replay is None or self._video_replay.dir_path != dir_path:
+            if self._video_replay is not None:
+                self._video_replay.close()
+            self._video_replay = VideoReplay(dir_path) if is_video_in(dir_path) else None
+        if self._video_replay is None:
+            return None
+        self.image_path = data.frame_path
+        return self._video_replay.read(data.frame_idx)
+
     def _process_live(self) -> None:
         """Live process:
+        - wait for a new frame grabbed by the capture device
         - take an image
         - send the image for display
         """
-        frame = self._shoot_image()
+        if not self.capture_device.wait_new_frame(timeout=WORKER_TIMEOUT):
+            return
+        if (frame := self._shoot_image()) is None:
+            sleep(WORKER_TIMEOUT)  # no frame captured, avoid a busy loop
+            return
         self.emit_new_Qtimage(frame)
 
     def build_snapshot_path(self) -> str:
@@ -332,7 +426,7 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
         return frame
 
     def save_image(self, frame: np.ndarray, filepath: str)->None:
-        """Save an image frame
+        """Save an image frame in background (see ImageWriterPool)
 
         Args:
             frame (np.ndarray): image frame to save
@@ -340,13 +434,12 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
         """
         if filepath is None or frame is None:
             return
-        logger.info(f'Image "{filepath}" - SAVED')
         filepath = append_extension(filepath, self.image_file_ext)
-        self.capture_device.save_frame(frame, filepath)
+        self._image_writer.put(frame, filepath, **self.image_encoding)
         self.image_path = filepath
 
     def used_img_exts(self) -> list[str]:
-        return list(IMAGE_FILE_FORMAT.keys())
+        return list(IMAGE_FILE_FORMAT.keys()) + list(VIDEO_FILE_FORMAT.keys())
 
     def used_img_sizes(self) -> list[str]:
         return list(IMAGE_SIZES.keys())
@@ -362,7 +455,7 @@ class VideoCaptureAgent(SignalReciever, AddStatus, AddToGuiSignal):
             if is_file(filepath):
                 break
         
-        if filepath is None:
+        if filepath is None or not is_file(filepath):
             return None
 
         return filepath
@@ -20,9 +20,12 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>. """
 
 from abc import ABC, abstractmethod
 import logging
-from typing import Any, Tuple
+from threading import Condition, Lock
+from time import perf_counter, sleep
+from typing import Any, Callable, Tuple, Union
 import numpy as np
 from glob_utils.flags.flag import CustomFlag
+from eit_app.worker import WORKER_TIMEOUT, EventWorker
 import PyQt5.QtGui
 import glob_utils.dialog.Qt_dialogs
 
@@ -74,6 +77,129 @@ def handle_capture_device_error(func):
     return wrapper
 
 
+################################################################################
+## Class Frame Grabber
+################################################################################
+
+FPS_SMOOTHING = 0.1  # weight of the last frame period in the measured fps
+
+
+class FrameGrabber(object):
+
+    _buffers: list[Union[np.ndarray, None]]
+    _front: int
+    _frame_count: int
+    _connected: bool
+    _period: float
+
+    def __init__(
+        self,
+        name: str,
+        read_func: Callable[[Union[np.ndarray, None]], Tuple[bool, np.ndarray]],
+    ) -> None:
+        """Grab continuously the frames of a device in a background thread
+
+        The frames are read in the back buffer of a double buffer, which
+        becomes the front buffer (latest frame) once the read is done, so the
+        latest frame can be retrieved at any time without blocking.
+
+        Args:
+            name (str): name of the thread
+            read_func (Callable[[Union[np.ndarray, None]], Tuple[bool, np.ndarray]]):
+            blocking read of a frame, the passed buffer can be reused for the
+            frame (like `cv2.VideoCapture.read`)
+        """
+        self._read_func = read_func
+        self._new_frame = Condition()
+        self._reset()
+        self._worker = EventWorker(name=name, func=self._grab)
+        self._worker.start()
+
+    def _reset(self) -> None:
+        self._buffers = [None, None]
+        self._front = 0
+        self._frame_count = 0
+        self._connected = False
+        self._period = 0.0
+        self._last_time = None
+
+    def start(self) -> None:
+        """Start grabbing the frames"""
+        with self._new_frame:
+            self._reset()
+        self._worker.start_processing()
+
+    def stop(self) -> None:
+        """Stop grabbing the frames"""
+        self._worker.stop_processing()
+        with self._new_frame:
+            self._connected = False
+            self._new_frame.notify_all()
+
+    @property
+    def connected(self) -> bool:
+        """Status of the last frame reading (cached)"""
+        return self._connected
+
+    @property
+    def frame_count(self) -> int:
+        """Nb of frames grabbed since start"""
+        return self._frame_count
+
+    @property
+    def fps(self) -> float:
+        """Measured capture frame rate in frames per second"""
+        return 1 / self._period if self._period > 0 else 0.0
+
+    def latest_frame(self) -> Union[np.ndarray, None]:
+        """Return a copy of the latest grabbed frame (`None` if no frame
+        has been grabbed yet)"""
+        with self._new_frame:
+            frame = self._buffers[self._front]
+            return None if frame is None else frame.copy()
+
+    def wait_new_frame(self, count: int = None, timeout: float = None) -> bool:
+        """Block until a frame newer than the `count`th one has been grabbed
+
+        Args:
+            count (int, optional): frame count already seen (see
+            frame_count). Defaults to None (actual frame count).
+            timeout (float, optional): max waiting time in s. Defaults to None.
+
+        Returns:
+            bool: `False` if the timeout elapsed
+        """
+        with self._new_frame:
+            count = self._frame_count if count is None else count
+            return self._new_frame.wait_for(
+                lambda: self._frame_count > count, timeout
+            )
+
+    def _grab(self) -> None:
+        """Read a frame in the back buffer and swap the buffers"""
+        back = 1 - self._front
+        success, frame = self._read_func(self._buffers[back])
+        if not success:
+            self._connected = False
+            sleep(WORKER_TIMEOUT)  # device not available, avoid a busy loop
+            return
+        now = perf_counter()
+        with self._new_frame:
+            self._buffers[back] = frame
+            self._front = back
+            self._frame_count += 1
+            self._connected = True
+            if self._last_time is not None:
+                dt = now - self._last_time
+                self._period = (
+                    dt
+                    if self._period == 0
+                    else (1 - FPS_SMOOTHING) * self._period + FPS_SMOOTHING * dt
+                )
+            self._last_time = now
+            self._new_frame.notify_all()
+
+
 ################################################################################
 ## Class Capture Devices
 ################################################################################
@@ -86,6 +212,7 @@ class CaptureDevices(ABC):
     _name: str
     _initializated: CustomFlag
     _settings: dict
+    _grabber: FrameGrabber
 
     def __init__(self) -> None:
         super().__init__()
@@ -93,8 +220,40 @@ class CaptureDevices(ABC):
         self._device = None
         self._initializated = CustomFlag()
         self._settings = {}
+        self._device_lock = Lock()  # device used by the grabber and settings
+        self._grabber = FrameGrabber(name="grab_frames", read_func=self._grab_frame)
         self._post_init_()
 
+    def _grab_frame(self, buffer: Union[np.ndarray, None]) -> Tuple[bool, np.ndarray]:
+        """Read a frame of the device (called by the grabber thread)"""
+        with self._device_lock:
+            if self._device is None:
+                return False, None
+            return self.read_frame(buffer)
+
+    def start_grabbing(self) -> None:
+        """Start grabbing the frames of the device in background"""
+        self._grabber.start()
+
+    def stop_grabbing(self) -> None:
+        """Stop grabbing the frames of the device"""
+        self._grabber.stop()
+
+    def wait_new_frame(self, timeout: float = None) -> bool:
+        """Block until a new frame has been grabbed
+
+        Args:
+            timeout (float, optional): max waiting time in s. Defaults to None.
+
+        Returns:
+            bool: `False` if the timeout elapsed
+        """
+        return self._grabber.wait_new_frame(timeout=timeout)
+
+    def get_capture_fps(self) -> float:
+        """Return the measured capture frame rate in frames per second"""
+        return self._grabber.fps
+
     def _error_if_no_device(func):
         """Decorator which test if the device has been initializated
 
@@ -183,6 +342,19 @@ class CaptureDevices(ABC):
             dict[str,Any]: settings dictionnary
         """
 
+    @abstractmethod
+    def read_frame(self, buffer: Union[np.ndarray, None]) -> Tuple[bool, np.ndarray]:
+        """Read a frame on the connected device (blocking), called by the
+        grabber thread
+
+        Args:
+            buffer (Union[np.ndarray, None]): buffer which can be reused for
+            the frame
+
+        Returns:
+            Tuple[bool, np.ndarray]: success of the reading and frame
+        """
+
     @abstractmethod
     def capture_frame(self) -> Tuple[np.ndarray, None]:
         """Capture a frame on connected device and return it as an ndarray
@@ -218,10 +390,11 @@ class CaptureDevices(ABC):
         """
 
     @abstractmethod
-    def save_frame(self, frame: np.ndarray, file_path: str) -> None:
+    def save_frame(self, frame: np.ndarray, file_path: str, **kwargs) -> None:
         """Save passed frame (ndarray) in file_path
 
         Args:
             frame (np.ndarray): [description]
             path (str): [description]
+            kwargs: encoding parameters (e.g. png_compression, jpeg_quality)
         """
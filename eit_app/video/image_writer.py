@@ -0,0 +1,124 @@
+""" Asynchronous saving of captured image frames
+
+The encoding of an image (e.g. PNG compression) can take tens of ms, which
+should not delay the display of the frame or the next capture. The frames
+are put in a bounded queue and saved by a pool of writer threads.
+
+example of Use is
+
+    writer = ImageWriterPool(save_func=capture_device.save_frame)
+    writer.put(frame, "path/to/image.png", png_compression=1)
+    ...
+    writer.stop() # all queued frames are saved before stopping
+"""
+
+import logging
+from queue import Empty, Full, Queue
+from threading import Lock
+from typing import Any, Callable
+
+import numpy as np
+from eit_app.worker import WORKER_TIMEOUT, EventWorker
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WRITER_WORKERS = 2  # nb of writer threads
+IMAGE_WRITER_QUEUE_SIZE = 64  # max nb of frames waiting for saving
+
+
+class ImageWriterPool(object):
+    """Pool of threads saving image frames in background
+
+    Putting a frame never blocks, if the queue is full the frame is dropped
+    (and counted).
+    """
+
+    _queue: Queue
+    _workers: list[EventWorker]
+    n_written: int
+    n_dropped: int
+
+    def __init__(
+        self,
+        save_func: Callable[..., None],
+        n_workers: int = IMAGE_WRITER_WORKERS,
+        maxsize: int = IMAGE_WRITER_QUEUE_SIZE,
+    ) -> None:
+        """
+        Args:
+            save_func (Callable[..., None]): function saving a frame, called
+            as save_func(frame, file_path, **params)
+            n_workers (int, optional): nb of writer threads. Defaults to
+            IMAGE_WRITER_WORKERS.
+            maxsize (int, optional): max nb of frames waiting for saving.
+            Defaults to IMAGE_WRITER_QUEUE_SIZE.
+        """
+        self._save_func = save_func
+        self._queue = Queue(maxsize=maxsize)
+        self._lock = Lock()  # counters updated by all workers
+        self.n_written = 0
+        self.n_dropped = 0
+        self._workers = [
+            EventWorker(name=f"image_writer_{i}", func=self._wait_and_write)
+            for i in range(n_workers)
+        ]
+        for w in self._workers:
+            w.start()
+            w.start_processing()
+
+    def put(self, frame: np.ndarray, file_path: str, **params: Any) -> bool:
+        """Queue a frame for saving (never blocks)
+
+        Args:
+            frame (np.ndarray): image frame, the array should not be modified
+            afterwards
+            file_path (str): file path (with extension)
+            params: encoding parameters passed to the save function
+
+        Returns:
+            bool: `False` if the frame has been dropped (queue full)
+        """
+        try:
+            self._queue.put_nowait((frame, file_path, params))
+        except Full:
+            with self._lock:
+                self.n_dropped += 1
+            logger.error(
+                f'Image writer queue full, image "{file_path}" dropped ({self.n_dropped} dropped)'
+            )
+            return False
+        return True
+
+    @property
+    def n_pending(self) -> int:
+        """Nb of frames waiting for saving"""
+        return self._queue.qsize()
+
+    def join(self) -> None:
+        """Block until all queued frames have been saved"""
+        self._queue.join()
+
+    def stop(self) -> None:
+        """Save all queued frames and stop the writer threads"""
+        self.join()
+        for w in self._workers:
+            w.stop()
+        logger.debug(f"Image writer stopped: {self.n_written} saved, {self.n_dropped} dropped")
+
+    def _wait_and_write(self) -> None:
+        """Wait for the next frame and save it"""
+        try:
+            frame, file_path, params = self._queue.get(timeout=WORKER_TIMEOUT)
+        except Empty:
+            return
+        try:
+            self._save_func(frame, file_path, **params)
+            with self._lock:
+                self.n_written += 1
+            logger.info(f'Image "{file_path}" - SAVED')
+        finally:
+            self._queue.task_done()
+
+
+if __name__ == "__main__":
+    """"""
@@ -1,7 +1,6 @@
 import sys
-import time
 import logging
-from typing import Any, Tuple
+from typing import Any, Tuple, Union
 
 import cv2
 import numpy as np
@@ -16,6 +15,8 @@ from PyQt5.QtGui import QImage
 
 logger = logging.getLogger(__name__)
 
+CONNECT_TIMEOUT = 5.0  # in s, max waiting time for the first frame
+
 
 class MicroUSBCamera(CaptureDevices):
     """Capture device for USB Micro Cameras based on OpenCV library"""
@@ -40,6 +41,7 @@ class MicroUSBCamera(CaptureDevices):
             raise NoCaptureDeviceSelected(f'Device "{self._name}" not available')
 
         self._device = self._connect_to_device(self._devices_available[self._name])
+        self.start_grabbing()
         self._check_device()
 
     def _connect_to_device(self, index: int):
@@ -51,7 +53,11 @@ class MicroUSBCamera(CaptureDevices):
         )
 
     def disconnect_device(self) -> None:
-        self._device = None
+        self.stop_grabbing()
+        with self._device_lock:
+            if self._device is not None:
+                self._device.release()
+            self._device = None
 
     def get_devices_available(self) -> dict[str, Any]:
         self._devices_available = {}
@@ -73,8 +79,9 @@ class MicroUSBCamera(CaptureDevices):
         size = kwargs["size"] if "size" in kwargs else None
         if size is None:
             return
-        self._device.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
-        self._device.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        with self._device_lock:
+            self._device.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            self._device.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
         # self.device.set(cv2.CAP_PROP_AUTO_WB, 0)
         # self.device.set(cv2.CAP_PROP_EXPOSURE, 0)
         # self.device.set(cv2.CAP_PROP_GAIN , 0)
@@ -83,24 +90,28 @@ class MicroUSBCamera(CaptureDevices):
         # self.device.set(cv2.CAP_PROP_BRIGHTNESS, -1)
         # self.device.set(cv2.CAP_PROP_HUE,hue)
         # self.device.set(cv2.CAP_PROP_CONVERT_RGB , 1)
-        time.sleep(2)
         self._check_device()
         self.get_settings()
 
     def get_settings(self) -> dict[str, Any]:
         if not self._initializated.is_set():  # raise error if no device selected
             raise NoCaptureDeviceSelected()
-        self._settings = {k: self._device.get(v) for k, v in self.props.items()}
+        with self._device_lock:
+            self._settings = {k: self._device.get(v) for k, v in self.props.items()}
         [logger.info(f"{k}: {v}") for k, v in self._settings.items()]
         return self._settings
 
+    def read_frame(self, buffer: Union[np.ndarray, None]) -> Tuple[bool, np.ndarray]:
+        return self._device.read(buffer)
+
     def capture_frame(self) -> Tuple[np.ndarray, None]:
+        """Return the latest frame grabbed in background (not blocking)"""
         if not self.is_connected():
             return None
         if not self._initializated.is_set():  # raise error if no device selected
             raise NoCaptureDeviceSelected()
-        success, frame = self._device.read()
-        if not success:  # raise error if reading of a frame not succesful
+        frame = self._grabber.latest_frame()
+        if frame is None:  # raise error if no frame grabbed
             raise CaptureFrameError()
         return frame
 
@@ -108,22 +119,36 @@ class MicroUSBCamera(CaptureDevices):
         return convert_frame_to_Qt_format(frame)
 
     def load_frame(self, file_path: str) -> np.ndarray:
+        if file_path.endswith(".npy"):
+            return np.load(file_path)
         return cv2.imread(file_path, cv2.IMREAD_COLOR)
 
-    def save_frame(self, frame: np.ndarray, file_path: str):
-        cv2.imwrite(file_path, frame)
+    def save_frame(self, frame: np.ndarray, file_path: str, **kwargs):
+        """valid kwargs:
+        png_compression= 0-9
+        jpeg_quality= 0-100"""
+        if file_path.endswith(".npy"):
+            np.save(file_path, frame)
+            return
+        params = []
+        if (level := kwargs.get("png_compression")) is not None:
+            params += [cv2.IMWRITE_PNG_COMPRESSION, int(level)]
+        if (quality := kwargs.get("jpeg_quality")) is not None:
+            params += [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        cv2.imwrite(file_path, frame, params)
 
     def is_connected(self) -> bool:
+        """Connection status given by the last frame grabbed (cached)"""
         if self._device is None:
             return False
-        success, _ = self._device.read()
-        return success
+        return self._grabber.connected
 
     def _check_device(self) -> None:
-        """Check if the device works, here we read frame and verify that it is
-        succesful
+        """Check if the device works, here we wait for a newly grabbed frame
         """
-        self._initializated.set(val=self.is_connected)
+        self._grabber.wait_new_frame(timeout=CONNECT_TIMEOUT)
+        self._initializated.set(val=self.is_connected())
+        logger.debug(f"Capture device: {self.get_capture_fps():.1f} fps")
 
 
 if __name__ == "__main__":
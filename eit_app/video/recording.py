@@ -0,0 +1,187 @@
+""" Recording of captured frames in a single video file
+
+Instead of saving one image file per EIT frame, the captured frames are
+encoded in one video container (OpenCV VideoWriter). A sidecar index
+(csv-file) maps each EIT frame index to the corresponding video frame
+number and capture timestamp, so that the image of an EIT frame can be
+retrieved by seeking in the video during replay.
+
+example of Use is
+
+    recorder = VideoRecorder(dir_path)
+    recorder.put(frame, eit_frame_idx) # encoded in background
+    ...
+    recorder.close()
+
+    video = VideoReplay(dir_path)
+    frame = video.read(eit_frame_idx)
+"""
+
+import csv
+import logging
+import os
+from queue import Full
+from time import time
+from typing import Union
+
+import cv2
+import numpy as np
+from eit_app.worker import QueueWorker
+
+logger = logging.getLogger(__name__)
+
+VIDEO_FILENAME = "capture_video.avi"
+VIDEO_INDEX_FILENAME = "capture_video_index.csv"
+VIDEO_INDEX_HEADER = ["frame_idx", "video_frame", "timestamp"]
+VIDEO_FPS = 10.0  # playback rate of the video (the timing is in the index)
+VIDEO_FOURCC = "MJPG"
+VIDEO_QUEUE_SIZE = 64  # max nb of frames waiting for encoding
+
+
+def video_path(dir_path: str) -> str:
+    return os.path.join(dir_path, VIDEO_FILENAME)
+
+
+def video_index_path(dir_path: str) -> str:
+    return os.path.join(dir_path, VIDEO_INDEX_FILENAME)
+
+
+def is_video_in(dir_path: str) -> bool:
+    """Assess if a recorded video (with its index) is present in a directory"""
+    return os.path.isfile(video_path(dir_path)) and os.path.isfile(
+        video_index_path(dir_path)
+    )
+
+
+class VideoRecorder(object):
+    """Encode captured frames in a video file of a directory with its index
+
+    The frames are put in a bounded queue and encoded by a dedicated thread
+    in their order of arrival. Putting a frame never blocks, if the queue is
+    full the frame is dropped (and counted).
+    """
+
+    dir_path: str
+    n_written: int
+    n_dropped: int
+
+    def __init__(
+        self,
+        dir_path: str,
+        fourcc: str = VIDEO_FOURCC,
+        fps: float = VIDEO_FPS,
+        maxsize: int = VIDEO_QUEUE_SIZE,
+    ) -> None:
+        """
+        Args:
+            dir_path (str): directory of the video and index files
+            fourcc (str, optional): video codec. Defaults to VIDEO_FOURCC.
+            fps (float, optional): playback rate. Defaults to VIDEO_FPS.
+            maxsize (int, optional): max nb of frames waiting for encoding.
+            Defaults to VIDEO_QUEUE_SIZE.
+        """
+        self.dir_path = dir_path
+        self._fourcc = fourcc
+        self._fps = fps
+        self._writer = None  # opened on first frame (frame size needed)
+        self._index_file = open(video_index_path(dir_path), "w", newline="")
+        self._index = csv.writer(self._index_file)
+        self._index.writerow(VIDEO_INDEX_HEADER)
+        self.n_written = 0
+        self.n_dropped = 0
+        self._worker = QueueWorker(
+            name="video_writer", process_func=self._write, maxsize=maxsize
+        )
+        self._worker.start()
+        self._worker.start_processing()
+        logger.info(f"Video recording in {video_path(dir_path)} - STARTED")
+
+    def put(self, frame: np.ndarray, frame_idx: int) -> bool:
+        """Queue a frame for encoding (never blocks)
+
+        Args:
+            frame (np.ndarray): image frame (BGR), the array should not be
+            modified afterwards
+            frame_idx (int): index of the corresponding EIT frame
+
+        Returns:
+            bool: `False` if the frame has been dropped (queue full)
+        """
+        try:
+            self._worker.put_nowait((frame, frame_idx, time()))
+        except Full:
+            self.n_dropped += 1
+            logger.error(
+                f"Video writer queue full, frame {frame_idx} dropped ({self.n_dropped} dropped)"
+            )
+            return False
+        return True
+
+    def close(self) -> None:
+        """Encode all queued frames and close the video and index files"""
+        self._worker.queue.join()
+        self._worker.stop()
+        if self._writer is not None:
+            self._writer.release()
+        self._index_file.close()
+        logger.info(
+            f"Video recording - STOPPED ({self.n_written} frames, {self.n_dropped} dropped)"
+        )
+
+    def _write(self, item: tuple) -> None:
+        frame, frame_idx, timestamp = item
+        try:
+            if self._writer is None:
+                self._writer = cv2.VideoWriter(
+                    video_path(self.dir_path),
+                    cv2.VideoWriter_fourcc(*self._fourcc),
+                    self._fps,
+                    (frame.shape[1], frame.shape[0]),
+                )
+            self._writer.write(frame)
+            self._index.writerow([frame_idx, self.n_written, f"{timestamp:.6f}"])
+            self._index_file.flush()
+            self.n_written += 1
+        finally:
+            self._worker.queue.task_done()
+
+
+class VideoReplay(object):
+    """Read the frames of a recorded video by EIT frame index"""
+
+    dir_path: str
+    index: dict[int, int]  # EIT frame index -> video frame number
+    timestamps: dict[int, float]  # EIT frame index -> capture timestamp
+
+    def __init__(self, dir_path: str) -> None:
+        """
+        Args:
+            dir_path (str): directory of the video and index files
+        """
+        self.dir_path = dir_path
+        self.index = {}
+        self.timestamps = {}
+        with open(video_index_path(dir_path), "r", newline="") as f:
+            for row in csv.DictReader(f):
+                idx = int(row["frame_idx"])
+                self.index[idx] = int(row["video_frame"])
+                self.timestamps[idx] = float(row["timestamp"])
+        self._capture = cv2.VideoCapture(video_path(dir_path))
+        self._next_video_frame = 0
+
+    def read(self, frame_idx: int) -> Union[np.ndarray, None]:
+        """Return the image of an EIT frame (`None` if not recorded)"""
+        if (n := self.index.get(frame_idx)) is None:
+            return None
+        if n != self._next_video_frame:  # sequential reads do not need seeking
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, n)
+        success, frame = self._capture.read()
+        self._next_video_frame = n + 1 if success else -1
+        return frame if success else None
+
+    def close(self) -> None:
+        self._capture.release()
+
+
+if __name__ == "__main__":
+    """"""
@@ -68,6 +68,10 @@ class Window3DAgent(SignalReciever):
                 self.w.set_eit_mdl(d)
             
 
+    def is_consuming(self) -> bool:
+        """Assess if data to plot are needed (3D window created)"""
+        return self.w is not None
+
     def init_window_3d(self, eit_mdl:EITModel) -> None:
         self.w = PyVistaPlotWidget(eit_mdl)
 
@@ -0,0 +1,161 @@
+""" Event-driven worker threads
+
+Instead of polling a function every x ms (like the glob_utils Poller) the
+workers defined here call a function which blocks until there is something
+to do (data in a queue, bytes on a port, ...). That way the work is done as
+soon as the data are available and the threads sleep when there is
+nothing to do.
+
+example of Use is
+
+    worker = QueueWorker(name="compute", process_func=self.process)
+    worker.start()
+    worker.start_processing()
+    ...
+    worker.put(data) # process(data) is called in the worker thread
+    ...
+    worker.stop() # graceful shutdown
+"""
+
+import logging
+from queue import Empty, Queue
+from threading import Event, Thread, current_thread
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+WORKER_TIMEOUT = 0.1  # in s, max blocking time of a wait (stop requests check)
+
+_STOP_ITEM = object()  # sentinel used to wake up a QueueWorker for shutdown
+
+
+class EventWorker(Thread):
+    def __init__(self, name: str, func: Callable[[], Any]) -> None:
+        """Worker thread calling repeatedly a blocking function
+
+        The function `func` should block until some work is available or at
+        most some time (e.g. WORKER_TIMEOUT) has elapsed, like a
+        `Queue.get(timeout=...)` or a serial port read with timeout.
+
+        Args:
+            name (str): name of the thread
+            func (Callable[[], Any]): blocking function called in loop
+        """
+        super().__init__(name=name, daemon=True)
+        self._func = func
+        self._processing = Event()
+        self._stop_request = Event()
+
+    def run(self) -> None:
+        while not self._stop_request.is_set():
+            if not self._processing.wait(WORKER_TIMEOUT):
+                continue
+            try:
+                self._func()
+            except Exception as e:
+                logger.exception(f"Worker {self.name}: error during processing ({e})")
+        logger.debug(f"Worker {self.name} - STOPPED")
+
+    def start_processing(self) -> None:
+        """Start calling the function"""
+        self._processing.set()
+
+    def stop_processing(self) -> None:
+        """Stop calling the function (the thread is kept alive)"""
+        self._processing.clear()
+
+    def is_processing(self) -> bool:
+        return self._processing.is_set()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        """Stop the thread gracefully, the actual call of the function is
+        finished before stopping
+
+        Args:
+            timeout (float, optional): max time to wait for the thread to end
+            in s. Defaults to 1.0.
+        """
+        self._stop_request.set()
+        self._processing.set()  # wake up the thread if not processing
+        if self.is_alive() and current_thread() is not self:
+            self.join(timeout)
+
+
+class QueueWorker(EventWorker):
+    def __init__(
+        self,
+        name: str,
+        process_func: Callable[[Any], Any],
+        maxsize: int = 0,
+        latest_only: bool = False,
+        drop_func: Callable[[Any], Any] = None,
+    ) -> None:
+        """Worker thread blocking on its input queue, each item put in the
+        queue is passed to `process_func`
+
+        Args:
+            name (str): name of the thread
+            process_func (Callable[[Any], Any]): function processing an item
+            maxsize (int, optional): max size of the queue (0 for infinite).
+            Defaults to 0.
+            latest_only (bool, optional): if `True`, all items waiting in the
+            queue are drained and only the latest is processed. Defaults to
+            False.
+            drop_func (Callable[[Any], Any], optional): function called with
+            each item drained without being processed (e.g. for counting).
+            Defaults to None.
+        """
+        super().__init__(name, self._wait_and_process)
+        self.queue = Queue(maxsize=maxsize)
+        self._process_func = process_func
+        self._latest_only = latest_only
+        self._drop_func = drop_func
+
+    def put(self, item: Any, block: bool = True, timeout: float = None) -> None:
+        """Put an item in the input queue (see `Queue.put`)"""
+        self.queue.put(item, block, timeout)
+
+    def set_latest_only(self, latest_only: bool) -> None:
+        """Set if only the latest item waiting in the queue is processed"""
+        self._latest_only = latest_only
+
+    def put_nowait(self, item: Any) -> None:
+        """Put an item in the input queue without blocking, raise `queue.Full`
+        if no slot is available"""
+        self.queue.put_nowait(item)
+
+    def _wait_and_process(self) -> None:
+        """Wait for the next item and process it"""
+        try:
+            item = self.queue.get(timeout=WORKER_TIMEOUT)
+        except Empty:
+            return
+        if self._latest_only:
+            item = self._drain(item)
+        if item is _STOP_ITEM:
+            return
+        self._process_func(item)
+
+    def _drain(self, item: Any) -> Any:
+        """Return the latest item waiting in the queue"""
+        while True:
+            try:
+                nxt = self.queue.get_nowait()
+            except Empty:
+                return item
+            if nxt is _STOP_ITEM:
+                return nxt
+            if self._drop_func is not None:
+                self._drop_func(item)
+            item = nxt
+
+    def stop(self, timeout: float = 1.0) -> None:
+        try:
+            self.queue.put_nowait(_STOP_ITEM)
+        except Exception:  # queue full, the timeout of the get will do it
+            pass
+        super().stop(timeout)
+
+
+if __name__ == "__main__":
+    """"""